@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+import asyncpg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db.migrations import run_migrations  # noqa: E402
+from services.background_service import run_cleanup  # noqa: E402
+
+# 用法（請連到可任意清空的本地資料庫）：
+#   BENCH_DB_URL=postgresql://postgres@localhost/coolslate_bench \
+#   python benchmarks/cleanup_benchmark.py --orders 100000 --reset
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+SCHEMA_FILE = Path(__file__).resolve().parent / "schema.sql"
+
+
+async def reset_schema(db):
+    await db.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    await db.execute(SCHEMA_FILE.read_text())
+    await run_migrations(db)
+
+
+async def seed_expired_orders(db, order_count: int):
+    await db.execute(
+        "DELETE FROM booking_slots WHERE order_id IN (SELECT id FROM orders WHERE order_number LIKE 'BENCH%')"
+    )
+    await db.execute("DELETE FROM orders WHERE order_number LIKE 'BENCH%'")
+    user_id = await db.fetchval(
+        """
+        INSERT INTO users (email, google_id, name)
+        VALUES ('bench@example.com', 'bench', 'bench')
+        ON CONFLICT (email) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+        """
+    )
+    # 三種服務平均分配，建立時間皆早於 30 分鐘前
+    await db.execute(
+        """
+        INSERT INTO orders (order_number, user_id, service_type_id, location_address,
+                            unit_count, total_amount, status, payment_status, created_at, updated_at)
+        SELECT 'BENCH' || lpad(g::text, 8, '0'), $1,
+               (SELECT id FROM service_types ORDER BY priority OFFSET (g % 3) LIMIT 1),
+               '台北市信義區市府路1號', 1 + g % 3, 2000, 'pending', 'unpaid',
+               NOW() - INTERVAL '2 hours', NOW()
+        FROM generate_series(1, $2) AS g
+        """,
+        user_id,
+        order_count,
+    )
+    await db.execute("ANALYZE orders")
+    # 安裝、保養訂單各有一筆已過期的暫時鎖定，reference_id 暫借來對應訂單
+    await db.execute(
+        """
+        INSERT INTO time_slot_locks (slot_date, slot_time, locked_workers, lock_type, reference_id, expires_at)
+        SELECT CURRENT_DATE + 7 + (o.id % 60), TIME '09:00', 1, 'booking', o.id, NOW() - INTERVAL '1 hour'
+        FROM orders o
+        JOIN service_types st ON o.service_type_id = st.id
+        WHERE o.order_number LIKE 'BENCH%' AND st.name IN ('INSTALLATION', 'MAINTENANCE')
+        """
+    )
+    await db.execute("ANALYZE time_slot_locks")
+    await db.execute(
+        """
+        INSERT INTO booking_slots (order_id, preferred_date, preferred_time, contact_name,
+                                   contact_phone, is_primary, is_locked, temp_lock_id, lock_expires_at)
+        SELECT o.id, CURRENT_DATE + 7 + (o.id % 60), TIME '09:00', '王小明', '0912345678',
+               true, tsl.id IS NOT NULL, tsl.id, tsl.expires_at
+        FROM orders o
+        LEFT JOIN time_slot_locks tsl ON tsl.reference_id = o.id AND tsl.lock_type = 'booking'
+        WHERE o.order_number LIKE 'BENCH%'
+        """
+    )
+    await db.execute(
+        """
+        INSERT INTO booking_slots (order_id, preferred_date, preferred_time, contact_name,
+                                   contact_phone, is_primary)
+        SELECT o.id, CURRENT_DATE + 8 + (o.id % 60), TIME '13:00', '王小明', '0912345678', false
+        FROM orders o
+        WHERE o.order_number LIKE 'BENCH%' AND o.id % 2 = 0
+        """
+    )
+    await db.execute(
+        "UPDATE time_slot_locks SET reference_id = NULL WHERE reference_id IS NOT NULL AND lock_type = 'booking'"
+    )
+    await db.execute("ANALYZE")
+
+
+async def legacy_cleanup(db):
+    # 改寫前的逐筆刪除流程，作為比較基準
+    await db.execute(
+        """
+        UPDATE booking_slots
+        SET is_locked = false, temp_lock_id = NULL, lock_expires_at = NULL
+        WHERE temp_lock_id IS NOT NULL
+          AND temp_lock_id NOT IN (
+              SELECT id FROM time_slot_locks
+              WHERE expires_at IS NULL OR expires_at > NOW()
+          )
+        """
+    )
+    await db.fetchval("SELECT clean_expired_locks()")
+    expired_orders = await db.fetch(
+        """
+        SELECT DISTINCT o.id, o.unit_count, st.base_duration_hours, st.additional_duration_hours
+        FROM orders o
+        JOIN service_types st ON o.service_type_id = st.id
+        WHERE o.status = 'pending'
+          AND o.payment_status = 'unpaid'
+          AND o.created_at < NOW() - INTERVAL '30 minutes'
+          AND NOT EXISTS (
+              SELECT 1
+              FROM booking_slots bs
+              LEFT JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id
+              WHERE bs.order_id = o.id
+                AND bs.is_locked = true
+                AND (tsl.expires_at IS NULL OR tsl.expires_at > NOW())
+          )
+        """
+    )
+    for order in expired_orders:
+        async with db.transaction():
+            required_hours = min(
+                order["base_duration_hours"]
+                + (order["unit_count"] - 1) * order["additional_duration_hours"],
+                8,
+            )
+            slots = await db.fetch(
+                "SELECT bs.*, tsl.id as lock_id FROM booking_slots bs LEFT JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id WHERE bs.order_id = $1",
+                order["id"],
+            )
+            for slot in slots:
+                if slot["lock_id"]:
+                    await db.fetchval(
+                        "SELECT unlock_service_time_slot($1, $2, $3, $4)",
+                        slot["lock_id"],
+                        slot["preferred_date"],
+                        slot["preferred_time"],
+                        required_hours,
+                    )
+            await db.execute(
+                "DELETE FROM booking_slots WHERE order_id = $1", order["id"]
+            )
+            await db.execute("DELETE FROM orders WHERE id = $1", order["id"])
+    return len(expired_orders)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="過期訂單清理效能測試")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--mode", choices=["batched", "legacy", "both"], default="both"
+    )
+    parser.add_argument(
+        "--reset", action="store_true", help="清空資料庫並載入 schema.sql"
+    )
+    args = parser.parse_args()
+    if not BENCH_DB_URL:
+        raise SystemExit("請設定 BENCH_DB_URL")
+
+    db = await asyncpg.connect(BENCH_DB_URL)
+    try:
+        if args.reset:
+            await reset_schema(db)
+        modes = ["legacy", "batched"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            await seed_expired_orders(db, args.orders)
+            started = time.perf_counter()
+            if mode == "legacy":
+                await legacy_cleanup(db)
+            else:
+                await run_cleanup(db, args.batch_size)
+            elapsed = time.perf_counter() - started
+            remaining = await db.fetchval(
+                "SELECT COUNT(*) FROM orders WHERE order_number LIKE 'BENCH%'"
+            )
+            deleted = args.orders - remaining
+            print(
+                f"{mode:8s} deleted={deleted} remaining={remaining} "
+                f"elapsed={elapsed:.2f}s rate={deleted / elapsed:.0f} orders/s"
+            )
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
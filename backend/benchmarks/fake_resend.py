@@ -0,0 +1,131 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 取代 Resend 的本地假伺服器，只實作郵件 outbox 使用的批次 API（POST /emails/batch）。
+# 用法：
+#   python benchmarks/fake_resend.py --port 8025 --delay 0.2 --fail-rate 0.1
+#   RESEND_API_URL=http://localhost:8025 RESEND_API_KEY=re_test uvicorn main:app
+# 與 Resend 相同，相同的 Idempotency-Key 會回傳第一次的結果而不重複「寄出」；
+# GET /stats 回傳實際寄出的郵件數與重複寄給同一收件者、同一主旨的次數，可用來驗證重試不會重複寄送。
+
+
+class FakeResendState:
+    def __init__(self, delay: float = 0.0, fail_rate: float = 0.0):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.sent = []
+        self.requests = 0
+
+    def send_batch(self, emails: list, idempotency_key: str = None):
+        with self.lock:
+            self.requests += 1
+            if idempotency_key in self.responses:
+                return self.responses[idempotency_key]
+        # 延遲在判斷失敗之前，可模擬「呼叫端已逾時，但伺服器仍完成寄送」
+        if self.delay:
+            time.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            return None
+        with self.lock:
+            if idempotency_key in self.responses:
+                return self.responses[idempotency_key]
+            response = {"data": [{"id": str(uuid.uuid4())} for _ in emails]}
+            self.sent.extend(emails)
+            if idempotency_key:
+                self.responses[idempotency_key] = response
+            return response
+
+    def stats(self):
+        with self.lock:
+            keys = [(str(email.get("to")), email.get("subject")) for email in self.sent]
+            return {
+                "requests": self.requests,
+                "sent": len(self.sent),
+                "duplicates": len(keys) - len(set(keys)),
+            }
+
+
+def make_handler(state: FakeResendState):
+    class FakeResendHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path != "/emails/batch":
+                self.send_json(404, {"statusCode": 404, "name": "not_found", "message": "Not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            emails = json.loads(self.rfile.read(length) or b"[]")
+            if not isinstance(emails, list) or not 1 <= len(emails) <= 100:
+                self.send_json(
+                    422,
+                    {"statusCode": 422, "name": "validation_error", "message": "1 至 100 封郵件"},
+                )
+                return
+            # 與 Resend 相同，只要一封收件者格式錯誤就拒絕整批
+            if any("@" not in str(email.get("to", "")) for email in emails):
+                self.send_json(
+                    422,
+                    {"statusCode": 422, "name": "validation_error", "message": "收件者格式錯誤"},
+                )
+                return
+            response = state.send_batch(emails, self.headers.get("Idempotency-Key"))
+            if response is None:
+                self.send_json(
+                    500,
+                    {"statusCode": 500, "name": "internal_server_error", "message": "模擬失敗"},
+                )
+                return
+            self.send_json(200, response)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self.send_json(200, state.stats())
+            else:
+                self.send_json(404, {"statusCode": 404, "name": "not_found", "message": "Not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeResendHandler
+
+
+def start_fake_resend(port: int = 0, delay: float = 0.0, fail_rate: float = 0.0):
+    # 在背景執行緒啟動，回傳 (server, state)；port 為 0 時由系統指定，實際位址見 server.server_address
+    state = FakeResendState(delay, fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 Resend 批次 API")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--delay", type=float, default=0.0, help="每次寄送的延遲秒數")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="回應 500 的比例")
+    args = parser.parse_args()
+    state = FakeResendState(args.delay, args.fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"假 Resend 伺服器啟動於 http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,702 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+import asyncpg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.cleanup_benchmark import reset_schema  # noqa: E402
+from services.booking_service import determine_region  # noqa: E402
+
+# 用法（請連到可任意清空的本地資料庫）：
+#   BENCH_DB_URL=postgresql://postgres@localhost/coolslate_bench \
+#   python benchmarks/generate_data.py --reset --orders 2000000
+#   python benchmarks/generate_data.py --orders 500000 --days-back 180 \
+#       --service-mix INSTALLATION=0.4,MAINTENANCE=0.4,REPAIR=0.2 \
+#       --hot-dates 2026-07-04 2026-07-05 --cancel-rate 0.08
+# 訂單依建立時間由舊到新產生，逐筆走過與應用程式相同的生命週期（鎖定、付款、排程、取消、完工），
+# 並以各時段的人力使用量判斷能否排入，資料表之間的關聯與人力上限皆與實際流程一致。
+# 每批資料在背景執行緒產生，同時以 COPY 寫入前一批。
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+OPENING_HOUR = 8
+CLOSING_HOUR = 17
+HOLD_MINUTES = 30
+REPAIR_SCHEDULING_HOUR = 15
+FULL_SLOTS_FEEDBACK = "偏好時段皆已滿"
+
+COLUMNS = {
+    "users": ["id", "email", "google_id", "name", "role", "created_at", "updated_at"],
+    "orders": [
+        "id", "order_number", "user_id", "service_type_id", "location_address",
+        "location_lat", "location_lng", "unit_count", "total_amount", "equipment_details",
+        "notes", "status", "payment_status", "checkout_session_id", "scheduling_feedback",
+        "created_at", "updated_at",
+    ],
+    "booking_slots": [
+        "id", "order_id", "preferred_date", "preferred_time", "contact_name", "contact_phone",
+        "is_primary", "is_locked", "temp_lock_id", "lock_expires_at", "is_selected",
+    ],
+    "schedules": [
+        "id", "order_id", "booking_slot_id", "scheduled_date", "scheduled_time",
+        "estimated_end_time", "assigned_workers", "status",
+    ],
+    "daily_workforce_usage": ["id", "date", "time_slot", "used_workers", "schedule_id"],
+    "time_slot_locks": [
+        "id", "slot_date", "slot_time", "locked_workers", "lock_type", "reference_id",
+        "expires_at", "created_at",
+    ],
+    "order_completions": [
+        "id", "order_id", "completion_file_url", "completion_file_name", "created_at",
+    ],
+}
+# 依外鍵相依順序寫入
+LOAD_ORDER = [
+    "users", "orders", "booking_slots", "schedules",
+    "daily_workforce_usage", "time_slot_locks", "order_completions",
+]
+
+# 各行政區中心座標，地址與座標在中心附近依 --spread-km 常態分布
+DISTRICTS = {
+    "台北市": [
+        ("信義區", 25.0330, 121.5654), ("大安區", 25.0264, 121.5435),
+        ("中山區", 25.0685, 121.5266), ("內湖區", 25.0836, 121.5880),
+        ("士林區", 25.0930, 121.5246), ("文山區", 24.9889, 121.5700),
+        ("松山區", 25.0500, 121.5775), ("中正區", 25.0324, 121.5199),
+        ("萬華區", 25.0355, 121.4999), ("北投區", 25.1321, 121.4987),
+        ("南港區", 25.0547, 121.6067), ("大同區", 25.0633, 121.5131),
+    ],
+    "新北市": [
+        ("板橋區", 25.0117, 121.4590), ("新莊區", 25.0360, 121.4500),
+        ("中和區", 24.9993, 121.4990), ("永和區", 25.0094, 121.5155),
+        ("三重區", 25.0615, 121.4880), ("新店區", 24.9675, 121.5414),
+        ("土城區", 24.9723, 121.4437), ("汐止區", 25.0628, 121.6410),
+        ("淡水區", 25.1696, 121.4408), ("三峽區", 24.9340, 121.3690),
+    ],
+    "桃園市": [("桃園區", 24.9936, 121.3010), ("中壢區", 24.9655, 121.2246)],
+    "基隆市": [("仁愛區", 25.1276, 121.7402), ("七堵區", 25.0950, 121.7130)],
+    "新竹市": [("東區", 24.8039, 120.9710)],
+}
+ROADS = [
+    "中正路", "中山路", "民生東路", "民權東路", "復興南路", "文化路",
+    "仁愛路", "忠孝東路", "和平東路", "光復南路", "建國北路", "成功路",
+]
+SECTIONS = ["", "一段", "二段", "三段", "四段"]
+SURNAMES = "陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周"
+GIVEN_NAMES = [
+    "志明", "淑芬", "家豪", "雅婷", "俊傑", "怡君", "建宏", "美玲",
+    "宗翰", "佳穎", "冠宇", "欣怡", "承恩", "詩涵", "柏翰", "品妤",
+]
+
+
+def parse_mix(value: str, key_type=str):
+    # 「名稱=權重」以逗號分隔，權重不需加總為 1
+    mix = {}
+    for part in value.split(","):
+        key, _, weight = part.partition("=")
+        mix[key_type(key.strip())] = float(weight)
+    if not mix or any(weight < 0 for weight in mix.values()) or not sum(mix.values()):
+        raise argparse.ArgumentTypeError(f"無效的分布設定：{value}")
+    return mix
+
+
+def make_picker(mix: dict):
+    keys = list(mix)
+    cumulative = []
+    total = 0.0
+    for key in keys:
+        total += mix[key]
+        cumulative.append(total)
+    return keys, cumulative
+
+
+def person_name(index: int):
+    return SURNAMES[index % len(SURNAMES)] + GIVEN_NAMES[index // len(SURNAMES) % len(GIVEN_NAMES)]
+
+
+def person_phone(index: int):
+    return f"09{index * 7919 % 100000000:08d}"
+
+
+def hours_for(service: dict, unit_count: int):
+    hours = service["base_duration_hours"] + (unit_count - 1) * service["additional_duration_hours"]
+    return min(hours, 8)
+
+
+async def load_catalog(db):
+    services = {
+        record["name"]: dict(record)
+        for record in await db.fetch(
+            """
+            SELECT id, name, required_workers, base_duration_hours, additional_duration_hours,
+                   booking_advance_months
+            FROM service_types
+            """
+        )
+    }
+    unit_pricing = {
+        record["name"]: (record["base_price"], record["additional_price"])
+        for record in await db.fetch(
+            """
+            SELECT st.name, up.base_price, up.additional_price
+            FROM unit_pricing up JOIN service_types st ON up.service_type_id = st.id
+            """
+        )
+    }
+    location_pricing = {
+        (record["name"], record["region"]): record["price"]
+        for record in await db.fetch(
+            """
+            SELECT st.name, lp.region, lp.price
+            FROM location_pricing lp JOIN service_types st ON lp.service_type_id = st.id
+            """
+        )
+    }
+    products = [
+        dict(record)
+        for record in await db.fetch("SELECT name, model, price FROM products WHERE is_active = true")
+    ]
+    company = await db.fetchrow("SELECT * FROM company_settings LIMIT 1")
+    return {
+        "services": services,
+        "unit_pricing": unit_pricing,
+        "location_pricing": location_pricing,
+        "products": products,
+        "company": dict(company),
+    }
+
+
+def estimate_workers(args, catalog):
+    # 依服務組合與台數分布估算每日所需工時，使整體使用率約為 --utilization，
+    # 熱門日期與週末仍會額滿，產生真實比例的排程失敗
+    services = catalog["services"]
+    service_total = sum(args.service_mix.values())
+    unit_total = sum(args.unit_mix.values())
+    worker_hours = 0.0
+    for name, service_weight in args.service_mix.items():
+        service = services[name]
+        expected_hours = sum(
+            weight / unit_total * hours_for(service, units)
+            for units, weight in args.unit_mix.items()
+        )
+        worker_hours += service_weight / service_total * service["required_workers"] * expected_hours
+    daily_hours = args.orders * worker_hours / max(args.days_back, 1)
+    workers = daily_hours / ((CLOSING_HOUR - OPENING_HOUR) * args.utilization)
+    return max(catalog["company"]["total_workers"], math.ceil(workers))
+
+
+class DataGenerator:
+    def __init__(self, args, catalog, total_workers: int, first_ids: dict, usage: dict, now: datetime):
+        self.args = args
+        self.catalog = catalog
+        self.total_workers = total_workers
+        self.next_ids = {table: first_id + 1 for table, first_id in first_ids.items()}
+        self.first_user_id = first_ids["users"] + 1
+        self.now = now
+        self.today = now.date()
+        self.rng = random.Random(args.seed)
+        # (日期, 小時) -> 已排定人力；未付款訂單的暫時鎖定另計
+        self.usage = usage
+        self.held = Counter()
+        self.stats = Counter()
+        self.metrics = Counter()
+        self.metric_amounts = Counter()
+        self.services, self.service_cumulative = make_picker(args.service_mix)
+        self.unit_counts, self.unit_cumulative = make_picker(args.unit_mix)
+        self.cities, self.city_cumulative = make_picker(args.city_mix)
+        self.history_start = now - timedelta(days=args.days_back)
+        self.hot_dates = set(args.hot_dates)
+        self.max_date_weight = (
+            max(args.weekend_weight, 1) * max(args.summer_weight, 1)
+            * max(args.hot_date_weight if self.hot_dates else 1, 1)
+        )
+        self.admin_name = None
+
+    def take_id(self, table: str):
+        value = self.next_ids[table]
+        self.next_ids[table] += 1
+        return value
+
+    def generate_users(self, first: int, count: int):
+        rows = []
+        for index in range(first, first + count):
+            user_id = self.take_id("users")
+            created_at = self.history_start - timedelta(
+                days=self.rng.randint(1, 720), seconds=self.rng.randint(0, 86399)
+            )
+            rows.append(
+                (user_id, f"gen{index}@example.com", f"gen-{index}", person_name(index),
+                 "customer", created_at, created_at)
+            )
+        return {"users": rows}
+
+    def generate_admins(self):
+        rows = []
+        for index in range(self.args.admins):
+            user_id = self.take_id("users")
+            name = f"管理員{index + 1}"
+            rows.append(
+                (user_id, f"gen-admin{index}@example.com", f"gen-admin-{index}", name,
+                 "admin", self.history_start, self.history_start)
+            )
+        self.admin_name = rows[0][3] if rows else "管理員"
+        return {"users": rows}
+
+    def date_weight(self, target: date):
+        weight = 1.0
+        if target.weekday() >= 5:
+            weight *= self.args.weekend_weight
+        # 冷氣安裝與保養集中在夏季
+        if 6 <= target.month <= 9:
+            weight *= self.args.summer_weight
+        if target in self.hot_dates:
+            weight *= self.args.hot_date_weight
+        return weight
+
+    def pick_date(self, created: date, advance_days: int):
+        # 提前天數偏向兩週內，再依日期權重拒絕取樣
+        for _ in range(20):
+            lead = 1 + min(int(self.rng.expovariate(1 / self.args.mean_lead_days)), advance_days - 1)
+            target = created + timedelta(days=lead)
+            if self.rng.random() * self.max_date_weight <= self.date_weight(target):
+                return target
+        return target
+
+    def pick_slots(self, created: date, hours: int, advance_days: int):
+        count = 2 if self.rng.random() < self.args.second_slot_share else 1
+        slots = []
+        while len(slots) < count:
+            slot = (
+                self.pick_date(created, advance_days),
+                self.rng.randint(OPENING_HOUR, CLOSING_HOUR - hours),
+            )
+            if slot not in slots:
+                slots.append(slot)
+        return slots
+
+    def pick_address(self):
+        city = self.rng.choices(self.cities, cum_weights=self.city_cumulative)[0]
+        district, lat, lng = self.rng.choice(DISTRICTS[city])
+        spread = self.args.spread_km / 111.0
+        lat += self.rng.gauss(0, spread)
+        lng += self.rng.gauss(0, spread / math.cos(math.radians(lat)))
+        address = (
+            f"{city}{district}{self.rng.choice(ROADS)}{self.rng.choice(SECTIONS)}"
+            f"{self.rng.randint(1, 300)}號"
+        )
+        if self.rng.random() < 0.6:
+            address += f"{self.rng.randint(2, 20)}樓"
+        return address, round(lat, 6), round(lng, 6)
+
+    def fits(self, slot_date: date, hour: int, hours: int, workers: int):
+        return all(
+            self.usage.get((slot_date, h), 0) + self.held[(slot_date, h)] + workers <= self.total_workers
+            for h in range(hour, hour + hours)
+        )
+
+    def order_amount(self, service_name: str, unit_count: int, address: str):
+        if service_name == "INSTALLATION":
+            product = self.rng.choice(self.catalog["products"])
+            equipment = [{**product, "quantity": unit_count}]
+            return product["price"] * unit_count, equipment
+        if service_name in self.catalog["unit_pricing"]:
+            base_price, additional_price = self.catalog["unit_pricing"][service_name]
+            return base_price + (unit_count - 1) * additional_price, None
+        price = self.catalog["location_pricing"].get((service_name, determine_region(address)))
+        return price or 1000, None
+
+    def record_metric(self, when: datetime, event: str, service_id: int, region: str, amount: int, reason: str = ""):
+        # 所有時間皆為台北時區，與 record_order_metrics 的日期切分相同
+        key = (when.date(), event, service_id, region, reason)
+        self.metrics[key] += 1
+        self.metric_amounts[key] += amount
+
+    def repair_run_time(self, paid_at: datetime):
+        # 維修排程任務每日 15:00 處理付款後待排程的訂單
+        run = paid_at.replace(hour=REPAIR_SCHEDULING_HOUR, minute=0, second=0, microsecond=0)
+        if run <= paid_at:
+            run += timedelta(days=1)
+        return run
+
+    def distance_km(self, lat: float, lng: float):
+        company = self.catalog["company"]
+        lat1, lng1 = math.radians(lat), math.radians(lng)
+        lat2, lng2 = math.radians(company["company_lat"]), math.radians(company["company_lng"])
+        a = (
+            math.sin((lat2 - lat1) / 2) ** 2
+            + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        )
+        return 6371 * 2 * math.asin(math.sqrt(a))
+
+    def generate_orders(self, first: int, count: int):
+        tables = {table: [] for table in LOAD_ORDER}
+        span = (self.now - self.history_start) / self.args.orders
+        for index in range(first, first + count):
+            # 依序分布於整段期間，訂單 id 與建立時間同樣遞增
+            created_at = self.history_start + span * (index + self.rng.random())
+            self.generate_order(created_at, tables)
+        return tables
+
+    def generate_order(self, created_at: datetime, tables: dict):
+        rng = self.rng
+        args = self.args
+        service_name = rng.choices(self.services, cum_weights=self.service_cumulative)[0]
+        service = self.catalog["services"][service_name]
+        unit_count = rng.choices(self.unit_counts, cum_weights=self.unit_cumulative)[0]
+        hours = hours_for(service, unit_count)
+        workers = service["required_workers"]
+        needs_locking = service_name in ["INSTALLATION", "MAINTENANCE"]
+        slots = self.pick_slots(created_at.date(), hours, service["booking_advance_months"] * 30)
+
+        # 與 create_order_with_lock 相同：時段已滿則無法建立訂單
+        available = [slot for slot in slots if self.fits(slot[0], slot[1], hours, workers)]
+        if needs_locking and not available:
+            self.stats["rejected"] += 1
+            return
+
+        user_index = int(args.users * rng.random() ** args.repeat_skew)
+        user_id = self.first_user_id + user_index
+        address, lat, lng = self.pick_address()
+        region = determine_region(address)
+        total_amount, equipment = self.order_amount(service_name, unit_count, address)
+        order_id = self.take_id("orders")
+        order_number = self.order_number(order_id, created_at)
+        order = {
+            "status": "pending",
+            "payment_status": "unpaid",
+            "notes": None,
+            "feedback": None,
+            "updated_at": created_at,
+        }
+        in_checkout = created_at > self.now - timedelta(minutes=HOLD_MINUTES)
+        unpaid = in_checkout and rng.random() < args.unpaid_share
+        paid_at = created_at + timedelta(minutes=rng.uniform(1, min(HOLD_MINUTES, 10)))
+        if not unpaid and paid_at > self.now:
+            paid_at = self.now
+
+        slot_rows = []
+        for i, (slot_date, hour) in enumerate(slots):
+            slot_rows.append(
+                [self.take_id("booking_slots"), order_id, slot_date, dt_time(hour),
+                 person_name(user_index), person_phone(user_index), i == 0, False, None, None, False]
+            )
+
+        selected = None
+        if unpaid:
+            # 結帳中的訂單持有暫時鎖定，到期後由清理任務刪除
+            if needs_locking:
+                expires_at = created_at + timedelta(minutes=HOLD_MINUTES)
+                for row, slot in zip(slot_rows, slots):
+                    if slot not in available:
+                        continue
+                    first_lock_id = None
+                    for h in range(slot[1], slot[1] + hours):
+                        lock_id = self.take_id("time_slot_locks")
+                        first_lock_id = first_lock_id or lock_id
+                        self.held[(slot[0], h)] += workers
+                        tables["time_slot_locks"].append(
+                            (lock_id, slot[0], dt_time(h), workers, "booking", None, expires_at, created_at)
+                        )
+                    row[7:10] = [True, first_lock_id, expires_at]
+            self.stats["pending"] += 1
+        else:
+            order["payment_status"] = "paid"
+            order["status"] = "pending_schedule"
+            order["updated_at"] = paid_at
+            self.record_metric(paid_at, "paid", service["id"], region, total_amount)
+            cancelled = rng.random() < args.cancel_rate
+            scheduled_at = None
+            if needs_locking:
+                # 付款後第一個成功鎖定的時段轉為正式排程，其餘鎖定釋放
+                selected = slots.index(available[0])
+                scheduled_at = paid_at
+            else:
+                run_at = self.repair_run_time(paid_at)
+                if run_at <= self.now:
+                    distance = self.distance_km(lat, lng)
+                    max_distance = self.catalog["company"]["max_service_distance_km"]
+                    if distance > max_distance:
+                        order["feedback"] = f"超出服務範圍 ({distance:.1f}km > {max_distance}km)"
+                    elif available:
+                        selected = slots.index(available[0])
+                        scheduled_at = run_at
+                    else:
+                        order["feedback"] = FULL_SLOTS_FEEDBACK
+                    if order["feedback"]:
+                        order["status"] = "scheduling_failed"
+                        order["updated_at"] = run_at
+                        self.record_metric(
+                            run_at, "scheduling_failed", service["id"], region, total_amount,
+                            order["feedback"],
+                        )
+
+            slot_date = slots[selected if selected is not None else 0][0]
+            if cancelled:
+                # 取消須於預定日三日前申請；管理員退款後取消，排程與人力紀錄一併刪除
+                last_request = datetime.combine(
+                    slot_date - timedelta(days=3), dt_time(23, 59), tzinfo=TAIPEI_TZ
+                )
+                latest = min(last_request, self.now)
+                if latest > paid_at:
+                    requested_at = paid_at + (latest - paid_at) * rng.random()
+                    processed_at = requested_at + timedelta(hours=rng.uniform(1, 48))
+                    if scheduled_at:
+                        self.record_metric(scheduled_at, "scheduled", service["id"], region, total_amount)
+                    if processed_at > self.now:
+                        order["status"] = "precancel"
+                        order["updated_at"] = requested_at
+                    else:
+                        order["status"] = "cancelled"
+                        order["payment_status"] = "refunded"
+                        order["updated_at"] = processed_at
+                        order["feedback"] = None
+                        order["notes"] = (
+                            f"[退款記錄] 退款人：{self.admin_name}，"
+                            f"退款時間：{processed_at:%Y-%m-%d %H:%M:%S}"
+                        )
+                        self.record_metric(processed_at, "refunded", service["id"], region, total_amount)
+                        self.record_metric(processed_at, "cancelled", service["id"], region, total_amount)
+                        selected = None
+                else:
+                    cancelled = False
+
+            if selected is not None and not cancelled:
+                order["status"] = "scheduled"
+                order["updated_at"] = scheduled_at
+                self.record_metric(scheduled_at, "scheduled", service["id"], region, total_amount)
+                # 完工需上傳驗收報告，近兩日的工單部分尚未結案
+                recent = slot_date >= self.today - timedelta(days=2)
+                if slot_date < self.today and not (recent and rng.random() < 0.5):
+                    completed_at = datetime.combine(
+                        slot_date + timedelta(days=1), dt_time(rng.randint(9, 20)), tzinfo=TAIPEI_TZ
+                    )
+                    completed_at = min(completed_at, self.now)
+                    order["status"] = "completed"
+                    order["updated_at"] = completed_at
+                    self.record_metric(completed_at, "completed", service["id"], region, total_amount)
+                    report_key = f"{order_id:08x}{rng.getrandbits(64):016x}"
+                    tables["order_completions"].append(
+                        (self.take_id("order_completions"), order_id,
+                         f"{args.cdn_domain}/{order_number}_{report_key}_report.pdf",
+                         "驗收報告.pdf", completed_at)
+                    )
+            if selected is not None and order["status"] != "cancelled":
+                self.add_schedule(
+                    tables, order_id, slot_rows[selected], hours, workers, needs_locking, created_at
+                )
+            self.stats[order["status"]] += 1
+
+        tables["orders"].append(
+            (order_id, order_number, user_id, service["id"], address,
+             lat, lng, unit_count, total_amount,
+             json.dumps(equipment, ensure_ascii=False) if equipment else None,
+             order["notes"], order["status"], order["payment_status"], f"cs_gen_{order_id:010d}",
+             order["feedback"], created_at, order["updated_at"])
+        )
+        tables["booking_slots"].extend(tuple(row) for row in slot_rows)
+
+    def add_schedule(self, tables, order_id, slot_row, hours, workers, needs_locking, created_at):
+        slot_id, _, slot_date, start_time = slot_row[:4]
+        schedule_id = self.take_id("schedules")
+        tables["schedules"].append(
+            (schedule_id, order_id, slot_id, slot_date, start_time,
+             dt_time(start_time.hour + hours), workers, "scheduled")
+        )
+        slot_row[10] = True
+        if needs_locking:
+            # 建立訂單時的暫時鎖定，付款後由 convert_lock_to_schedule 逐小時轉為排程鎖定
+            slot_row[7:10] = [
+                True, self.next_ids["time_slot_locks"], created_at + timedelta(minutes=HOLD_MINUTES)
+            ]
+        for h in range(start_time.hour, start_time.hour + hours):
+            self.usage[(slot_date, h)] = self.usage.get((slot_date, h), 0) + workers
+            tables["daily_workforce_usage"].append(
+                (self.take_id("daily_workforce_usage"), slot_date, dt_time(h), workers, schedule_id)
+            )
+            if needs_locking:
+                tables["time_slot_locks"].append(
+                    (self.take_id("time_slot_locks"), slot_date, dt_time(h), workers, "schedule",
+                     schedule_id, None, created_at)
+                )
+
+    @staticmethod
+    def order_number(order_id: int, created_at: datetime):
+        # 與 create_order_with_lock 相同格式，尾碼改由訂單 id 取得以確保不重複
+        return f"AC{created_at:%Y%m%d%H%M%S}{order_id % 65536:04X}"
+
+
+async def copy_tables(db, tables: dict):
+    # 每批在同一交易內依外鍵順序寫入，批次失敗不會留下孤兒資料列
+    async with db.transaction():
+        for table in LOAD_ORDER:
+            rows = tables.get(table)
+            if rows:
+                await db.copy_records_to_table(table, records=rows, columns=COLUMNS[table])
+    return sum(len(rows) for rows in tables.values())
+
+
+async def load_in_batches(db, produce, total: int, batch_size: int, label: str):
+    rows = 0
+    pending = None
+    started = time.perf_counter()
+    for first in range(0, total, batch_size):
+        tables = await asyncio.to_thread(produce, first, min(batch_size, total - first))
+        if pending:
+            rows += await pending
+        pending = asyncio.create_task(copy_tables(db, tables))
+        done = min(first + batch_size, total)
+        elapsed = time.perf_counter() - started
+        print(f"\r{label} {done}/{total}（{elapsed:.0f}s）", end="", flush=True)
+    if pending:
+        rows += await pending
+    print()
+    return rows
+
+
+async def write_metrics(db, generator: DataGenerator):
+    # 「建立」事件由 orders 的 trigger 於 COPY 時累計，其餘事件依產生的歷史時間補寫
+    records = [
+        (*key, generator.metrics[key], generator.metric_amounts[key])
+        for key in generator.metrics
+    ]
+    if not records:
+        return
+    async with db.transaction():
+        await db.execute(
+            "CREATE TEMP TABLE generated_metrics (LIKE order_daily_metrics) ON COMMIT DROP"
+        )
+        await db.copy_records_to_table(
+            "generated_metrics",
+            records=records,
+            columns=["metric_date", "event", "service_type_id", "region", "reason", "order_count", "amount"],
+        )
+        await db.execute(
+            """
+            INSERT INTO order_daily_metrics
+                (metric_date, event, service_type_id, region, reason, order_count, amount)
+            SELECT metric_date, event, service_type_id, region, reason, order_count, amount
+            FROM generated_metrics
+            ORDER BY 1, 2, 3, 4, 5
+            ON CONFLICT (metric_date, event, service_type_id, region, reason) DO UPDATE
+            SET order_count = order_daily_metrics.order_count + EXCLUDED.order_count,
+                amount = order_daily_metrics.amount + EXCLUDED.amount
+            """
+        )
+
+
+async def generate(db, args):
+    catalog = await load_catalog(db)
+    unknown = set(args.service_mix) - set(catalog["services"])
+    if unknown:
+        raise SystemExit(f"未知的服務類型：{', '.join(sorted(unknown))}")
+    unknown = set(args.city_mix) - set(DISTRICTS)
+    if unknown:
+        raise SystemExit(f"未支援的縣市：{', '.join(sorted(unknown))}（可用：{', '.join(DISTRICTS)}）")
+
+    total_workers = args.workers or estimate_workers(args, catalog)
+    if total_workers != catalog["company"]["total_workers"]:
+        await db.execute("UPDATE company_settings SET total_workers = $1", total_workers)
+        print(f"總人力調整為 {total_workers} 人")
+
+    first_ids = {}
+    for table in LOAD_ORDER:
+        first_ids[table] = await db.fetchval(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    # 既有的人力使用量也計入各時段上限
+    usage = {
+        (record["date"], record["time_slot"].hour): record["used_workers"]
+        for record in await db.fetch(
+            """
+            SELECT date, time_slot, SUM(used_workers)::int AS used_workers
+            FROM daily_workforce_usage GROUP BY date, time_slot
+            """
+        )
+    }
+    generator = DataGenerator(
+        args, catalog, total_workers, first_ids, usage, datetime.now(TAIPEI_TZ)
+    )
+
+    started = time.perf_counter()
+    rows = await load_in_batches(db, generator.generate_users, args.users, args.batch_size, "users")
+    rows += await copy_tables(db, generator.generate_admins())
+    rows += await load_in_batches(
+        db, generator.generate_orders, args.orders, args.batch_size, "orders"
+    )
+    await write_metrics(db, generator)
+
+    for table in LOAD_ORDER:
+        await db.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        )
+    load_elapsed = time.perf_counter() - started
+    await db.execute("ANALYZE")
+
+    print(f"寫入 {rows} 筆資料，耗時 {load_elapsed:.1f}s（{rows / load_elapsed:.0f} rows/s）")
+    for table in LOAD_ORDER:
+        generated = generator.next_ids[table] - first_ids[table] - 1
+        print(f"  {table:22s}{generated:>12d}")
+    print("訂單狀態：" + "，".join(f"{key}={value}" for key, value in sorted(generator.stats.items())))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="產生大量一致的測試資料並以 COPY 載入")
+    parser.add_argument("--reset", action="store_true", help="清空資料庫並載入 schema.sql")
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--users", type=int, help="預設為訂單數的四分之一")
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--days-back", type=int, default=365, help="訂單建立時間的涵蓋天數")
+    parser.add_argument(
+        "--service-mix", type=parse_mix, default="INSTALLATION=0.25,MAINTENANCE=0.5,REPAIR=0.25",
+    )
+    parser.add_argument(
+        "--unit-mix", type=lambda value: parse_mix(value, int), default="1=0.6,2=0.25,3=0.1,4=0.05",
+        help="每張訂單的台數分布",
+    )
+    parser.add_argument(
+        "--city-mix", type=parse_mix,
+        default="台北市=0.5,新北市=0.38,桃園市=0.07,基隆市=0.03,新竹市=0.02",
+        help="服務地址的縣市分布，新竹、桃園部分地址超出服務範圍",
+    )
+    parser.add_argument("--spread-km", type=float, default=1.5, help="地址座標與行政區中心的標準差")
+    parser.add_argument("--hot-dates", nargs="*", type=date.fromisoformat, default=[])
+    parser.add_argument("--hot-date-weight", type=float, default=6.0)
+    parser.add_argument("--weekend-weight", type=float, default=1.6)
+    parser.add_argument("--summer-weight", type=float, default=2.5, help="6 至 9 月的預約權重")
+    parser.add_argument("--mean-lead-days", type=float, default=14, help="預約日期平均提前天數")
+    parser.add_argument("--second-slot-share", type=float, default=0.4, help="填寫第二個偏好時段的比例")
+    parser.add_argument("--cancel-rate", type=float, default=0.05)
+    parser.add_argument("--unpaid-share", type=float, default=0.5, help="近 30 分鐘內尚未付款的比例")
+    parser.add_argument("--repeat-skew", type=float, default=1.5, help="大於 1 時少數會員下單較多")
+    parser.add_argument("--workers", type=int, help="總人力，預設依訂單量與 --utilization 估算")
+    parser.add_argument("--utilization", type=float, default=0.7)
+    parser.add_argument("--cdn-domain", default="https://cdn.example.com")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if args.users is None:
+        args.users = max(1, args.orders // 4)
+    if not BENCH_DB_URL:
+        raise SystemExit("請設定 BENCH_DB_URL")
+
+    db = await asyncpg.connect(BENCH_DB_URL)
+    try:
+        if args.reset:
+            await reset_schema(db)
+        await generate(db, args)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
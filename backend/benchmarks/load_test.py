@@ -0,0 +1,609 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+import asyncpg
+
+# 用法（兩種擇一）：
+#   BENCH_DB_URL=postgresql://postgres@localhost/coolslate_bench \
+#   python benchmarks/load_test.py --reset --output results/baseline.json
+#   python benchmarks/load_test.py --boot-postgres --output results/after.json \
+#       --compare results/baseline.json
+# --boot-postgres 以 initdb / pg_ctl 在暫存目錄建立只監聽 unix socket 的叢集（需以非 root 使用者執行），
+# 結束後自動停止並刪除。應用程式在同一行程內以 httpx.ASGITransport 驅動，含 lifespan 與背景工作。
+os.environ.setdefault("JWT_KEY", "bench-jwt-key")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+import db.database as database  # noqa: E402
+from benchmarks.cleanup_benchmark import reset_schema, seed_expired_orders  # noqa: E402
+from services.background_service import run_cleanup  # noqa: E402
+from utils.auth import create_jwt_token  # noqa: E402
+from utils.metrics import db_queries_per_request  # noqa: E402
+from utils.query_logger import RequestQueries, current_request_queries  # noqa: E402
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+SCENARIOS = ["calendar", "check_units", "booking", "webhook", "admin_orders", "cleanup"]
+SERVICE_TYPES = ["INSTALLATION", "MAINTENANCE", "REPAIR"]
+SLOT_TIMES = ["09:00", "10:00", "11:00", "13:00", "14:00"]
+ADDRESSES = [
+    "台北市信義區市府路1號",
+    "台北市大安區忠孝東路四段100號",
+    "新北市板橋區文化路一段50號",
+    "新北市新店區北新路三段200號",
+    "桃園市中壢區中正路10號",
+    "基隆市仁愛區愛一路1號",
+]
+
+
+def start_local_postgres(data_dir: Path):
+    # 每次使用全新的叢集，結果不受本機既有資料庫的資料量與設定影響
+    subprocess.run(
+        ["initdb", "-D", str(data_dir), "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        [
+            "pg_ctl", "-D", str(data_dir), "-l", str(data_dir / "postgres.log"), "-w",
+            "-o", f"-k {data_dir} -c listen_addresses=''", "start",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return f"postgresql://postgres@/postgres?host={data_dir}"
+
+
+def stop_local_postgres(data_dir: Path):
+    subprocess.run(
+        ["pg_ctl", "-D", str(data_dir), "-m", "fast", "-w", "stop"],
+        check=False,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def seed_load_data(db, user_count: int, order_count: int, days_ahead: int, webhook_orders: int):
+    await db.execute(
+        """
+        INSERT INTO users (email, google_id, name, role)
+        SELECT 'load' || g || '@example.com', 'load-' || g, '測試使用者' || g, 'customer'
+        FROM generate_series(1, $1) AS g
+        ON CONFLICT (email) DO NOTHING
+        """,
+        user_count,
+    )
+    await db.execute(
+        """
+        INSERT INTO users (email, google_id, name, role)
+        VALUES ('load-admin@example.com', 'load-admin', '測試管理員', 'admin')
+        ON CONFLICT (email) DO NOTHING
+        """
+    )
+    # 一半為過去已完成的訂單，其餘依序為已取消、待排程、待付款；
+    # 每 10 筆中的最後一筆在未來兩個時段（09:00、13:00）各排一張，每時段最多一張以免超出人力
+    await db.execute(
+        """
+        INSERT INTO orders (order_number, user_id, service_type_id, location_address,
+                            unit_count, total_amount, status, payment_status, created_at, updated_at)
+        SELECT 'LOAD' || lpad(g::text, 8, '0'),
+               (SELECT MIN(id) FROM users WHERE email LIKE 'load%') + g % $2,
+               (ARRAY(SELECT id FROM service_types ORDER BY priority))[1 + g % 3],
+               (ARRAY['台北市信義區市府路1號', '台北市大安區忠孝東路四段100號',
+                      '新北市板橋區文化路一段50號', '桃園市中壢區中正路10號'])[1 + g % 4],
+               CASE WHEN g % 10 = 9 THEN 1 ELSE 1 + g % 3 END,
+               2000 + (g % 5) * 1000,
+               CASE
+                   WHEN g % 10 = 9 AND g / 10 < $3 * 2 THEN 'scheduled'
+                   WHEN g % 10 < 5 OR g % 10 = 9 THEN 'completed'
+                   WHEN g % 10 = 5 THEN 'cancelled'
+                   WHEN g % 10 < 8 THEN 'pending_schedule'
+                   ELSE 'pending'
+               END,
+               CASE WHEN g % 10 IN (5, 8) THEN 'unpaid' ELSE 'paid' END,
+               CASE
+                   WHEN g % 10 = 8 THEN NOW() - make_interval(mins => g % 20)
+                   ELSE NOW() - make_interval(days => 4 + g % 180, mins => g % 1440)
+               END,
+               NOW()
+        FROM generate_series(1, $1) AS g
+        """,
+        order_count,
+        user_count,
+        days_ahead,
+    )
+    await db.execute(
+        """
+        INSERT INTO booking_slots (order_id, preferred_date, preferred_time, contact_name,
+                                   contact_phone, is_primary, is_selected)
+        SELECT o.id,
+               CASE
+                   WHEN o.status = 'scheduled' THEN CURRENT_DATE + 1 + (n / 10) % $1
+                   WHEN o.status IN ('completed', 'cancelled') THEN o.created_at::date + 3
+                   ELSE CURRENT_DATE + 1 + n % $1
+               END,
+               CASE
+                   WHEN o.status = 'scheduled' THEN (ARRAY[TIME '09:00', TIME '13:00'])[1 + (n / 10 / $1) % 2]
+                   ELSE (ARRAY[TIME '09:00', TIME '10:00', TIME '11:00', TIME '13:00', TIME '14:00'])[1 + n % 5]
+               END,
+               '王小明', '0912345678', true, o.status IN ('scheduled', 'completed')
+        FROM orders o, LATERAL (SELECT substring(o.order_number FROM 5)::int AS n) AS x
+        WHERE o.order_number LIKE 'LOAD%'
+        """,
+        days_ahead,
+    )
+    await db.execute(
+        """
+        INSERT INTO schedules (order_id, booking_slot_id, scheduled_date, scheduled_time,
+                               estimated_end_time, assigned_workers, status)
+        SELECT o.id, bs.id, bs.preferred_date, bs.preferred_time,
+               bs.preferred_time + make_interval(hours => LEAST(
+                   st.base_duration_hours + (o.unit_count - 1) * st.additional_duration_hours, 8)),
+               st.required_workers, o.status
+        FROM orders o
+        JOIN booking_slots bs ON bs.order_id = o.id
+        JOIN service_types st ON st.id = o.service_type_id
+        WHERE o.order_number LIKE 'LOAD%' AND o.status IN ('scheduled', 'completed')
+        """
+    )
+    # 與 convert_lock_to_schedule 相同：每個工時一筆人力使用紀錄與 schedule 類型的鎖定
+    await db.execute(
+        """
+        INSERT INTO daily_workforce_usage (date, time_slot, used_workers, schedule_id)
+        SELECT s.scheduled_date, s.scheduled_time + make_interval(hours => h),
+               s.assigned_workers, s.id
+        FROM schedules s
+        JOIN orders o ON o.id = s.order_id,
+        generate_series(0, EXTRACT(HOUR FROM s.estimated_end_time - s.scheduled_time)::int - 1) AS h
+        WHERE o.order_number LIKE 'LOAD%'
+        """
+    )
+    await db.execute(
+        """
+        INSERT INTO time_slot_locks (slot_date, slot_time, locked_workers, lock_type, reference_id)
+        SELECT u.date, u.time_slot, u.used_workers, 'schedule', u.schedule_id
+        FROM daily_workforce_usage u
+        JOIN schedules s ON s.id = u.schedule_id
+        JOIN orders o ON o.id = s.order_id
+        WHERE o.order_number LIKE 'LOAD%'
+        """
+    )
+    # webhook 情境使用的待付款維修訂單，維修不需鎖定時段，付款後直接進入待排程
+    await db.execute(
+        """
+        INSERT INTO orders (order_number, user_id, service_type_id, location_address,
+                            unit_count, total_amount, status, payment_status)
+        SELECT 'HOOK' || lpad(g::text, 8, '0'),
+               (SELECT MIN(id) FROM users WHERE email LIKE 'load%'),
+               (SELECT id FROM service_types WHERE name = 'REPAIR'),
+               '台北市信義區市府路1號', 1, 800, 'pending', 'unpaid'
+        FROM generate_series(1, $1) AS g
+        """,
+        webhook_orders,
+    )
+    await db.execute(
+        """
+        INSERT INTO booking_slots (order_id, preferred_date, preferred_time, contact_name,
+                                   contact_phone, is_primary)
+        SELECT id, CURRENT_DATE + 7, TIME '10:00', '王小明', '0912345678', true
+        FROM orders WHERE order_number LIKE 'HOOK%'
+        """
+    )
+    await db.execute("ANALYZE")
+
+
+def percentile(values: list, fraction: float):
+    # nearest-rank，樣本數少時不內插，避免報告數字看似比實際精確
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def snapshot_query_counts():
+    total = 0.0
+    count = 0
+    for histogram in list(db_queries_per_request.children.values()):
+        total += histogram.sum
+        count += histogram.count
+    return total, count
+
+
+async def run_scenario(name: str, make_request, total: int, concurrency: int, warmup: int):
+    for i in range(warmup):
+        await make_request(i)
+    latencies = []
+    statuses = Counter()
+    next_index = 0
+    queries_before = snapshot_query_counts()
+
+    async def client():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                status = await make_request(warmup + index)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries_after = snapshot_query_counts()
+    requests = queries_after[1] - queries_before[1]
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0,
+        "statuses": dict(sorted(statuses.items())),
+        "errors": sum(
+            count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500
+        ),
+        "queries_per_request": (
+            round((queries_after[0] - queries_before[0]) / requests, 2) if requests else None
+        ),
+    }
+
+
+def sign_stripe_payload(payload: str, secret: str):
+    # 與 stripe.Webhook.construct_event 驗證的 Stripe-Signature 格式相同
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+async def build_scenarios(client: httpx.AsyncClient, pool, rng: random.Random, args):
+    async with pool.acquire() as db:
+        user_ids = [
+            record["id"]
+            for record in await db.fetch(
+                "SELECT id FROM users WHERE email LIKE 'load%' AND role = 'customer' ORDER BY id LIMIT 500"
+            )
+        ]
+        admin_id = await db.fetchval(
+            "SELECT id FROM users WHERE email = 'load-admin@example.com'"
+        )
+        webhook_orders = await db.fetch(
+            "SELECT id, total_amount FROM orders WHERE order_number LIKE 'HOOK%' AND payment_status = 'unpaid' ORDER BY id"
+        )
+    user_headers = [{"Authorization": f"Bearer {create_jwt_token(user_id)}"} for user_id in user_ids]
+    admin_headers = {"Authorization": f"Bearer {create_jwt_token(admin_id)}"}
+    today = datetime.now(TAIPEI_TZ).date()
+    webhook_secret = os.environ["STRIPE_WEBHOOK_SECRET"]
+
+    def future_date(start: int = 3):
+        return today + timedelta(days=rng.randint(start, args.days_ahead))
+
+    async def calendar(i):
+        month = today.replace(day=1) + timedelta(days=32 * rng.randint(0, 1))
+        response = await client.get(
+            f"/api/calendar/{rng.choice(SERVICE_TYPES)}",
+            params={"year": month.year, "month": month.month},
+        )
+        return response.status_code
+
+    async def check_units(i):
+        response = await client.get(
+            "/api/calendar/check-units",
+            params={
+                "target_date": future_date().isoformat(),
+                "target_time": rng.choice(SLOT_TIMES),
+                "service_type": rng.choice(SERVICE_TYPES),
+                "unit_count": rng.randint(1, 3),
+            },
+        )
+        return response.status_code
+
+    async def booking(i):
+        service_type = rng.choice(SERVICE_TYPES)
+        body = {
+            "service_type": service_type,
+            "location_address": rng.choice(ADDRESSES),
+            "unit_count": rng.randint(1, 2),
+            "booking_slots": [
+                {
+                    "preferred_date": future_date().isoformat(),
+                    "preferred_time": rng.choice(SLOT_TIMES),
+                    "contact_name": "王小明",
+                    "contact_phone": "0912345678",
+                }
+            ],
+        }
+        if service_type == "INSTALLATION":
+            body["equipment_details"] = [
+                {"name": "變頻分離式冷氣 2.8kW", "model": "CS-28", "price": 28000, "quantity": 1}
+            ]
+        response = await client.post("/api/order", json=body, headers=rng.choice(user_headers))
+        return response.status_code
+
+    async def webhook(i):
+        order = webhook_orders[i % len(webhook_orders)]
+        payload = json.dumps(
+            {
+                "id": f"evt_load_{order['id']}_{i}",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {
+                        "id": f"cs_load_{order['id']}",
+                        "amount_total": order["total_amount"] * 100,
+                        "metadata": {"order_id": str(order["id"])},
+                    }
+                },
+            }
+        )
+        response = await client.post(
+            "/api/payment/webhook/stripe",
+            content=payload,
+            headers={
+                "Stripe-Signature": sign_stripe_payload(payload, webhook_secret),
+                "Content-Type": "application/json",
+            },
+        )
+        return response.status_code
+
+    async def admin_orders(i):
+        params = {"limit": 20}
+        filters = rng.randint(0, 3)
+        if filters == 1:
+            params["status"] = rng.choice(["completed", "pending_schedule", "scheduled"])
+        elif filters == 2:
+            params["service_type"] = rng.choice(SERVICE_TYPES)
+        elif filters == 3:
+            params["date_from"] = (today - timedelta(days=30)).isoformat()
+            params["date_to"] = today.isoformat()
+        response = await client.get("/api/admin/orders", params=params, headers=admin_headers)
+        return response.status_code
+
+    return {
+        "calendar": calendar,
+        "check_units": check_units,
+        "booking": booking,
+        "webhook": webhook,
+        "admin_orders": admin_orders,
+    }
+
+
+async def wait_for_webhook_drain(pool, timeout: float = 120):
+    # webhook 端點只寫入收件匣，另計背景 worker 處理完所有事件的時間
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        pending = await pool.fetchval(
+            "SELECT COUNT(*) FROM stripe_webhook_events WHERE status IN ('pending', 'processing')"
+        )
+        if not pending:
+            break
+        await asyncio.sleep(0.05)
+    return round(time.perf_counter() - started, 3)
+
+
+async def run_cleanup_scenario(pool, rounds: int, order_count: int):
+    durations = []
+    queries = 0
+    deleted = 0
+    for _ in range(rounds):
+        async with pool.acquire() as db:
+            await seed_expired_orders(db, order_count)
+            request_queries = RequestQueries()
+            token = current_request_queries.set(request_queries)
+            started = time.perf_counter()
+            try:
+                await run_cleanup(db)
+            finally:
+                current_request_queries.reset(token)
+            durations.append(time.perf_counter() - started)
+            queries += request_queries.count
+            remaining = await db.fetchval(
+                "SELECT COUNT(*) FROM orders WHERE order_number LIKE 'BENCH%'"
+            )
+            deleted += order_count - remaining
+    elapsed = sum(durations)
+    durations.sort()
+    return {
+        "requests": rounds,
+        "concurrency": 1,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(deleted / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+        "max_ms": round(durations[-1] * 1000, 2),
+        "statuses": {},
+        "errors": 0,
+        "queries_per_request": round(queries / rounds, 2),
+        "orders_per_round": order_count,
+        "deleted_orders": deleted,
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    print(f"\n提交 {report['git_commit']}  PostgreSQL {report['postgres_version']}")
+    print(
+        f"{'scenario':14s}{'reqs':>7s}{'conc':>6s}{'rps':>9s}{'p50':>9s}{'p95':>9s}"
+        f"{'p99':>9s}{'max':>9s}{'q/req':>7s}{'err':>5s}"
+    )
+    for name, result in report["scenarios"].items():
+        queries = result["queries_per_request"]
+        print(
+            f"{name:14s}{result['requests']:>7d}{result['concurrency']:>6d}"
+            f"{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            f"{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+            f"{queries if queries is not None else '-':>7}{result['errors']:>5d}"
+        )
+        if result["statuses"]:
+            print(f"{'':14s}statuses={result['statuses']}")
+        if "webhook_drain_seconds" in result:
+            print(f"{'':14s}webhook_drain_seconds={result['webhook_drain_seconds']}")
+    print("cleanup 的 rps 為每秒刪除的訂單數，延遲為每輪 run_cleanup 的執行時間")
+
+
+def compare_reports(report: dict, baseline: dict, threshold: float):
+    # p95 變慢或吞吐量下降超過門檻即視為退步，回傳退步的情境供 CI 判斷
+    regressions = []
+    print(f"\n與 {baseline['git_commit']}（{baseline['started_at']}）比較：")
+    for name, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        p95_change = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0
+        rps_change = (
+            (result["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"]
+            if base["throughput_rps"]
+            else 0
+        )
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:14s}p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms ({p95_change:+.1%})  "
+            f"rps {base['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} ({rps_change:+.1%})"
+            f"{'  退步' if regressed else ''}"
+        )
+    return regressions
+
+
+async def run_benchmark(db_url: str, args):
+    db = await asyncpg.connect(db_url)
+    try:
+        if args.reset:
+            await reset_schema(db)
+        postgres_version = await db.fetchval("SHOW server_version")
+        if not args.skip_seed:
+            seed_started = time.perf_counter()
+            await seed_load_data(
+                db, args.users, args.orders, args.days_ahead,
+                args.requests + args.warmup,
+            )
+            print(f"測試資料建立完成，耗時 {time.perf_counter() - seed_started:.1f}s")
+    finally:
+        await db.close()
+
+    database.DB_URL = db_url
+    from main import app
+
+    report = {
+        "started_at": datetime.now(TAIPEI_TZ).isoformat(),
+        "git_commit": get_git_commit(),
+        "postgres_version": postgres_version,
+        "params": {
+            key: getattr(args, key)
+            for key in ["users", "orders", "days_ahead", "requests", "concurrency", "warmup", "seed"]
+        },
+        "scenarios": {},
+    }
+    rng = random.Random(args.seed)
+    # 應用程式的 print 記錄會大量輸出，預設不顯示以免淹沒結果
+    app_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            pool = app.state.db_pool
+            scenarios = await build_scenarios(client, pool, rng, args)
+            for name in args.scenarios:
+                print(f"執行 {name} ...")
+                with app_output:
+                    if name == "cleanup":
+                        result = await run_cleanup_scenario(
+                            pool, args.cleanup_rounds, args.cleanup_orders
+                        )
+                    else:
+                        result = await run_scenario(
+                            name, scenarios[name], args.requests, args.concurrency, args.warmup
+                        )
+                    if name == "webhook":
+                        result["webhook_drain_seconds"] = await wait_for_webhook_drain(pool)
+                report["scenarios"][name] = result
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="API 壓力測試與效能基準")
+    parser.add_argument("--boot-postgres", action="store_true", help="以 initdb 建立暫存的本地 PostgreSQL")
+    parser.add_argument("--reset", action="store_true", help="清空資料庫並載入 schema.sql")
+    parser.add_argument("--skip-seed", action="store_true", help="沿用資料庫中既有的測試資料")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--days-ahead", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=500, help="每個情境的請求數")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--cleanup-rounds", type=int, default=5)
+    parser.add_argument("--cleanup-orders", type=int, default=2000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="將結果寫成 JSON，供之後 --compare 使用")
+    parser.add_argument("--compare", help="與先前輸出的 JSON 結果比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="視為退步的變化比例")
+    parser.add_argument("--verbose", action="store_true", help="顯示應用程式的記錄輸出")
+    args = parser.parse_args()
+
+    data_dir = None
+    if args.boot_postgres:
+        data_dir = Path(tempfile.mkdtemp(prefix="coolslate-bench-"))
+        db_url = start_local_postgres(data_dir)
+        args.reset = True
+    elif BENCH_DB_URL:
+        db_url = BENCH_DB_URL
+    else:
+        raise SystemExit("請設定 BENCH_DB_URL 或使用 --boot-postgres")
+    try:
+        report = await run_benchmark(db_url, args)
+    finally:
+        if data_dir:
+            stop_local_postgres(data_dir)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"結果已寫入 {output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare_reports(report, baseline, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
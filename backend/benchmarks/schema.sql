@@ -0,0 +1,233 @@
+-- 本地效能測試用的資料庫結構。
+-- 正式環境的資料表與預存函式不在此儲存庫中，以下依應用程式的使用方式重建，
+-- 欄位與函式行為以能重現相同查詢模式為準，僅供 benchmarks/ 下的腳本使用。
+
+-- 正式環境由 DBA 事先安裝，見 db/migrations.py
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE users (
+    id SERIAL PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    google_id TEXT NOT NULL,
+    name TEXT,
+    role TEXT NOT NULL DEFAULT 'customer',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TABLE service_types (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    required_workers INTEGER NOT NULL,
+    base_duration_hours INTEGER NOT NULL,
+    additional_duration_hours INTEGER NOT NULL,
+    booking_advance_months INTEGER NOT NULL,
+    pricing_type TEXT NOT NULL,
+    priority INTEGER NOT NULL
+);
+CREATE TABLE orders (
+    id SERIAL PRIMARY KEY,
+    order_number TEXT UNIQUE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    service_type_id INTEGER NOT NULL REFERENCES service_types(id),
+    location_address TEXT NOT NULL,
+    location_lat DOUBLE PRECISION,
+    location_lng DOUBLE PRECISION,
+    unit_count INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    equipment_details TEXT,
+    notes TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    payment_status TEXT NOT NULL DEFAULT 'unpaid',
+    checkout_session_id TEXT,
+    scheduling_feedback TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TABLE time_slot_locks (
+    id SERIAL PRIMARY KEY,
+    slot_date DATE NOT NULL,
+    slot_time TIME NOT NULL,
+    locked_workers INTEGER NOT NULL,
+    lock_type TEXT NOT NULL,
+    reference_id INTEGER,
+    expires_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TABLE booking_slots (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    contact_name TEXT NOT NULL,
+    contact_phone TEXT NOT NULL,
+    is_primary BOOLEAN NOT NULL DEFAULT false,
+    is_locked BOOLEAN NOT NULL DEFAULT false,
+    temp_lock_id INTEGER,
+    lock_expires_at TIMESTAMPTZ,
+    is_selected BOOLEAN NOT NULL DEFAULT false
+);
+CREATE TABLE schedules (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    booking_slot_id INTEGER REFERENCES booking_slots(id),
+    scheduled_date DATE NOT NULL,
+    scheduled_time TIME NOT NULL,
+    estimated_end_time TIME NOT NULL,
+    assigned_workers INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'scheduled'
+);
+CREATE TABLE daily_workforce_usage (
+    id SERIAL PRIMARY KEY,
+    date DATE NOT NULL,
+    time_slot TIME NOT NULL,
+    used_workers INTEGER NOT NULL,
+    schedule_id INTEGER REFERENCES schedules(id)
+);
+CREATE TABLE company_settings (
+    id SERIAL PRIMARY KEY,
+    total_workers INTEGER NOT NULL,
+    company_lat DOUBLE PRECISION NOT NULL,
+    company_lng DOUBLE PRECISION NOT NULL,
+    max_service_distance_km DOUBLE PRECISION NOT NULL
+);
+CREATE TABLE order_completions (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER UNIQUE NOT NULL REFERENCES orders(id),
+    completion_file_url TEXT NOT NULL,
+    completion_file_name TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TABLE unit_pricing (
+    id SERIAL PRIMARY KEY,
+    service_type_id INTEGER NOT NULL REFERENCES service_types(id),
+    base_price INTEGER NOT NULL,
+    additional_price INTEGER NOT NULL
+);
+CREATE TABLE location_pricing (
+    id SERIAL PRIMARY KEY,
+    service_type_id INTEGER NOT NULL REFERENCES service_types(id),
+    region TEXT NOT NULL,
+    price INTEGER NOT NULL
+);
+CREATE TABLE products (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    model TEXT UNIQUE NOT NULL,
+    price INTEGER NOT NULL,
+    image TEXT NOT NULL DEFAULT '❄️',
+    description TEXT,
+    category TEXT NOT NULL DEFAULT '冷氣機',
+    is_active BOOLEAN NOT NULL DEFAULT true
+);
+
+CREATE FUNCTION get_real_available_workers(p_date DATE, p_time TIME)
+RETURNS INTEGER AS $$
+    SELECT (SELECT total_workers FROM company_settings LIMIT 1)
+        - COALESCE((SELECT SUM(used_workers) FROM daily_workforce_usage
+                    WHERE date = p_date AND time_slot = p_time), 0)
+        - COALESCE((SELECT SUM(locked_workers) FROM time_slot_locks
+                    WHERE slot_date = p_date AND slot_time = p_time
+                      AND lock_type = 'booking'
+                      AND (expires_at IS NULL OR expires_at > NOW())), 0);
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION lock_service_time_slot(
+    p_date DATE, p_time TIME, p_workers INTEGER, p_hours INTEGER,
+    p_reference_id INTEGER, p_minutes INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    first_lock_id INTEGER := -1;
+    new_lock_id INTEGER;
+    slot TIME;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext(p_date::text));
+    FOR i IN 0..p_hours - 1 LOOP
+        slot := p_time + make_interval(hours => i);
+        IF slot >= TIME '17:00' OR get_real_available_workers(p_date, slot) < p_workers THEN
+            RAISE EXCEPTION USING ERRCODE = 'P0001', MESSAGE = 'slot_unavailable';
+        END IF;
+        INSERT INTO time_slot_locks (slot_date, slot_time, locked_workers, lock_type, reference_id, expires_at)
+        VALUES (p_date, slot, p_workers, 'booking', p_reference_id, NOW() + make_interval(mins => p_minutes))
+        RETURNING id INTO new_lock_id;
+        IF first_lock_id = -1 THEN
+            first_lock_id := new_lock_id;
+        END IF;
+    END LOOP;
+    RETURN first_lock_id;
+EXCEPTION WHEN SQLSTATE 'P0001' THEN
+    RETURN -1;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION unlock_service_time_slot(
+    p_lock_id INTEGER, p_date DATE, p_time TIME, p_hours INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    -- 同一次鎖定的每小時鎖定列在同一交易內連續產生，以主鍵範圍定位
+    DELETE FROM time_slot_locks
+    WHERE id BETWEEN p_lock_id AND p_lock_id + p_hours - 1
+      AND lock_type = 'booking'
+      AND slot_date = p_date
+      AND slot_time >= p_time
+      AND slot_time < p_time + make_interval(hours => p_hours);
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION convert_lock_to_schedule(p_lock_id INTEGER, p_schedule_id INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    lock_row time_slot_locks%ROWTYPE;
+BEGIN
+    SELECT * INTO lock_row FROM time_slot_locks WHERE id = p_lock_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+    INSERT INTO daily_workforce_usage (date, time_slot, used_workers, schedule_id)
+    VALUES (lock_row.slot_date, lock_row.slot_time, lock_row.locked_workers, p_schedule_id);
+    UPDATE time_slot_locks
+    SET lock_type = 'schedule', reference_id = p_schedule_id, expires_at = NULL
+    WHERE id = p_lock_id;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION calculate_distance(
+    lat1 DOUBLE PRECISION, lng1 DOUBLE PRECISION,
+    lat2 DOUBLE PRECISION, lng2 DOUBLE PRECISION
+) RETURNS DOUBLE PRECISION AS $$
+    SELECT 6371 * 2 * asin(sqrt(
+        power(sin(radians(lat2 - lat1) / 2), 2)
+        + cos(radians(lat1)) * cos(radians(lat2)) * power(sin(radians(lng2 - lng1) / 2), 2)
+    ));
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION clean_expired_locks() RETURNS INTEGER AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    DELETE FROM time_slot_locks
+    WHERE lock_type = 'booking' AND expires_at IS NOT NULL AND expires_at <= NOW();
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO company_settings (total_workers, company_lat, company_lng, max_service_distance_km)
+VALUES (8, 25.0478, 121.5170, 30);
+INSERT INTO service_types (name, required_workers, base_duration_hours, additional_duration_hours, booking_advance_months, pricing_type, priority) VALUES
+    ('INSTALLATION', 2, 3, 2, 2, 'equipment', 1),
+    ('MAINTENANCE', 1, 2, 1, 2, 'unit_count', 2),
+    ('REPAIR', 1, 2, 1, 1, 'location', 3);
+INSERT INTO unit_pricing (service_type_id, base_price, additional_price)
+SELECT id, 1500, 1000 FROM service_types WHERE name = 'MAINTENANCE';
+INSERT INTO location_pricing (service_type_id, region, price)
+SELECT id, region, price FROM service_types, (VALUES ('雙北', 800), ('其他地區', 1200)) AS r(region, price)
+WHERE name = 'REPAIR';
+INSERT INTO products (name, model, price) VALUES
+    ('變頻分離式冷氣 2.8kW', 'CS-28', 28000),
+    ('變頻分離式冷氣 3.6kW', 'CS-36', 34000),
+    ('變頻分離式冷氣 5.0kW', 'CS-50', 45000);
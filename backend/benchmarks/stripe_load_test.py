@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# 用法：先啟動本地 stripe-mock，再執行
+#   docker run --rm -p 12111-12112:12111-12112 stripe/stripe-mock
+#   python benchmarks/stripe_load_test.py --requests 500 --concurrency 50
+os.environ.setdefault("STRIPE_API_BASE", "http://localhost:12111")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_123")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stripe  # noqa: E402
+from services.stripe_service import (  # noqa: E402
+    close_stripe_client,
+    create_stripe_checkout_session,
+)
+
+CHECKOUT_PARAMS = {
+    "payment_method_types": ["card"],
+    "line_items": [
+        {
+            "price_data": {
+                "currency": "twd",
+                "product_data": {"name": "冷氣服務 - MAINTENANCE"},
+                "unit_amount": 200000,
+            },
+            "quantity": 1,
+        }
+    ],
+    "mode": "payment",
+    "success_url": "https://example.com/payment/success",
+    "cancel_url": "https://example.com/payment/cancel",
+}
+
+
+async def legacy_create():
+    # 改寫前的做法：在 async 函式內直接呼叫同步 SDK
+    return stripe.checkout.Session.create(**CHECKOUT_PARAMS)
+
+
+async def gateway_create():
+    return await create_stripe_checkout_session(**CHECKOUT_PARAMS)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    # 事件迴圈被阻塞時，sleep 醒來的延遲會明顯超過 interval
+    max_lag = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - started - interval)
+    return max_lag
+
+
+async def run(mode: str, total: int, concurrency: int):
+    create = legacy_create if mode == "legacy" else gateway_create
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await create()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"{mode} 呼叫失敗: {e}")
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    max_lag = await lag_task
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    print(
+        f"{mode:8s} ok={len(latencies)} errors={errors} elapsed={elapsed:.2f}s "
+        f"rps={len(latencies) / elapsed:.0f} p50={p50 * 1000:.0f}ms "
+        f"p99={p99 * 1000:.0f}ms max_loop_lag={max_lag * 1000:.0f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Stripe 呼叫壓力測試（stripe-mock）")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--mode", choices=["gateway", "legacy", "both"], default="both"
+    )
+    args = parser.parse_args()
+    stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
+    stripe.api_base = os.environ["STRIPE_API_BASE"]
+    modes = ["legacy", "gateway"] if args.mode == "both" else [args.mode]
+    try:
+        for mode in modes:
+            await run(mode, args.requests, args.concurrency)
+    finally:
+        await close_stripe_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
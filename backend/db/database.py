@@ -1,5 +1,6 @@
 import asyncpg
 from dotenv import load_dotenv
+from utils.query_logger import InstrumentedConnection
 import os
 
 load_dotenv()
@@ -10,12 +11,21 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", 5432)
 DB_DATABASE = os.getenv("DB_DATABASE")
 
+# 請求只在實際查詢時持有連線，依 /api/admin/pool-stats 的等待時間調整上限
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 15))
+
 DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
 
 
 async def create_pool():
     try:
-        pool = await asyncpg.create_pool(dsn=DB_URL, min_size=2, max_size=15)
+        pool = await asyncpg.create_pool(
+            dsn=DB_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            connection_class=InstrumentedConnection,
+        )
         print("資料庫連線池建立成功")
         return pool
     except Exception as e:
@@ -26,3 +36,8 @@ async def create_pool():
 async def close_pool(pool: asyncpg.Pool):
     if pool:
         await pool.close()
+
+
+async def create_dedicated_connection():
+    # 不佔用連線池，供需要長時間持有 session 的用途（例如 advisory lock）
+    return await asyncpg.connect(dsn=DB_URL, connection_class=InstrumentedConnection)
@@ -0,0 +1,209 @@
+import asyncio
+import time
+import asyncpg
+import db.database as database
+from db.schema import apply_schema
+
+# 需掃描既有大型資料表的步驟不放在應用程式啟動時的 ensure_schema：
+# 一般的 CREATE INDEX 會阻擋該表的所有寫入直到建立完成，部署時訂單與 webhook 都會卡住。
+# 改為部署前（或離峰時）手動執行一次：
+#   cd backend && python -m db.migrations
+# 每個步驟皆可重複執行，已完成的步驟會直接略過。
+
+# CREATE INDEX CONCURRENTLY 不能在交易中執行，每個索引各自自動提交
+CONCURRENT_INDEXES = [
+    # 清理流程批次刪除訂單時，外鍵檢查與解除鎖定都依賴以下索引
+    ("idx_booking_slots_order_id", "ON booking_slots (order_id)"),
+    ("idx_schedules_order_id", "ON schedules (order_id)"),
+    ("idx_daily_workforce_usage_schedule_id", "ON daily_workforce_usage (schedule_id)"),
+    ("idx_time_slot_locks_slot", "ON time_slot_locks (slot_date, slot_time)"),
+    (
+        "idx_orders_unpaid_created_at",
+        "ON orders (created_at) WHERE status = 'pending' AND payment_status = 'unpaid'",
+    ),
+    # 管理員訂單列表依 (created_at, id) 游標分頁；各篩選條件各有一個以排序鍵結尾的複合索引，
+    # 可直接依序掃描而不需排序。日期區間篩選同樣使用 created_at 欄位
+    ("idx_orders_created_at_id", "ON orders (created_at DESC, id DESC)"),
+    ("idx_orders_status_created_at_id", "ON orders (status, created_at DESC, id DESC)"),
+    (
+        "idx_orders_payment_status_created_at_id",
+        "ON orders (payment_status, created_at DESC, id DESC)",
+    ),
+    (
+        "idx_orders_service_type_created_at_id",
+        "ON orders (service_type_id, created_at DESC, id DESC)",
+    ),
+    # 對帳工作以 Checkout Session id 批次比對訂單
+    (
+        "idx_orders_checkout_session_id",
+        "ON orders (checkout_session_id) WHERE checkout_session_id IS NOT NULL",
+    ),
+    # 郵件 outbox 依 batch_key 取回整批重試
+    (
+        "idx_email_outbox_batch_key",
+        "ON email_outbox (batch_key) WHERE status IN ('pending', 'sending')",
+    ),
+]
+
+# 管理員搜尋：pg_trgm 的 GIN 索引同時支援 ILIKE '%關鍵字%' 與相似度比對（<%）。
+# 建立擴充套件需要較高權限，須由 DBA 事先執行 CREATE EXTENSION pg_trgm，應用程式帳號不自行建立
+TRIGRAM_INDEXES = [
+    ("idx_users_name_trgm", "ON users USING gin (name gin_trgm_ops)"),
+    ("idx_users_email_trgm", "ON users USING gin (email gin_trgm_ops)"),
+    ("idx_orders_order_number_trgm", "ON orders USING gin (order_number gin_trgm_ops)"),
+    (
+        "idx_orders_location_address_trgm",
+        "ON orders USING gin (location_address gin_trgm_ops)",
+    ),
+    (
+        "idx_booking_slots_contact_name_trgm",
+        "ON booking_slots USING gin (contact_name gin_trgm_ops)",
+    ),
+    (
+        "idx_booking_slots_contact_phone_trgm",
+        "ON booking_slots USING gin (contact_phone gin_trgm_ops)",
+    ),
+]
+
+
+# 彙總 trigger 與其回填必須在同一交易內完成，否則建立 trigger 到回填之間的寫入會重複或遺漏；
+# 回填期間基礎資料表的寫入會等待交易完成，因此不在啟動時執行，請於離峰時執行本程式。
+# 每項為 (用來判斷是否已建立的 trigger 名稱, 建立 trigger 並回填的 SQL)
+TRIGGER_BACKFILLS = [
+    # 轉換表只能用於單一事件的觸發器，因此每張表各建立 INSERT、UPDATE、DELETE 三個觸發器
+    (
+        "daily_workforce_usage_rollup_insert",
+        """
+        DO $$
+        DECLARE
+            target RECORD;
+        BEGIN
+            FOR target IN
+                SELECT * FROM (VALUES
+                    ('daily_workforce_usage', 'rollup_workforce_usage'),
+                    ('schedules', 'rollup_schedules'),
+                    ('time_slot_locks', 'rollup_time_slot_locks')
+                ) AS t(table_name, function_name)
+            LOOP
+                EXECUTE format(
+                    'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                    'FOR EACH STATEMENT EXECUTE FUNCTION %I()',
+                    target.table_name || '_rollup_insert', target.table_name, target.function_name
+                );
+                EXECUTE format(
+                    'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                    'FOR EACH STATEMENT EXECUTE FUNCTION %I()',
+                    target.table_name || '_rollup_update', target.table_name, target.function_name
+                );
+                EXECUTE format(
+                    'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                    'FOR EACH STATEMENT EXECUTE FUNCTION %I()',
+                    target.table_name || '_rollup_delete', target.table_name, target.function_name
+                );
+            END LOOP;
+            PERFORM rebuild_workforce_rollups();
+        END;
+        $$
+        """,
+    ),
+    # 營運分析計數：以 created_at 回填「建立」事件；其他事件沒有歷史發生時間，自啟用後開始累計
+    (
+        "orders_metrics_insert",
+        """
+        CREATE TRIGGER orders_metrics_insert
+        AFTER INSERT ON orders
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION record_order_metrics();
+        CREATE TRIGGER orders_metrics_update
+        AFTER UPDATE ON orders
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION record_order_metrics();
+        INSERT INTO order_daily_metrics
+            (metric_date, event, service_type_id, region, order_count, amount)
+        SELECT (created_at AT TIME ZONE 'Asia/Taipei')::date, 'created',
+               service_type_id, order_region(location_address),
+               COUNT(*), SUM(total_amount)
+        FROM orders
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (metric_date, event, service_type_id, region, reason) DO NOTHING;
+        """,
+    ),
+]
+
+
+async def create_index_concurrently(conn, name: str, definition: str):
+    is_valid = await conn.fetchval(
+        """
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1 AND pg_table_is_visible(c.oid)
+        """,
+        name,
+    )
+    if is_valid:
+        return False
+    if is_valid is False:
+        # 先前中斷的 CONCURRENTLY 建立會留下無效索引，IF NOT EXISTS 會誤判為已存在
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    await conn.execute(f"CREATE INDEX CONCURRENTLY {name} {definition}")
+    return True
+
+
+async def build_indexes(conn, indexes: list):
+    for name, definition in indexes:
+        started = time.perf_counter()
+        if await create_index_concurrently(conn, name, definition):
+            print(f"建立索引 {name} 完成，耗時 {time.perf_counter() - started:.1f}s")
+
+
+async def install_triggers(conn, trigger_name: str, statement: str):
+    async with conn.transaction():
+        # 與啟動時的 ensure_schema 共用 advisory lock，避免同時執行
+        await conn.execute("SELECT pg_advisory_xact_lock(7300)")
+        exists = await conn.fetchval(
+            "SELECT 1 FROM pg_trigger WHERE tgname = $1", trigger_name
+        )
+        if exists:
+            return False
+        await conn.execute(statement)
+    return True
+
+
+async def build_triggers(conn, backfills: list):
+    for trigger_name, statement in backfills:
+        started = time.perf_counter()
+        if await install_triggers(conn, trigger_name, statement):
+            print(
+                f"建立 trigger {trigger_name} 並回填完成，耗時 {time.perf_counter() - started:.1f}s"
+            )
+
+
+async def run_migrations(conn):
+    # 部署新版前執行時新資料表可能尚未建立，先套用與啟動時相同的結構
+    await apply_schema(conn)
+    await build_indexes(conn, CONCURRENT_INDEXES)
+    await build_triggers(conn, TRIGGER_BACKFILLS)
+    has_trgm = await conn.fetchval(
+        "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+    )
+    if not has_trgm:
+        raise RuntimeError(
+            "尚未安裝 pg_trgm，請由具權限的帳號執行 CREATE EXTENSION pg_trgm 後重新執行"
+        )
+    await build_indexes(conn, TRIGRAM_INDEXES)
+
+
+async def main():
+    conn = await asyncpg.connect(dsn=database.DB_URL)
+    try:
+        await run_migrations(conn)
+    finally:
+        await conn.close()
+    print("資料庫遷移完成")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
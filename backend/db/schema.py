@@ -0,0 +1,374 @@
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS background_job_runs (
+        id BIGSERIAL PRIMARY KEY,
+        job_name TEXT NOT NULL,
+        instance_id TEXT NOT NULL,
+        started_at TIMESTAMPTZ NOT NULL,
+        duration_ms INTEGER NOT NULL,
+        rows_affected INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        error TEXT
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_background_job_runs_job_started
+    ON background_job_runs (job_name, started_at DESC)
+    """,
+    # 既有資料表上的索引由 db/migrations.py 以 CREATE INDEX CONCURRENTLY 另行建立
+    """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        order_id INTEGER,
+        email_type TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        locked_until TIMESTAMPTZ,
+        last_error TEXT,
+        provider_message_id TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        sent_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_email_outbox_ready
+    ON email_outbox (id)
+    WHERE status IN ('pending', 'sending')
+    """,
+    # 同一批郵件的重試共用 batch_key，亦作為 Resend 的 idempotency key
+    "ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS batch_key TEXT",
+    # Stripe webhook 收件匣：以 Stripe event id 為主鍵去除重複投遞
+    """
+    CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+        event_id TEXT PRIMARY KEY,
+        event_type TEXT NOT NULL,
+        order_id INTEGER,
+        payload JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        locked_until TIMESTAMPTZ,
+        last_error TEXT,
+        received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        processed_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_open
+    ON stripe_webhook_events (received_at)
+    WHERE status IN ('pending', 'processing')
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_order_open
+    ON stripe_webhook_events (order_id, received_at)
+    WHERE status IN ('pending', 'processing')
+    """,
+    # 使用者資料異動或刪除時通知各實例清除快取
+    """
+    CREATE OR REPLACE FUNCTION notify_user_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('user_changes', OLD.id::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger WHERE tgname = 'users_change_notify'
+        ) THEN
+            CREATE TRIGGER users_change_notify
+            AFTER UPDATE OR DELETE ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION notify_user_change();
+        END IF;
+    END;
+    $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payment_reconciliation_reports (
+        id BIGSERIAL PRIMARY KEY,
+        started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        window_start TIMESTAMPTZ NOT NULL,
+        sessions_scanned INTEGER NOT NULL DEFAULT 0,
+        already_paid INTEGER NOT NULL DEFAULT 0,
+        recovered INTEGER NOT NULL DEFAULT 0,
+        amount_mismatch INTEGER NOT NULL DEFAULT 0,
+        orphaned INTEGER NOT NULL DEFAULT 0,
+        details JSONB NOT NULL DEFAULT '{}'::jsonb
+    )
+    """,
+    # 訂單狀態或付款狀態變更時廣播通知，供付款狀態長輪詢即時喚醒
+    """
+    CREATE OR REPLACE FUNCTION notify_order_status_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('order_status_changes', json_build_object(
+            'order_id', NEW.id,
+            'user_id', NEW.user_id,
+            'status', NEW.status,
+            'payment_status', NEW.payment_status,
+            'updated_at', NEW.updated_at
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger WHERE tgname = 'orders_status_notify'
+        ) THEN
+            CREATE TRIGGER orders_status_notify
+            AFTER UPDATE OF status, payment_status ON orders
+            FOR EACH ROW
+            WHEN (OLD.status IS DISTINCT FROM NEW.status
+                  OR OLD.payment_status IS DISTINCT FROM NEW.payment_status)
+            EXECUTE FUNCTION notify_order_status_change();
+        END IF;
+    END;
+    $$
+    """,
+    # 人力使用率彙總：由觸發器隨排程、人力使用與暫時鎖定的異動增量維護，
+    # 熱度圖只讀這兩張表。暫時鎖定（booking）沒有對應訂單，只能以每小時彙總
+    """
+    CREATE TABLE IF NOT EXISTS workforce_hourly_rollups (
+        slot_date DATE NOT NULL,
+        slot_time TIME NOT NULL,
+        held_workers INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (slot_date, slot_time)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS workforce_service_rollups (
+        slot_date DATE NOT NULL,
+        slot_time TIME NOT NULL,
+        service_type_id INTEGER NOT NULL,
+        used_workers INTEGER NOT NULL DEFAULT 0,
+        scheduled_orders INTEGER NOT NULL DEFAULT 0,
+        revenue BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (slot_date, slot_time, service_type_id)
+    )
+    """,
+    # 以陳述式層級觸發器搭配轉換表，批次取消等多列異動每個陳述式只更新一次彙總；
+    # 依主鍵排序寫入，同時進行的交易以相同順序鎖定彙總列。以 EXECUTE 執行，
+    # 每次依轉換表實際筆數規劃，避免沿用單筆異動時快取的執行計畫而讓大量寫入變慢
+    """
+    CREATE OR REPLACE FUNCTION rollup_workforce_usage() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_service_rollups (slot_date, slot_time, service_type_id, used_workers)
+                SELECT n.date, n.time_slot, o.service_type_id, SUM(n.used_workers)
+                FROM new_rows n
+                JOIN schedules s ON s.id = n.schedule_id
+                JOIN orders o ON o.id = s.order_id
+                GROUP BY n.date, n.time_slot, o.service_type_id
+                ORDER BY 1, 2, 3
+                ON CONFLICT (slot_date, slot_time, service_type_id) DO UPDATE
+                SET used_workers = workforce_service_rollups.used_workers + EXCLUDED.used_workers
+            $sql$;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_service_rollups (slot_date, slot_time, service_type_id, used_workers)
+                SELECT d.date, d.time_slot, o.service_type_id, -SUM(d.used_workers)
+                FROM old_rows d
+                JOIN schedules s ON s.id = d.schedule_id
+                JOIN orders o ON o.id = s.order_id
+                GROUP BY d.date, d.time_slot, o.service_type_id
+                ORDER BY 1, 2, 3
+                ON CONFLICT (slot_date, slot_time, service_type_id) DO UPDATE
+                SET used_workers = workforce_service_rollups.used_workers + EXCLUDED.used_workers
+            $sql$;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_schedules() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_service_rollups (slot_date, slot_time, service_type_id, scheduled_orders, revenue)
+                SELECT n.scheduled_date, make_time(EXTRACT(HOUR FROM n.scheduled_time)::int, 0, 0),
+                       o.service_type_id, COUNT(*), SUM(o.total_amount)
+                FROM new_rows n
+                JOIN orders o ON o.id = n.order_id
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (slot_date, slot_time, service_type_id) DO UPDATE
+                SET scheduled_orders = workforce_service_rollups.scheduled_orders + EXCLUDED.scheduled_orders,
+                    revenue = workforce_service_rollups.revenue + EXCLUDED.revenue
+            $sql$;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_service_rollups (slot_date, slot_time, service_type_id, scheduled_orders, revenue)
+                SELECT d.scheduled_date, make_time(EXTRACT(HOUR FROM d.scheduled_time)::int, 0, 0),
+                       o.service_type_id, -COUNT(*), -SUM(o.total_amount)
+                FROM old_rows d
+                JOIN orders o ON o.id = d.order_id
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (slot_date, slot_time, service_type_id) DO UPDATE
+                SET scheduled_orders = workforce_service_rollups.scheduled_orders + EXCLUDED.scheduled_orders,
+                    revenue = workforce_service_rollups.revenue + EXCLUDED.revenue
+            $sql$;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # 鎖定轉為排程時 lock_type 會由 booking 改為 schedule，以 UPDATE 扣回暫時鎖定人力
+    """
+    CREATE OR REPLACE FUNCTION rollup_time_slot_locks() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_hourly_rollups (slot_date, slot_time, held_workers)
+                SELECT slot_date, slot_time, SUM(locked_workers)
+                FROM new_rows
+                WHERE lock_type = 'booking'
+                GROUP BY slot_date, slot_time
+                ORDER BY 1, 2
+                ON CONFLICT (slot_date, slot_time) DO UPDATE
+                SET held_workers = workforce_hourly_rollups.held_workers + EXCLUDED.held_workers
+            $sql$;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            EXECUTE $sql$
+                INSERT INTO workforce_hourly_rollups (slot_date, slot_time, held_workers)
+                SELECT slot_date, slot_time, -SUM(locked_workers)
+                FROM old_rows
+                WHERE lock_type = 'booking'
+                GROUP BY slot_date, slot_time
+                ORDER BY 1, 2
+                ON CONFLICT (slot_date, slot_time) DO UPDATE
+                SET held_workers = workforce_hourly_rollups.held_workers + EXCLUDED.held_workers
+            $sql$;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # 自基礎資料表重新計算全部彙總，供 db/migrations.py 建立 trigger 時回填與人工校正
+    """
+    CREATE OR REPLACE FUNCTION rebuild_workforce_rollups() RETURNS void AS $$
+    BEGIN
+        DELETE FROM workforce_hourly_rollups;
+        DELETE FROM workforce_service_rollups;
+        INSERT INTO workforce_hourly_rollups (slot_date, slot_time, held_workers)
+        SELECT slot_date, slot_time, SUM(locked_workers)
+        FROM time_slot_locks
+        WHERE lock_type = 'booking'
+        GROUP BY slot_date, slot_time;
+        INSERT INTO workforce_service_rollups
+            (slot_date, slot_time, service_type_id, used_workers, scheduled_orders, revenue)
+        SELECT slot_date, slot_time, service_type_id,
+               SUM(used_workers), SUM(scheduled_orders), SUM(revenue)
+        FROM (
+            SELECT dwu.date AS slot_date, dwu.time_slot AS slot_time, o.service_type_id,
+                   dwu.used_workers, 0 AS scheduled_orders, 0 AS revenue
+            FROM daily_workforce_usage dwu
+            JOIN schedules s ON s.id = dwu.schedule_id
+            JOIN orders o ON o.id = s.order_id
+            UNION ALL
+            SELECT s.scheduled_date, make_time(EXTRACT(HOUR FROM s.scheduled_time)::int, 0, 0),
+                   o.service_type_id, 0, 1, o.total_amount
+            FROM schedules s
+            JOIN orders o ON o.id = s.order_id
+        ) changes
+        GROUP BY slot_date, slot_time, service_type_id;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # 營運分析：每日各事件（建立、付款、排程、排程失敗、取消、退款、完工）依服務類型與地區計數，
+    # 由 orders 的 trigger 在狀態變更的同一交易內累加，報表不需對訂單表即時 GROUP BY
+    """
+    CREATE TABLE IF NOT EXISTS order_daily_metrics (
+        metric_date DATE NOT NULL,
+        event TEXT NOT NULL,
+        service_type_id INTEGER NOT NULL,
+        region TEXT NOT NULL,
+        reason TEXT NOT NULL DEFAULT '',
+        order_count INTEGER NOT NULL DEFAULT 0,
+        amount BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (metric_date, event, service_type_id, region, reason)
+    )
+    """,
+    # 與 services/booking_service.py 的 determine_region 相同的判斷規則
+    """
+    CREATE OR REPLACE FUNCTION order_region(address TEXT) RETURNS TEXT AS $$
+        SELECT CASE
+            WHEN address LIKE '%台北%' OR address LIKE '%新北%' THEN '雙北'
+            ELSE '其他地區'
+        END;
+    $$ LANGUAGE sql IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION record_order_metrics() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            EXECUTE $sql$
+                INSERT INTO order_daily_metrics
+                    (metric_date, event, service_type_id, region, order_count, amount)
+                SELECT (n.created_at AT TIME ZONE 'Asia/Taipei')::date, 'created',
+                       n.service_type_id, order_region(n.location_address),
+                       COUNT(*), SUM(n.total_amount)
+                FROM new_rows n
+                GROUP BY 1, 2, 3, 4
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (metric_date, event, service_type_id, region, reason) DO UPDATE
+                SET order_count = order_daily_metrics.order_count + EXCLUDED.order_count,
+                    amount = order_daily_metrics.amount + EXCLUDED.amount
+            $sql$;
+        ELSE
+            EXECUTE $sql$
+                INSERT INTO order_daily_metrics
+                    (metric_date, event, service_type_id, region, reason, order_count, amount)
+                SELECT (NOW() AT TIME ZONE 'Asia/Taipei')::date, e.event,
+                       n.service_type_id, order_region(n.location_address), e.reason,
+                       COUNT(*), SUM(n.total_amount)
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                CROSS JOIN LATERAL (VALUES
+                    ('paid', '', n.payment_status = 'paid' AND o.payment_status <> 'paid'),
+                    ('refunded', '', n.payment_status = 'refunded' AND o.payment_status <> 'refunded'),
+                    ('scheduled', '', n.status = 'scheduled' AND o.status <> 'scheduled'),
+                    ('scheduling_failed', COALESCE(n.scheduling_feedback, ''),
+                     n.status = 'scheduling_failed' AND o.status <> 'scheduling_failed'),
+                    ('cancelled', '', n.status = 'cancelled' AND o.status <> 'cancelled'),
+                    ('completed', '', n.status = 'completed' AND o.status <> 'completed')
+                ) AS e(event, reason, matched)
+                WHERE e.matched
+                GROUP BY 1, 2, 3, 4, 5
+                ORDER BY 1, 2, 3, 4, 5
+                ON CONFLICT (metric_date, event, service_type_id, region, reason) DO UPDATE
+                SET order_count = order_daily_metrics.order_count + EXCLUDED.order_count,
+                    amount = order_daily_metrics.amount + EXCLUDED.amount
+            $sql$;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+
+async def apply_schema(conn):
+    async with conn.transaction():
+        # 多個 worker 同時啟動時，以 advisory lock 確保 DDL 只執行一次
+        await conn.execute("SELECT pg_advisory_xact_lock(7300)")
+        for statement in SCHEMA_STATEMENTS:
+            await conn.execute(statement)
+
+
+async def ensure_schema(pool):
+    async with pool.acquire() as conn:
+        await apply_schema(conn)
+    print("資料表結構檢查完成")
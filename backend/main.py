@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from db.database import close_pool, create_pool
+from db.schema import ensure_schema
 from fastapi.middleware.cors import CORSMiddleware
 from routers import (
     calendar_router,
@@ -11,6 +13,14 @@ from routers import (
     product_router
 )
 from services.background_service import cleanup_loop, repair_scheduling_loop
+from services.email_outbox_service import email_outbox_loop
+from services.stripe_service import close_stripe_client
+from services.webhook_inbox_service import webhook_inbox_loop
+from services.notification_service import notification_listener_loop
+from services.reconciliation_service import payment_reconciliation_loop
+from utils.metrics import MetricsMiddleware, METRICS_TOKEN, render_metrics
+from utils.query_logger import QueryLoggerMiddleware
+from utils.tracing import TracingMiddleware, close_trace_exporter
 import asyncio
 import httpx
 
@@ -19,11 +29,24 @@ import httpx
 async def lifespan(app: FastAPI):
     try:
         app.state.db_pool = await create_pool()
+        await ensure_schema(app.state.db_pool)
         app.state.http_client = httpx.AsyncClient(timeout=10.0)
         app.state.cleanup = asyncio.create_task(cleanup_loop(app.state.db_pool))
         app.state.repair_scheduler = asyncio.create_task(
             repair_scheduling_loop(app.state.db_pool, app.state.http_client)
         )
+        app.state.email_outbox = asyncio.create_task(
+            email_outbox_loop(app.state.db_pool)
+        )
+        app.state.webhook_inbox = asyncio.create_task(
+            webhook_inbox_loop(app.state.db_pool)
+        )
+        app.state.notification_listener = asyncio.create_task(
+            notification_listener_loop()
+        )
+        app.state.payment_reconciliation = asyncio.create_task(
+            payment_reconciliation_loop(app.state.db_pool)
+        )
         yield
     except Exception as e:
         print(f"服務啟動失敗：{e}")
@@ -31,6 +54,10 @@ async def lifespan(app: FastAPI):
         app.state.http_client = None
         app.state.cleanup = None
         app.state.repair_scheduler = None
+        app.state.email_outbox = None
+        app.state.webhook_inbox = None
+        app.state.notification_listener = None
+        app.state.payment_reconciliation = None
     finally:
         if app.state.db_pool:
             await close_pool(app.state.db_pool)
@@ -38,17 +65,41 @@ async def lifespan(app: FastAPI):
         if app.state.http_client:
             await app.state.http_client.aclose()
             app.state.http_client = None
+        await close_stripe_client()
         if app.state.cleanup and not app.state.cleanup.done():
             app.state.cleanup.cancel()
         if app.state.repair_scheduler and not app.state.repair_scheduler.done():
             app.state.repair_scheduler.cancel()
+        if app.state.email_outbox and not app.state.email_outbox.done():
+            app.state.email_outbox.cancel()
+        if app.state.webhook_inbox and not app.state.webhook_inbox.done():
+            app.state.webhook_inbox.cancel()
+        if (
+            app.state.notification_listener
+            and not app.state.notification_listener.done()
+        ):
+            app.state.notification_listener.cancel()
+        if (
+            app.state.payment_reconciliation
+            and not app.state.payment_reconciliation.done()
+        ):
+            app.state.payment_reconciliation.cancel()
         tasks = []
         tasks.append(app.state.cleanup)
         tasks.append(app.state.repair_scheduler)
+        tasks.append(app.state.email_outbox)
+        tasks.append(app.state.webhook_inbox)
+        tasks.append(app.state.notification_listener)
+        tasks.append(app.state.payment_reconciliation)
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
         app.state.cleanup = None
         app.state.repair_scheduler = None
+        app.state.email_outbox = None
+        app.state.webhook_inbox = None
+        app.state.notification_listener = None
+        app.state.payment_reconciliation = None
+        await asyncio.to_thread(close_trace_exporter)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -59,6 +110,9 @@ origins = [
     "https://cool-slate.ayating.workers.dev",
 ]
 
+app.add_middleware(QueryLoggerMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -82,11 +136,31 @@ async def check_status():
         or not app.state.http_client
         or not app.state.cleanup
         or not app.state.repair_scheduler
+        or not app.state.email_outbox
+        or not app.state.webhook_inbox
+        or not app.state.notification_listener
+        or not app.state.payment_reconciliation
     ):
         raise HTTPException(status_code=500, detail="後端服務無法使用")
     return {"status": "success", "message": "後端服務正常運行"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    # 設定 METRICS_TOKEN 時，Prometheus 需以 Bearer token 抓取
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="無效的 metrics token")
+    gauges = {}
+    pool = getattr(app.state, "db_pool", None)
+    if pool:
+        gauges["db_pool_size"] = ("連線池目前的連線數", pool.get_size())
+        gauges["db_pool_idle"] = ("連線池閒置的連線數", pool.get_idle_size())
+        gauges["db_pool_max_size"] = ("連線池連線數上限", pool.get_max_size())
+    return PlainTextResponse(
+        render_metrics(gauges), media_type="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
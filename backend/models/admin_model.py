@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+
+BULK_ORDER_LIMIT = 200
+
+
+class CompletionUploadRequest(BaseModel):
+    file_name: str
+    file_size: int
+
+
+class CompletionUploadResponse(BaseModel):
+    upload_url: str
+    fields: dict
+    object_key: str
+    expires_in: int
+
+
+class CompletionConfirmRequest(BaseModel):
+    object_key: str
+    file_name: str
+
+
+class BulkOrderRequest(BaseModel):
+    order_ids: list[int] = Field(..., min_length=1, max_length=BULK_ORDER_LIMIT)
+
+
+class BulkRefundRequest(BulkOrderRequest):
+    refund_user: str = Field(..., min_length=1)
@@ -1,29 +1,147 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from utils.auth import require_admin
-from utils.dependencies import get_connection, get_http_client
+from utils.dependencies import (
+    get_connection,
+    get_http_client,
+    get_db_pool,
+    get_pool_stats,
+)
 from services.admin_service import (
     get_all_orders_service,
     get_all_users_service,
     get_user_orders_service_by_admin,
     cancel_order,
     update_order_refund_status,
-    upload_completion_file,
+    create_completion_upload,
+    confirm_completion_upload,
     get_completion_file,
     update_order_completion_status,
 )
+from services.webhook_inbox_service import (
+    get_webhook_events,
+    replay_webhook_event,
+)
+from services.reconciliation_service import get_reconciliation_reports
+from services.search_service import search_users_service, search_orders_service
+from services.dashboard_service import get_dashboard_service
+from services.utilization_service import get_utilization_heatmap
+from services.analytics_service import get_daily_metrics, get_scheduling_failures
+from services.export_service import (
+    get_export_window,
+    stream_orders_csv,
+    export_orders_parquet,
+)
+from services.bulk_admin_service import (
+    bulk_update_refund_status,
+    bulk_cancel_orders,
+    bulk_update_completion_status,
+)
 from services.booking_service import get_order_detail_service
+from utils.query_logger import get_query_stats
+from utils.tracing import get_slowest_traces, get_trace
+from utils.profiler import (
+    run_profile,
+    render_collapsed,
+    summarize_stacks,
+    PROFILE_MAX_SECONDS,
+    PROFILE_DEFAULT_INTERVAL_MS,
+)
 from services.scheduling_service import (
     process_immediate_scheduling,
     process_repair_order,
 )
 from models.booking_model import OrderDetail
+from models.admin_model import (
+    CompletionUploadRequest,
+    CompletionUploadResponse,
+    CompletionConfirmRequest,
+    BulkOrderRequest,
+    BulkRefundRequest,
+)
 import asyncpg
 from typing import Optional
+from datetime import date
 import httpx
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
+@router.get("/dashboard")
+async def get_dashboard_by_admin(
+    current_user: dict = Depends(require_admin),
+    pool: asyncpg.Pool = Depends(get_db_pool),
+):
+    try:
+        return await get_dashboard_service(pool)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"取得管理後台看板失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得管理後台看板失敗")
+
+
+@router.get("/utilization/heatmap")
+async def get_utilization_heatmap_by_admin(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    service_type: Optional[str] = Query(None),
+    granularity: str = Query("hour", pattern="^(hour|day|week|month)$"),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await get_utilization_heatmap(
+            date_from, date_to, service_type, granularity, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"取得人力使用率失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得人力使用率失敗")
+
+
+@router.get("/analytics/daily")
+async def get_daily_metrics_by_admin(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    service_type: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    group_by: Optional[str] = Query(None, pattern="^(service_type|region)$"),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await get_daily_metrics(
+            date_from, date_to, service_type, region, group_by, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"取得營運統計失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得營運統計失敗")
+
+
+@router.get("/analytics/scheduling-failures")
+async def get_scheduling_failures_by_admin(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    service_type: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await get_scheduling_failures(
+            date_from, date_to, service_type, region, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"取得排程失敗統計失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得排程失敗統計失敗")
+
+
 @router.get("/users")
 async def get_all_users_by_admin(
     page: int = Query(1, ge=1),
@@ -39,22 +157,124 @@ async def get_all_users_by_admin(
         raise HTTPException(status_code=500, detail="取得使用者列表失敗")
 
 
+@router.get("/search/users")
+async def search_users_by_admin(
+    q: str = Query(..., min_length=1),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await search_users_service(q, cursor, limit, db)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"搜尋會員失敗: {e}")
+        raise HTTPException(status_code=500, detail="搜尋會員失敗")
+
+
+@router.get("/search/orders")
+async def search_orders_by_admin(
+    q: str = Query(..., min_length=1),
+    status: Optional[str] = Query(None),
+    payment_status: Optional[str] = Query(None),
+    service_type: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await search_orders_service(
+            q, status, payment_status, service_type, cursor, limit, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"搜尋訂單失敗: {e}")
+        raise HTTPException(status_code=500, detail="搜尋訂單失敗")
+
+
 @router.get("/orders")
 async def get_all_orders_by_admin(
     status: Optional[str] = Query(None),
     payment_status: Optional[str] = Query(None),
-    page: int = Query(1, ge=1),
+    service_type: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    cursor: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=100),
+    exact_count: bool = Query(False),
     current_user: dict = Depends(require_admin),
     db: asyncpg.Connection = Depends(get_connection),
 ):
     try:
-        return await get_all_orders_service(status, payment_status, page, limit, db)
+        return await get_all_orders_service(
+            status,
+            payment_status,
+            service_type,
+            date_from,
+            date_to,
+            cursor,
+            limit,
+            exact_count,
+            db,
+        )
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         print(f"取得訂單列表失敗: {e}")
         raise HTTPException(status_code=500, detail="取得訂單列表失敗")
 
 
+@router.post("/orders/refund")
+async def bulk_refund_orders_by_admin(
+    request: BulkRefundRequest,
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await bulk_update_refund_status(
+            request.order_ids, request.refund_user, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"批次更新退款狀態失敗: {e}")
+        raise HTTPException(status_code=500, detail="批次更新退款狀態失敗")
+
+
+@router.post("/orders/cancel")
+async def bulk_cancel_orders_by_admin(
+    request: BulkOrderRequest,
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await bulk_cancel_orders(request.order_ids, db)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"批次取消訂單失敗: {e}")
+        raise HTTPException(status_code=500, detail="批次取消訂單失敗")
+
+
+@router.post("/orders/complete")
+async def bulk_complete_orders_by_admin(
+    request: BulkOrderRequest,
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await bulk_update_completion_status(request.order_ids, db)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"批次更新完工狀態失敗: {e}")
+        raise HTTPException(status_code=500, detail="批次更新完工狀態失敗")
+
+
 @router.get("/order/{order_id}", response_model=OrderDetail)
 async def get_order_detail_by_admin(
     order_id: int,
@@ -144,16 +364,38 @@ async def cancel_order_by_admin(
         raise HTTPException(status_code=500, detail="取消訂單失敗")
 
 
-@router.post("/order/{order_id}/completion")
-async def upload_order_completion(
+@router.post(
+    "/order/{order_id}/completion/upload-url",
+    response_model=CompletionUploadResponse,
+)
+async def create_order_completion_upload(
     order_id: int,
-    file: UploadFile = File(...),
+    request: CompletionUploadRequest,
     current_user: dict = Depends(require_admin),
     db: asyncpg.Connection = Depends(get_connection),
 ):
     try:
-        result = await upload_completion_file(order_id, file, db)
-        return result
+        return await create_completion_upload(
+            order_id, request.file_name, request.file_size, db
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"建立完工報告上傳網址失敗: {e}")
+        raise HTTPException(status_code=500, detail="建立完工報告上傳網址失敗")
+
+
+@router.post("/order/{order_id}/completion/confirm")
+async def confirm_order_completion_upload(
+    order_id: int,
+    request: CompletionConfirmRequest,
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await confirm_completion_upload(
+            order_id, request.object_key, request.file_name, db
+        )
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
@@ -191,3 +433,145 @@ async def update_completion_status(
     except Exception as e:
         print(f"更新完工狀態失敗: {e}")
         raise HTTPException(status_code=500, detail="更新完工狀態失敗")
+
+
+@router.get("/webhook-events")
+async def get_webhook_events_by_admin(
+    status: Optional[str] = Query(None),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await get_webhook_events(status, page, limit, db)
+    except Exception as e:
+        print(f"取得 webhook 事件列表失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得 webhook 事件列表失敗")
+
+
+@router.post("/webhook-events/{event_id}/replay")
+async def replay_webhook_event_by_admin(
+    event_id: str,
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await replay_webhook_event(event_id, db)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"重新處理 webhook 事件失敗: {e}")
+        raise HTTPException(status_code=500, detail="重新處理 webhook 事件失敗")
+
+
+@router.get("/reconciliation/reports")
+async def get_reconciliation_reports_by_admin(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_connection),
+):
+    try:
+        return await get_reconciliation_reports(limit, db)
+    except Exception as e:
+        print(f"取得對帳報告失敗: {e}")
+        raise HTTPException(status_code=500, detail="取得對帳報告失敗")
+
+
+@router.get("/pool-stats")
+async def get_pool_stats_by_admin(
+    current_user: dict = Depends(require_admin),
+    pool: asyncpg.Pool = Depends(get_db_pool),
+):
+    return get_pool_stats(pool)
+
+
+@router.get("/query-stats")
+async def get_query_stats_by_admin(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin),
+):
+    return get_query_stats(limit)
+
+
+@router.get("/profile")
+async def profile_worker_by_admin(
+    seconds: float = Query(10, ge=1, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(PROFILE_DEFAULT_INTERVAL_MS, ge=1, le=100),
+    mode: str = Query("cpu", pattern="^(cpu|wall)$"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    all_threads: bool = Query(False),
+    limit: int = Query(30, ge=1, le=200),
+    current_user: dict = Depends(require_admin),
+):
+    # 取樣的是處理此請求的 worker 行程；多 worker 部署時需分別呼叫
+    result = await run_profile(seconds, interval_ms, mode, all_threads)
+    if result is None:
+        raise HTTPException(status_code=409, detail="此 worker 已有取樣正在進行")
+    stacks = result.pop("stacks")
+    if format == "collapsed":
+        return PlainTextResponse(
+            render_collapsed(stacks),
+            headers={
+                "Content-Disposition": f'attachment; filename="profile_{result["pid"]}.folded"',
+                "X-Profile-Samples": str(result["samples"]),
+                "X-Profile-Idle-Samples": str(result["idle_samples"]),
+            },
+        )
+    return {**result, **summarize_stacks(stacks, limit)}
+
+
+@router.get("/traces/slowest")
+async def get_slowest_traces_by_admin(
+    limit: int = Query(20, ge=1, le=100),
+    kind: Optional[str] = Query(None, pattern="^(http|job)$"),
+    include_spans: bool = Query(True),
+    current_user: dict = Depends(require_admin),
+):
+    return get_slowest_traces(limit, kind, include_spans)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace_by_admin(
+    trace_id: str,
+    current_user: dict = Depends(require_admin),
+):
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="找不到 trace，可能已超出保留範圍")
+    return trace
+
+
+@router.get("/export/orders.csv")
+async def export_orders_csv_by_admin(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    current_user: dict = Depends(require_admin),
+    pool: asyncpg.Pool = Depends(get_db_pool),
+):
+    start, end = get_export_window(date_from, date_to)
+    # 串流期間自行向連線池取得連線，不使用請求結束時即歸還的 get_connection
+    return StreamingResponse(
+        stream_orders_csv(pool, start, end),
+        media_type="text/csv; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="orders_{date_from}_{date_to}.csv"'
+        },
+    )
+
+
+@router.post("/export/orders.parquet")
+async def export_orders_parquet_by_admin(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    destination: str = Query("local", pattern="^(local|s3)$"),
+    current_user: dict = Depends(require_admin),
+    pool: asyncpg.Pool = Depends(get_db_pool),
+):
+    try:
+        return await export_orders_parquet(pool, date_from, date_to, destination)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        print(f"匯出 Parquet 失敗: {e}")
+        raise HTTPException(status_code=500, detail="匯出 Parquet 失敗")
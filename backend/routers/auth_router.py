@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends, Body
-from utils.dependencies import get_connection
+from utils.dependencies import get_connection, get_http_client
 from utils.auth import require_auth, require_admin
 from services.auth_service import google_login_service
 from models.auth_model import LoginResponse, User
 import asyncpg
+import httpx
 
 
 router = APIRouter(prefix="/api", tags=["auth"])
@@ -11,10 +12,12 @@ router = APIRouter(prefix="/api", tags=["auth"])
 
 @router.post("/login", response_model=LoginResponse)
 async def login(
-    id_token: str = Body(...), db: asyncpg.Connection = Depends(get_connection)
+    id_token: str = Body(...),
+    db: asyncpg.Connection = Depends(get_connection),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
 ):
     try:
-        return await google_login_service(id_token, db)
+        return await google_login_service(id_token, db, http_client)
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
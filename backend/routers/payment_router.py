@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.security import HTTPAuthorizationCredentials
 import asyncpg
-from utils.dependencies import get_connection
-from utils.auth import require_auth, verify_order_ownership
+from typing import Optional
+from utils.dependencies import get_connection, get_db_pool
+from utils.auth import (
+    require_auth,
+    verify_order_ownership,
+    get_current_user,
+    security,
+)
 from models.payment_model import (
     PaymentStatusResponse,
     CheckoutSessionRequest,
@@ -10,8 +17,10 @@ from models.payment_model import (
 from services.payment_service import (
     create_checkout_session,
     get_payment_status,
+    wait_for_payment_status_change,
     handle_webhook,
 )
+from services.notification_service import order_status_hub
 
 router = APIRouter(prefix="/api", tags=["payment"])
 
@@ -50,6 +59,44 @@ async def get_payment_status_endpoint(
         raise HTTPException(status_code=500, detail="查詢付款狀態失敗")
 
 
+@router.get(
+    "/payment/status/{order_id}/wait", response_model=PaymentStatusResponse
+)
+async def wait_payment_status_endpoint(
+    order_id: int,
+    request: Request,
+    payment_status: Optional[str] = Query(None),
+    order_status: Optional[str] = Query(None),
+    timeout: int = Query(50, ge=1, le=55),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    pool: asyncpg.Pool = Depends(get_db_pool),
+):
+    # 先訂閱再查詢，避免查詢與開始等待之間的狀態變更被漏接
+    waiter = order_status_hub.subscribe(order_id)
+    try:
+        current_user = await get_current_user(request, credentials, pool)
+        if not current_user:
+            raise HTTPException(status_code=401, detail="需要登入才能使用此功能")
+        # 查詢完即歸還連線，長時間等待期間不佔用連線池
+        async with pool.acquire() as db:
+            await verify_order_ownership(order_id, current_user["id"], db)
+            current = await get_payment_status(order_id, db)
+        if (
+            current.payment_status.value != payment_status
+            or current.order_status != order_status
+        ):
+            return current
+        return await wait_for_payment_status_change(current, waiter, timeout)
+    except HTTPException as http_exc:
+        print(f"{http_exc.status_code} - {http_exc.detail}")
+        raise http_exc
+    except Exception as e:
+        print(f"等待付款狀態失敗: {e}")
+        raise HTTPException(status_code=500, detail="查詢付款狀態失敗")
+    finally:
+        order_status_hub.unsubscribe(order_id, waiter)
+
+
 @router.post("/payment/webhook/stripe")
 async def stripe_webhook_endpoint(
     request: Request, db: asyncpg.Connection = Depends(get_connection)
@@ -1,13 +1,20 @@
-from fastapi import HTTPException, UploadFile
+from fastapi import HTTPException
 from typing import Optional
 from services.booking_service import get_user_orders_service
-from services.mail_service import send_cancellation_confirmation_email
-from datetime import datetime
+from services.mail_service import build_cancellation_confirmation_email
+from services.email_outbox_service import enqueue_email
+from utils.dependencies import release_connection
+from utils.metrics import track_external_call
+from datetime import datetime, date, time, timedelta
+import asyncio
 from zoneinfo import ZoneInfo
 import os
 import boto3
 from botocore.exceptions import ClientError
 import uuid
+from urllib.parse import quote
+import base64
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import json
 
@@ -20,6 +27,14 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 AWS_REGION = os.getenv("AWS_REGION")
 CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN")
+# 本地開發或測試時可指向 MinIO、moto 等 S3 相容服務
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+COMPLETION_FILE_MAX_BYTES = 10 * 1024 * 1024
+COMPLETION_UPLOAD_EXPIRES_SECONDS = 600
+
+# 估計筆數低於此值時直接 COUNT(*)，超過則回傳查詢計畫的估計值
+EXACT_COUNT_THRESHOLD = 10000
+order_count_cache = TTLCache(maxsize=256, ttl=30)
 
 if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
     s3_client = boto3.client(
@@ -27,77 +42,163 @@ if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
         region_name=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
     )
 else:
     s3_client = boto3.client(
         "s3",
         region_name=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
     )
 
 
+# 管理員訂單列表與搜尋共用的欄位，預約時段以 json_agg 併入同一查詢
+ADMIN_ORDER_COLUMNS = """
+    o.*, st.name as service_type, u.name as user_name, u.email as user_email,
+    COALESCE(slots.booking_slots, '[]') AS booking_slots
+"""
+ADMIN_ORDER_JOINS = """
+    JOIN service_types st ON o.service_type_id = st.id
+    JOIN users u ON o.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'preferred_date', bs.preferred_date,
+            'preferred_time', bs.preferred_time,
+            'contact_name', bs.contact_name,
+            'contact_phone', bs.contact_phone,
+            'is_primary', bs.is_primary,
+            'is_selected', bs.is_selected
+        ) ORDER BY bs.is_primary DESC, bs.preferred_date, bs.preferred_time) AS booking_slots
+        FROM booking_slots bs
+        WHERE bs.order_id = o.id
+    ) slots ON true
+"""
+
+
+def build_admin_order(record):
+    order_dict = dict(record)
+    order_dict["order_id"] = order_dict["id"]
+    order_dict["booking_slots"] = json.loads(order_dict["booking_slots"])
+    if order_dict["equipment_details"]:
+        order_dict["equipment_details"] = json.loads(order_dict["equipment_details"])
+    else:
+        order_dict["equipment_details"] = None
+    return order_dict
+
+
+def encode_order_cursor(created_at: datetime, order_id: int):
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_order_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, order_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="無效的分頁游標")
+
+
+async def count_orders(where_clause: str, params: list, exact: bool, db):
+    count_query = f"SELECT 1 FROM orders o {where_clause}"
+    if exact:
+        total = await db.fetchval(f"SELECT COUNT(*) FROM ({count_query}) c", *params)
+        return total, False
+    cache_key = (where_clause, tuple(params))
+    cached = order_count_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # 先取查詢計畫的估計筆數，數量不大時直接精確計算
+    plan = await db.fetchval(f"EXPLAIN (FORMAT JSON) {count_query}", *params)
+    estimate = int(json.loads(plan)[0]["Plan"]["Plan Rows"])
+    if estimate <= EXACT_COUNT_THRESHOLD:
+        total = await db.fetchval(f"SELECT COUNT(*) FROM ({count_query}) c", *params)
+        result = (total, False)
+    else:
+        result = (estimate, True)
+    order_count_cache[cache_key] = result
+    return result
+
+
 async def get_all_orders_service(
-    status: Optional[str], payment_status: Optional[str], page: int, limit: int, db
+    status: Optional[str],
+    payment_status: Optional[str],
+    service_type: Optional[str],
+    date_from: Optional[date],
+    date_to: Optional[date],
+    cursor: Optional[str],
+    limit: int,
+    exact_count: bool,
+    db,
 ):
     try:
         where_conditions = []
         params = []
-        param_count = 0
         if status:
-            param_count += 1
-            where_conditions.append(f"o.status = ${param_count}")
             params.append(status)
+            where_conditions.append(f"o.status = ${len(params)}")
         if payment_status:
-            param_count += 1
-            where_conditions.append(f"o.payment_status = ${param_count}")
             params.append(payment_status)
+            where_conditions.append(f"o.payment_status = ${len(params)}")
+        if service_type:
+            params.append(service_type)
+            where_conditions.append(
+                f"o.service_type_id = (SELECT id FROM service_types WHERE name = ${len(params)})"
+            )
+        if date_from:
+            params.append(datetime.combine(date_from, time.min, TAIPEI_TZ))
+            where_conditions.append(f"o.created_at >= ${len(params)}")
+        if date_to:
+            params.append(
+                datetime.combine(date_to + timedelta(days=1), time.min, TAIPEI_TZ)
+            )
+            where_conditions.append(f"o.created_at < ${len(params)}")
         where_clause = " AND ".join(where_conditions)
         if where_clause:
             where_clause = "WHERE " + where_clause
-        select_query = f"SELECT COUNT(*) FROM orders o {where_clause}"
-        total = await db.fetchval(select_query, *params)
-
-        offset = (page - 1) * limit
-        param_count += 1
-        limit_param = f"${param_count}"
-        param_count += 1
-        offset_param = f"${param_count}"
+        total, total_is_estimate = await count_orders(
+            where_clause, params, exact_count, db
+        )
 
+        page_conditions = list(where_conditions)
+        page_params = list(params)
+        if cursor:
+            cursor_created_at, cursor_id = decode_order_cursor(cursor)
+            page_params.extend([cursor_created_at, cursor_id])
+            page_conditions.append(
+                f"(o.created_at, o.id) < (${len(page_params) - 1}, ${len(page_params)})"
+            )
+        page_where = ""
+        if page_conditions:
+            page_where = "WHERE " + " AND ".join(page_conditions)
+        page_params.append(limit + 1)
+        # 以 (created_at, id) 游標分頁，多取一筆判斷是否還有下一頁
         select_query = f"""
-        SELECT o.*, st.name as service_type, u.name as user_name, u.email as user_email
-        FROM orders o 
-        JOIN service_types st ON o.service_type_id = st.id
-        JOIN users u ON o.user_id = u.id
-        {where_clause}
-        ORDER BY o.created_at DESC
-        LIMIT {limit_param} OFFSET {offset_param}
+        SELECT {ADMIN_ORDER_COLUMNS}
+        FROM orders o
+        {ADMIN_ORDER_JOINS}
+        {page_where}
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT ${len(page_params)}
         """
-        orders = await db.fetch(select_query, *params, limit, offset)
-        result = []
-        for order in orders:
-            select_query = """
-            SELECT preferred_date, preferred_time, contact_name, contact_phone, is_primary, is_selected 
-            FROM booking_slots 
-            WHERE order_id = $1 
-            ORDER BY is_primary DESC, preferred_date, preferred_time
-            """
-            slots = await db.fetch(select_query, order["id"])
-            order_dict = dict(order)
-            order_dict["order_id"] = order_dict["id"]
-            order_dict["booking_slots"] = [dict(slot) for slot in slots]
-            if order_dict["equipment_details"]:
-                order_dict["equipment_details"] = json.loads(
-                    order_dict["equipment_details"]
-                )
-            else:
-                order_dict["equipment_details"] = None
-            result.append(order_dict)
+        orders = await db.fetch(select_query, *page_params)
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        result = [build_admin_order(order) for order in orders]
+        next_cursor = None
+        if has_more:
+            last = orders[-1]
+            next_cursor = encode_order_cursor(last["created_at"], last["id"])
         return {
             "orders": result,
             "total": total,
-            "page": page,
+            "total_is_estimate": total_is_estimate,
             "limit": limit,
-            "total_pages": (total + limit - 1) // limit,
+            "next_cursor": next_cursor,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"獲取訂單列表失敗：{e}")
         raise HTTPException(status_code=500, detail="獲取訂單列表失敗")
@@ -234,33 +335,35 @@ async def cancel_order(order_id: int, db):
                     "message": f"訂單 {order['order_number']} 已成功取消",
                     "cleaned_locks": cleaned_locks_count,
                 }
-            email_sent = False
-            try:
-                select_query = "SELECT u.email, u.name FROM users u JOIN orders o ON u.id = o.user_id WHERE o.id = $1"
-                user = await db.fetchrow(select_query, order_id)
-                select_query = "SELECT preferred_date, preferred_time FROM booking_slots WHERE order_id = $1 ORDER BY is_selected DESC, is_primary DESC, preferred_date, preferred_time LIMIT 1"
-                booking_slot = await db.fetchrow(select_query, order_id)
-                if user:
-                    order_data = {
-                        "order_id": order_id,
-                        "order_number": order["order_number"],
-                        "service_type": order["service_type"],
-                        "location_address": order["location_address"],
-                        "total_amount": order["total_amount"],
-                        "preferred_date": (
-                            booking_slot["preferred_date"] if booking_slot else None
-                        ),
-                        "preferred_time": (
-                            booking_slot["preferred_time"] if booking_slot else None
-                        ),
-                        "user_email": user["email"],
-                        "user_name": user["name"],
-                    }
-                mail_result = send_cancellation_confirmation_email(order_data)
-                email_sent = mail_result.get("success", False)
-            except Exception as email_error:
-                print(f"郵件發送失敗，但排程已成功: {email_error}")
-            result["email_sent"] = email_sent
+            select_query = "SELECT u.email, u.name FROM users u JOIN orders o ON u.id = o.user_id WHERE o.id = $1"
+            user = await db.fetchrow(select_query, order_id)
+            select_query = "SELECT preferred_date, preferred_time FROM booking_slots WHERE order_id = $1 ORDER BY is_selected DESC, is_primary DESC, preferred_date, preferred_time LIMIT 1"
+            booking_slot = await db.fetchrow(select_query, order_id)
+            email_queued = False
+            if user:
+                order_data = {
+                    "order_id": order_id,
+                    "order_number": order["order_number"],
+                    "service_type": order["service_type"],
+                    "location_address": order["location_address"],
+                    "total_amount": order["total_amount"],
+                    "preferred_date": (
+                        booking_slot["preferred_date"] if booking_slot else None
+                    ),
+                    "preferred_time": (
+                        booking_slot["preferred_time"] if booking_slot else None
+                    ),
+                    "user_email": user["email"],
+                    "user_name": user["name"],
+                }
+                await enqueue_email(
+                    db,
+                    "cancellation_confirmation",
+                    build_cancellation_confirmation_email(order_data),
+                    order_id,
+                )
+                email_queued = True
+            result["email_queued"] = email_queued
             return result
     except HTTPException:
         raise
@@ -326,58 +429,112 @@ async def cleanup_all_order_locks(order_id: int, db):
         return 0
 
 
-async def upload_completion_file(order_id: int, file: UploadFile, db):
-    if not file.filename.lower().endswith(".pdf"):
+def validate_completion_file(file_name: str, file_size: int):
+    if not file_name.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="只允許上傳 PDF 檔案")
-    if not file.size or file.size > 10 * 1024 * 1024:
+    if not file_size or file_size > COMPLETION_FILE_MAX_BYTES:
         raise HTTPException(status_code=400, detail="檔案大小不能超過 10MB")
+
+
+def build_content_disposition(file_name: str):
+    return f"inline; filename*=UTF-8''{quote(file_name)}"
+
+
+async def create_completion_upload(order_id: int, file_name: str, file_size: int, db):
+    validate_completion_file(file_name, file_size)
     try:
-        async with db.transaction():
-            select_query = (
-                "SELECT id, order_number, status FROM orders WHERE id = $1 FOR UPDATE"
+        select_query = "SELECT id, order_number, status FROM orders WHERE id = $1"
+        order = await db.fetchrow(select_query, order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="訂單不存在")
+        if order["status"] != "scheduled":
+            raise HTTPException(
+                status_code=400, detail="只有已排程的訂單可以上傳完工報告"
             )
-            order = await db.fetchrow(select_query, order_id)
-            if not order:
-                raise HTTPException(status_code=404, detail="訂單不存在")
-            if order["status"] != "scheduled":
-                raise HTTPException(
-                    status_code=400, detail="只有已排程的訂單可以上傳完工報告"
-                )
-            s3_object_name = f"{order["order_number"]}_{uuid.uuid4().hex}_report.pdf"
-            try:
-                s3_client.upload_fileobj(
-                    file.file,
-                    S3_BUCKET_NAME,
-                    s3_object_name,
-                    ExtraArgs={
-                        "ContentType": "application/pdf",
-                        "ContentDisposition": f"inline; filename={file.filename}",
-                    },
+        object_key = f"{order['order_number']}_{uuid.uuid4().hex}_report.pdf"
+        # 瀏覽器直接上傳至 S3，由 policy 限制檔案類型與大小；簽章在本機計算，不需呼叫 S3
+        presigned = s3_client.generate_presigned_post(
+            S3_BUCKET_NAME,
+            object_key,
+            Fields={
+                "Content-Type": "application/pdf",
+                "Content-Disposition": build_content_disposition(file_name),
+            },
+            Conditions=[
+                {"Content-Type": "application/pdf"},
+                {"Content-Disposition": build_content_disposition(file_name)},
+                ["content-length-range", 1, COMPLETION_FILE_MAX_BYTES],
+            ],
+            ExpiresIn=COMPLETION_UPLOAD_EXPIRES_SECONDS,
+        )
+        return {
+            "upload_url": presigned["url"],
+            "fields": presigned["fields"],
+            "object_key": object_key,
+            "expires_in": COMPLETION_UPLOAD_EXPIRES_SECONDS,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"建立完工報告上傳網址失敗: {e}")
+        raise HTTPException(status_code=500, detail="建立完工報告上傳網址失敗")
+
+
+async def confirm_completion_upload(
+    order_id: int, object_key: str, file_name: str, db
+):
+    try:
+        select_query = "SELECT id, order_number, status FROM orders WHERE id = $1"
+        order = await db.fetchrow(select_query, order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="訂單不存在")
+        if not (
+            object_key.startswith(f"{order['order_number']}_")
+            and object_key.endswith("_report.pdf")
+            and "/" not in object_key
+        ):
+            raise HTTPException(status_code=400, detail="檔案與訂單不符")
+        # 確認 S3 上確實有檔案期間不佔用連線
+        await release_connection(db)
+        try:
+            with track_external_call("s3", "head_object"):
+                head = await asyncio.to_thread(
+                    s3_client.head_object, Bucket=S3_BUCKET_NAME, Key=object_key
                 )
-            except ClientError as err:
-                print(f"S3返回錯誤回應：{err}")
+        except ClientError as err:
+            print(f"S3返回錯誤回應：{err}")
+            raise HTTPException(status_code=400, detail="找不到上傳的檔案，請重新上傳")
+        if (
+            head.get("ContentType") != "application/pdf"
+            or head.get("ContentLength", 0) > COMPLETION_FILE_MAX_BYTES
+        ):
+            raise HTTPException(status_code=400, detail="上傳的檔案格式或大小不符")
+        file_url = f"{CLOUDFRONT_DOMAIN}/{object_key}"
+        async with db.transaction():
+            select_query = "SELECT status FROM orders WHERE id = $1 FOR UPDATE"
+            status = await db.fetchval(select_query, order_id)
+            if status != "scheduled":
                 raise HTTPException(
-                    status_code=500, detail="S3返回錯誤回應，檔案上傳失敗"
+                    status_code=400, detail="只有已排程的訂單可以上傳完工報告"
                 )
-            file_url = f"{CLOUDFRONT_DOMAIN}/{s3_object_name}"
             select_query = (
                 "SELECT completion_file_url FROM order_completions WHERE order_id = $1"
             )
             existing = await db.fetchrow(select_query, order_id)
             if existing:
                 update_query = "UPDATE order_completions SET completion_file_url = $2, completion_file_name = $3 WHERE order_id = $1"
-                await db.execute(update_query, order_id, file_url, file.filename)
+                await db.execute(update_query, order_id, file_url, file_name)
                 message = f"訂單 {order['order_number']} 驗收報告已更新"
             else:
                 insert_query = "INSERT INTO order_completions(order_id, completion_file_url, completion_file_name) VALUES ($1, $2, $3)"
-                await db.execute(insert_query, order_id, file_url, file.filename)
+                await db.execute(insert_query, order_id, file_url, file_name)
                 message = f"訂單 {order['order_number']} 完工報告上傳成功"
-            return {
-                "success": True,
-                "message": message,
-                "completion_file_name": file.filename,
-                "completion_file_url": file_url,
-            }
+        return {
+            "success": True,
+            "message": message,
+            "completion_file_name": file_name,
+            "completion_file_url": file_url,
+        }
     except HTTPException:
         raise
     except Exception as e:
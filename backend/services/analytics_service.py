@@ -0,0 +1,135 @@
+from fastapi import HTTPException
+from typing import Optional
+from datetime import date, timedelta
+
+ANALYTICS_MAX_DAYS = 366
+ANALYTICS_EVENTS = [
+    "created",
+    "paid",
+    "scheduled",
+    "scheduling_failed",
+    "cancelled",
+    "refunded",
+    "completed",
+]
+ANALYTICS_GROUP_BY = ["service_type", "region"]
+
+# 只讀 trigger 維護的每日計數表，查詢成本與天數成正比，與訂單量無關
+DAILY_METRICS_QUERY = """
+    SELECT m.metric_date, m.event,
+           CASE $5::text
+               WHEN 'service_type' THEN st.name
+               WHEN 'region' THEN m.region
+           END AS group_key,
+           SUM(m.order_count)::int AS order_count,
+           SUM(m.amount)::bigint AS amount
+    FROM order_daily_metrics m
+    JOIN service_types st ON st.id = m.service_type_id
+    WHERE m.metric_date BETWEEN $1 AND $2
+      AND ($3::text IS NULL OR st.name = $3)
+      AND ($4::text IS NULL OR m.region = $4)
+    GROUP BY 1, 2, 3
+"""
+
+SCHEDULING_FAILURES_QUERY = """
+    SELECT m.reason, SUM(m.order_count)::int AS order_count
+    FROM order_daily_metrics m
+    JOIN service_types st ON st.id = m.service_type_id
+    WHERE m.event = 'scheduling_failed'
+      AND m.metric_date BETWEEN $1 AND $2
+      AND ($3::text IS NULL OR st.name = $3)
+      AND ($4::text IS NULL OR m.region = $4)
+    GROUP BY m.reason
+    ORDER BY order_count DESC, m.reason
+"""
+
+
+def validate_analytics_window(date_from: date, date_to: date):
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="開始日期不能晚於結束日期")
+    if (date_to - date_from).days + 1 > ANALYTICS_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"查詢區間不能超過 {ANALYTICS_MAX_DAYS} 天"
+        )
+
+
+def build_empty_point(metric_date: date):
+    point = {"date": metric_date}
+    for event in ANALYTICS_EVENTS:
+        point[event] = 0
+    point["paid_amount"] = 0
+    point["refunded_amount"] = 0
+    return point
+
+
+async def get_daily_metrics(
+    date_from: date,
+    date_to: date,
+    service_type: Optional[str],
+    region: Optional[str],
+    group_by: Optional[str],
+    db,
+):
+    validate_analytics_window(date_from, date_to)
+    if group_by is not None and group_by not in ANALYTICS_GROUP_BY:
+        raise HTTPException(status_code=400, detail="無效的分組方式")
+    try:
+        records = await db.fetch(
+            DAILY_METRICS_QUERY, date_from, date_to, service_type, region, group_by
+        )
+    except Exception as e:
+        print(f"取得營運統計失敗：{e}")
+        raise HTTPException(status_code=500, detail="取得營運統計失敗")
+    days = [
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    ]
+    series = {}
+    for record in records:
+        group_key = record["group_key"] or "all"
+        if group_key not in series:
+            series[group_key] = {day: build_empty_point(day) for day in days}
+        point = series[group_key][record["metric_date"]]
+        point[record["event"]] = record["order_count"]
+        if record["event"] in ["paid", "refunded"]:
+            point[f"{record['event']}_amount"] = record["amount"]
+    if not series:
+        series["all"] = {day: build_empty_point(day) for day in days}
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "service_type": service_type,
+        "region": region,
+        "group_by": group_by,
+        "events": ANALYTICS_EVENTS,
+        "series": [
+            {"group": group_key, "points": list(points.values())}
+            for group_key, points in sorted(series.items())
+        ],
+    }
+
+
+async def get_scheduling_failures(
+    date_from: date,
+    date_to: date,
+    service_type: Optional[str],
+    region: Optional[str],
+    db,
+):
+    validate_analytics_window(date_from, date_to)
+    try:
+        records = await db.fetch(
+            SCHEDULING_FAILURES_QUERY, date_from, date_to, service_type, region
+        )
+    except Exception as e:
+        print(f"取得排程失敗統計失敗：{e}")
+        raise HTTPException(status_code=500, detail="取得排程失敗統計失敗")
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "total": sum(record["order_count"] for record in records),
+        "reasons": [
+            {"reason": record["reason"] or None, "count": record["order_count"]}
+            for record in records
+        ],
+    }
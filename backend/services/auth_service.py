@@ -1,12 +1,16 @@
 from fastapi import HTTPException
 from pydantic import EmailStr
-from utils.auth import verify_google_token, create_jwt_token
+from utils.auth import (
+    verify_google_token,
+    create_jwt_token,
+    invalidate_user_claims,
+)
 from models.auth_model import LoginResponse, User
 
 
-async def google_login_service(id_token: str, db):
+async def google_login_service(id_token: str, db, http_client):
     try:
-        google_user_data = await verify_google_token(id_token)
+        google_user_data = await verify_google_token(id_token, http_client)
         google_id = google_user_data["sub"]
         email = google_user_data["email"]
         name = google_user_data.get("name")
@@ -48,6 +52,7 @@ async def update_user_google_info(user_id: str, name: str = None, db=None):
     try:
         update_query = "UPDATE users SET name = COALESCE($1, name), updated_at = NOW() WHERE id = $2 RETURNING *"
         user_data = await db.fetchrow(update_query, name, user_id)
+        invalidate_user_claims(user_id)
         return dict(user_data)
     except Exception as e:
         print(f"使用者資料更新失敗: {e}")
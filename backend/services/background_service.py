@@ -1,29 +1,42 @@
-import asyncio
 from datetime import date, timedelta, datetime
+import os
 from zoneinfo import ZoneInfo
 from services.scheduling_service import process_repair_order
+from services.job_service import (
+    run_as_leader,
+    heartbeat,
+    sleep_while_holding_lock,
+    HEARTBEAT_SECONDS,
+)
+from services.lock_expiry_service import lock_expiry_scheduler
 
 
 TAIPEI_TZ = ZoneInfo("Asia/Taipei")
 
 
 async def cleanup_loop(db):
-    while True:
-        try:
-            async with db.acquire() as conn:
-                await run_cleanup(conn)
-            await asyncio.sleep(300)
-        except asyncio.CancelledError:
-            print("清理服務已成功停止")
-            raise
-        except Exception as e:
-            await asyncio.sleep(60)
-            print(f"清理服務發生意外錯誤: {e}")
+    await run_as_leader(db, "cleanup", run_cleanup, wait_for_next_cleanup)
+
+
+async def wait_for_next_cleanup(lock_conn, last_run_at):
+    if last_run_at is None:
+        # 剛取得執行權：先監聽新的到期通知再載入現有到期時間，接著立即清理一次
+        await lock_expiry_scheduler.listen(lock_conn)
+        await lock_expiry_scheduler.seed(lock_conn)
+        return
+    await lock_expiry_scheduler.wait_for_next_deadline(
+        lambda: heartbeat(lock_conn), HEARTBEAT_SECONDS
+    )
+
 
+# 每批次處理的訂單數，限制單一交易持有的列鎖數量與時間
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 500))
 
-async def run_cleanup(db):
+
+async def run_cleanup(db, batch_size: int = CLEANUP_BATCH_SIZE):
+    rows_affected = 0
     try:
-        await db.execute(
+        result = await db.execute(
             """
             UPDATE booking_slots
             SET is_locked = false,
@@ -36,152 +49,142 @@ async def run_cleanup(db):
               )
         """
         )
+        rows_affected += int(result.split()[-1])
         expired_locks = await db.fetchval("SELECT clean_expired_locks()")
         if expired_locks > 0:
             print(f"清理過期鎖定: {expired_locks} 筆")
-        expired_orders = await find_orders_with_all_slots_expired(db)
-        if expired_orders:
-            deleted_count = await delete_orders_with_expired_slots(expired_orders, db)
-            print(f"刪除時段過期訂單: {deleted_count} 筆")
-        deleted_repair_orders = await delete_unpaid_repair_orders(db)
-        if deleted_repair_orders > 0:
-            print(f"刪除未付款的維修訂單: {deleted_repair_orders} 筆")
+            rows_affected += expired_locks
+        rows_affected += await delete_orders_with_expired_slots(db, batch_size)
+        rows_affected += await delete_unpaid_repair_orders(db, batch_size)
     except Exception as e:
+        # 交由 record_job_run 記錄為失敗，background_job_runs 才能反映實際狀態
         print(f"清除程式出現錯誤：{e}")
+        raise
+    return rows_affected
+
+
+EXPIRED_SLOT_ORDERS_CONDITION = """
+    o.status = 'pending'
+    AND o.payment_status = 'unpaid'
+    AND st.name IN ('INSTALLATION', 'MAINTENANCE')
+    AND o.created_at < NOW() - INTERVAL '30 minutes'
+    AND NOT EXISTS (
+        SELECT 1
+        FROM booking_slots bs
+        LEFT JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id
+        WHERE bs.order_id = o.id
+          AND bs.is_locked = true
+          AND (tsl.expires_at IS NULL OR tsl.expires_at > NOW())
+    )
+"""
+
+UNPAID_REPAIR_ORDERS_CONDITION = """
+    o.status = 'pending'
+    AND o.payment_status = 'unpaid'
+    AND st.name = 'REPAIR'
+    AND o.created_at < NOW() - INTERVAL '30 minutes'
+"""
+
+UNLOCK_ORDER_SLOTS_QUERY = """
+    SELECT COUNT(
+        unlock_service_time_slot(
+            tsl.id,
+            bs.preferred_date,
+            bs.preferred_time,
+            LEAST(st.base_duration_hours + (o.unit_count - 1) * st.additional_duration_hours, 8)
+        )
+    )
+    FROM booking_slots bs
+    JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id
+    JOIN orders o ON bs.order_id = o.id
+    JOIN service_types st ON o.service_type_id = st.id
+    WHERE bs.order_id = ANY($1::int[])
+"""
+
+DELETE_ORDERS_QUERY = """
+    WITH deleted_slots AS (
+        DELETE FROM booking_slots
+        WHERE order_id = ANY($1::int[])
+        RETURNING id
+    ),
+    deleted_orders AS (
+        DELETE FROM orders
+        WHERE id = ANY($1::int[])
+        RETURNING id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM deleted_orders) AS order_count,
+        (SELECT COUNT(*) FROM deleted_slots) AS slot_count
+"""
 
 
-async def find_orders_with_all_slots_expired(db):
-    expired_orders = await db.fetch(
-        """
-        SELECT DISTINCT 
-            o.id, 
-            o.order_number, 
-            st.name as service_type,
-            o.unit_count,
-            st.base_duration_hours,
-            st.additional_duration_hours
-        FROM orders o
-        JOIN service_types st ON o.service_type_id = st.id
-        WHERE o.status = 'pending'
-          AND o.payment_status = 'unpaid'
-          AND st.name IN ('INSTALLATION', 'MAINTENANCE')
-          AND o.created_at < NOW() - INTERVAL '30 minutes'
-          AND NOT EXISTS (
-              SELECT 1 
-              FROM booking_slots bs
-              LEFT JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id
-              WHERE bs.order_id = o.id
-                AND bs.is_locked = true
-                AND (tsl.expires_at IS NULL OR tsl.expires_at > NOW())
-          )
-    """
+async def delete_orders_with_expired_slots(db, batch_size: int = CLEANUP_BATCH_SIZE):
+    return await delete_expired_orders_in_batches(
+        EXPIRED_SLOT_ORDERS_CONDITION, "時段過期訂單", db, batch_size
     )
-    return expired_orders
 
 
-async def delete_orders_with_expired_slots(expired_orders: list, db):
+async def delete_unpaid_repair_orders(db, batch_size: int = CLEANUP_BATCH_SIZE):
+    return await delete_expired_orders_in_batches(
+        UNPAID_REPAIR_ORDERS_CONDITION, "未付款維修訂單", db, batch_size
+    )
+
+
+async def delete_expired_orders_in_batches(
+    condition: str, label: str, db, batch_size: int
+):
+    # 先一次取得候選訂單，再分批鎖定並重新檢查條件，避免每批都重掃整張表
+    select_query = f"SELECT o.id FROM orders o JOIN service_types st ON o.service_type_id = st.id WHERE {condition} ORDER BY o.id"
+    candidate_ids = [record["id"] for record in await db.fetch(select_query)]
+    lock_query = f"SELECT o.id FROM orders o JOIN service_types st ON o.service_type_id = st.id WHERE o.id = ANY($1::int[]) AND {condition} FOR UPDATE OF o SKIP LOCKED"
     deleted_count = 0
-    for order in expired_orders:
+    failed_batches = 0
+    last_error = None
+    for start in range(0, len(candidate_ids), batch_size):
+        batch_ids = candidate_ids[start : start + batch_size]
         try:
             async with db.transaction():
-                order_id = order["id"]
-                order_number = order["order_number"]
-                service_type = order["service_type"]
-                unit_count = order["unit_count"]
-                required_hours = (
-                    order["base_duration_hours"]
-                    + (unit_count - 1) * order["additional_duration_hours"]
-                )
-                required_hours = min(required_hours, 8)
-                slots = await db.fetch(
-                    """
-                    SELECT bs.*, tsl.id as lock_id
-                    FROM booking_slots bs
-                    LEFT JOIN time_slot_locks tsl ON bs.temp_lock_id = tsl.id
-                    WHERE bs.order_id = $1
-                """,
-                    order_id,
+                order_ids = [
+                    record["id"] for record in await db.fetch(lock_query, batch_ids)
+                ]
+                if not order_ids:
+                    continue
+                unlocked = await db.fetchval(UNLOCK_ORDER_SLOTS_QUERY, order_ids)
+                result = await db.fetchrow(DELETE_ORDERS_QUERY, order_ids)
+                deleted_count += result["order_count"]
+                print(
+                    f"刪除{label}: {result['order_count']} 筆（時段 {result['slot_count']} 筆，解除鎖定 {unlocked} 筆）"
                 )
-
-                for slot in slots:
-                    if slot["lock_id"]:
-                        select_query = "SELECT unlock_service_time_slot($1, $2, $3, $4)"
-                        await db.fetchval(
-                            select_query,
-                            slot["lock_id"],
-                            slot["preferred_date"],
-                            slot["preferred_time"],
-                            required_hours,
-                        )
-                delete_query = "DELETE FROM booking_slots WHERE order_id = $1"
-                await db.execute(delete_query, order_id)
-                delete_query = "DELETE FROM orders WHERE id = $1"
-                await db.execute(delete_query, order_id)
-                deleted_count += 1
-                print(f"刪除過期訂單: {order_number} ({service_type}, {unit_count}台)")
-
         except Exception as e:
-            print(f"刪除訂單 {order['order_number']} 失敗: {e}")
-            continue
+            # 單一批次失敗不影響其他批次，全部處理完後再回報失敗
+            print(f"刪除{label}失敗: {e}")
+            failed_batches += 1
+            last_error = e
+    if failed_batches:
+        raise RuntimeError(
+            f"刪除{label}時有 {failed_batches} 批失敗（已刪除 {deleted_count} 筆）"
+        ) from last_error
     return deleted_count
 
 
-async def delete_unpaid_repair_orders(db):
-    try:
-        expired_repair_orders = await db.fetch(
-            """
-            SELECT o.id, o.order_number
-            FROM orders o
-            JOIN service_types st ON o.service_type_id = st.id
-            WHERE o.status = 'pending' 
-              AND o.payment_status = 'unpaid'
-              AND st.name = 'REPAIR'
-              AND o.created_at < NOW() - INTERVAL '30 minutes'
-        """
-        )
-        if not expired_repair_orders:
-            return 0
-        deleted_count = 0
-        for order in expired_repair_orders:
-            try:
-                async with db.transaction():
-                    order_id = order["id"]
-                    order_number = order["order_number"]
-                    delete_query = "DELETE FROM booking_slots WHERE order_id = $1"
-                    await db.execute(delete_query, order_id)
-                    delete_query = "DELETE FROM orders WHERE id = $1"
-                    await db.execute(delete_query, order_id)
-                    deleted_count += 1
-                    print(f"刪除過期維修訂單: {order_number}")
-            except Exception as e:
-                print(f"刪除維修訂單 {order['order_number']} 失敗: {e}")
-                continue
+async def repair_scheduling_loop(db, client):
+    async def run_once(conn):
+        print(f"[{datetime.now(TAIPEI_TZ)}] 開始執行每日維修排程...")
+        return await daily_repair_scheduling(conn, client)
 
-        return deleted_count
-    except Exception as e:
-        print(f"清理維修訂單時發生錯誤: {e}")
-        return 0
+    await run_as_leader(
+        db, "repair_scheduling", run_once, wait_for_next_repair_scheduling
+    )
 
 
-async def repair_scheduling_loop(db, client):
-    while True:
-        try:
-            now = datetime.now(TAIPEI_TZ)
-            next_run = now.replace(hour=15, minute=0, second=0, microsecond=0)
-            if now > next_run:
-                next_run += timedelta(days=1)
-            sleep_seconds = (next_run - now).total_seconds()
-            print(f"下次維修排程將在 {sleep_seconds:.0f} 秒後執行...")
-            await asyncio.sleep(sleep_seconds)
-            print(f"[{datetime.now(TAIPEI_TZ)}] 開始執行每日維修排程...")
-            async with db.acquire() as conn:
-                await daily_repair_scheduling(conn, client)
-        except asyncio.CancelledError:
-            print("維修背景排程循環已成功停止")
-            raise
-        except Exception as e:
-            print(f"維修背景排程循環錯誤: {e}")
-            await asyncio.sleep(3600)
+async def wait_for_next_repair_scheduling(lock_conn, last_run_at):
+    now = datetime.now(TAIPEI_TZ)
+    next_run = now.replace(hour=15, minute=0, second=0, microsecond=0)
+    if now >= next_run:
+        next_run += timedelta(days=1)
+    sleep_seconds = (next_run - now).total_seconds()
+    print(f"下次維修排程將在 {sleep_seconds:.0f} 秒後執行...")
+    await sleep_while_holding_lock(lock_conn, sleep_seconds)
 
 
 async def daily_repair_scheduling(db, client):
@@ -211,5 +214,7 @@ async def daily_repair_scheduling(db, client):
             except Exception as e:
                 print(f"處理訂單 {order_record['id']} 發生錯誤: {e}")
         print(f"維修排程完成，成功處理 {success_count}/{len(orders)} 筆訂單")
+        return success_count
     except Exception as e:
         print(f"每日維修排程失敗: {e}")
+        raise
@@ -13,6 +13,8 @@ from services.calendar_service import (
     calculate_service_max_units,
     check_service_slot_bookable,
 )
+from services.lock_expiry_service import notify_hold_deadline
+from utils.tracing import span
 import json
 import uuid
 
@@ -51,34 +53,36 @@ async def create_order_with_lock(order_data: OrderRequest, db):
             )
 
     booking_slots_response = []
-    for i, slot in enumerate(order_data.booking_slots):
-        slot_response = BookingSlotResponse(
-            date=slot.preferred_date,
-            time=slot.preferred_time,
-            contact_name=slot.contact_name,
-            contact_phone=slot.contact_phone,
-            is_primary=i == 0,
-            is_available=True,
-        )
+    with span("validate_booking_slots", slots=len(order_data.booking_slots)):
+        for i, slot in enumerate(order_data.booking_slots):
+            slot_response = BookingSlotResponse(
+                date=slot.preferred_date,
+                time=slot.preferred_time,
+                contact_name=slot.contact_name,
+                contact_phone=slot.contact_phone,
+                is_primary=i == 0,
+                is_available=True,
+            )
 
-        if not await validate_slot_time(
-            service_name, slot.preferred_date, slot.preferred_time, db
-        ):
-            slot_response.is_available = False
+            if not await validate_slot_time(
+                service_name, slot.preferred_date, slot.preferred_time, db
+            ):
+                slot_response.is_available = False
 
-        booking_slots_response.append(slot_response)
+            booking_slots_response.append(slot_response)
 
     available_slots = [slot for slot in booking_slots_response if slot.is_available]
     if not available_slots:
         raise HTTPException(status_code=409, detail="所選時段都無法預約")
 
-    total_amount = await calculate_order_amount(
-        service_name,
-        order_data.location_address,
-        order_data.unit_count,
-        order_data.equipment_details,
-        db,
-    )
+    with span("calculate_order_amount", service_type=service_name):
+        total_amount = await calculate_order_amount(
+            service_name,
+            order_data.location_address,
+            order_data.unit_count,
+            order_data.equipment_details,
+            db,
+        )
 
     order_number = f"AC{datetime.now(TAIPEI_TZ).strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4].upper()}"
     equipment_json = None
@@ -149,6 +153,7 @@ async def create_order_with_lock(order_data: OrderRequest, db):
                 order_data.notes,
             )
             print(f"訂單創建成功，ID: {order_id}")
+            await notify_hold_deadline(db)
 
             lock_expires_at = (
                 datetime.now(TAIPEI_TZ) + timedelta(minutes=30)
@@ -283,6 +288,7 @@ async def calculate_order_amount(
         raise HTTPException(status_code=500, detail="計算金額失敗")
 
 
+# 營運分析的地區統計使用 db/schema.py 的 order_region()，修改規則時需一併更新
 def determine_region(address: str):
     keywords = ["台北", "新北"]
     if any(keyword in address for keyword in keywords):
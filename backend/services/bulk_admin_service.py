@@ -0,0 +1,213 @@
+from fastapi import HTTPException
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from services.mail_service import build_cancellation_confirmation_email
+from services.email_outbox_service import enqueue_emails
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+# 依 id 排序鎖定，與其他批次操作同時執行時不會互相死結
+LOCK_ORDERS_QUERY = """
+    SELECT o.id, o.order_number, o.status, o.payment_status,
+           st.name AS service_type,
+           EXISTS (SELECT 1 FROM order_completions oc WHERE oc.order_id = o.id) AS has_completion
+    FROM orders o
+    JOIN service_types st ON o.service_type_id = st.id
+    WHERE o.id = ANY($1::int[])
+    ORDER BY o.id
+    FOR UPDATE OF o
+"""
+
+# 一次釋放多筆訂單的排程鎖定與暫時鎖定，並回傳各訂單清除的鎖定數
+CLEANUP_LOCKS_QUERY = """
+    WITH order_locks AS (
+        SELECT s.order_id, tsl.id AS lock_id
+        FROM schedules s
+        JOIN time_slot_locks tsl ON tsl.reference_id = s.id
+        WHERE s.order_id = ANY($1::int[])
+        UNION
+        SELECT order_id, temp_lock_id
+        FROM booking_slots
+        WHERE order_id = ANY($1::int[]) AND temp_lock_id IS NOT NULL
+    ),
+    released AS (
+        UPDATE booking_slots
+        SET temp_lock_id = NULL, is_locked = false, lock_expires_at = NULL
+        WHERE order_id = ANY($1::int[]) AND temp_lock_id IS NOT NULL
+    ),
+    deleted AS (
+        DELETE FROM time_slot_locks
+        WHERE id IN (SELECT lock_id FROM order_locks)
+        RETURNING id
+    )
+    SELECT ol.order_id, COUNT(*) AS cleaned_locks
+    FROM order_locks ol
+    JOIN deleted d ON d.id = ol.lock_id
+    GROUP BY ol.order_id
+"""
+
+CANCELLATION_EMAIL_QUERY = """
+    SELECT o.id AS order_id, o.order_number, st.name AS service_type,
+           o.location_address, o.total_amount, u.email AS user_email, u.name AS user_name,
+           bs.preferred_date, bs.preferred_time
+    FROM orders o
+    JOIN service_types st ON o.service_type_id = st.id
+    JOIN users u ON o.user_id = u.id
+    JOIN LATERAL (
+        SELECT preferred_date, preferred_time
+        FROM booking_slots
+        WHERE order_id = o.id
+        ORDER BY is_selected DESC, is_primary DESC, preferred_date, preferred_time
+        LIMIT 1
+    ) bs ON true
+    WHERE o.id = ANY($1::int[])
+"""
+
+
+async def lock_orders(order_ids: list, db):
+    records = await db.fetch(LOCK_ORDERS_QUERY, order_ids)
+    return {record["id"]: record for record in records}
+
+
+def build_bulk_result(order_ids: list, orders: dict, results: dict):
+    items = []
+    for order_id in dict.fromkeys(order_ids):
+        order = orders.get(order_id)
+        item = {
+            "order_id": order_id,
+            "order_number": order["order_number"] if order else None,
+        }
+        item.update(results.get(order_id, {"success": False, "message": "訂單不存在"}))
+        items.append(item)
+    succeeded = sum(1 for item in items if item["success"])
+    return {
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "results": items,
+    }
+
+
+async def bulk_update_refund_status(order_ids: list, refund_user: str, db):
+    try:
+        async with db.transaction():
+            orders = await lock_orders(order_ids, db)
+            results = {}
+            refund_ids = []
+            for order_id, order in orders.items():
+                if order["payment_status"] != "paid":
+                    results[order_id] = {
+                        "success": False,
+                        "message": "無法對未付款訂單進行此操作",
+                    }
+                elif order["status"] in ["completed", "cancelled"]:
+                    results[order_id] = {
+                        "success": False,
+                        "message": f"訂單狀態為 '{order['status']}'，無法退款",
+                    }
+                else:
+                    refund_ids.append(order_id)
+            refund_time = datetime.now(TAIPEI_TZ).strftime("%Y-%m-%d %H:%M")
+            refund_note = f"[退款記錄] 退款人：{refund_user}，退款時間：{refund_time}"
+            if refund_ids:
+                update_query = "UPDATE orders SET payment_status = 'refunded', notes = COALESCE(notes, '') || $2, updated_at = NOW() WHERE id = ANY($1::int[])"
+                await db.execute(update_query, refund_ids, refund_note)
+            for order_id in refund_ids:
+                results[order_id] = {
+                    "success": True,
+                    "message": f"訂單 {orders[order_id]['order_number']} 退款狀態已更新",
+                }
+        result = build_bulk_result(order_ids, orders, results)
+        result["refund_user"] = refund_user
+        result["refund_time"] = refund_time
+        return result
+    except Exception as e:
+        print(f"批次更新退款狀態失敗：{e}")
+        raise HTTPException(status_code=500, detail="批次更新退款狀態失敗")
+
+
+async def bulk_cancel_orders(order_ids: list, db):
+    try:
+        async with db.transaction():
+            orders = await lock_orders(order_ids, db)
+            results = {}
+            cancel_ids = []
+            cleanup_ids = []
+            for order_id, order in orders.items():
+                if order["status"] in ["completed", "cancelled"]:
+                    message = f"訂單狀態為 '{order['status']}'，無法取消"
+                elif order["payment_status"] == "unpaid":
+                    message = "未付款訂單會自動清理，無需手動取消"
+                elif order["payment_status"] != "refunded":
+                    message = "請先執行退款程序"
+                else:
+                    cancel_ids.append(order_id)
+                    # 尚未排程的維修訂單沒有鎖定與人力紀錄
+                    if not (
+                        order["service_type"] == "REPAIR"
+                        and order["status"] == "pending_schedule"
+                    ):
+                        cleanup_ids.append(order_id)
+                    continue
+                results[order_id] = {"success": False, "message": message}
+            cleaned_locks = {}
+            if cleanup_ids:
+                records = await db.fetch(CLEANUP_LOCKS_QUERY, cleanup_ids)
+                cleaned_locks = {
+                    record["order_id"]: record["cleaned_locks"] for record in records
+                }
+                delete_query = "DELETE FROM daily_workforce_usage WHERE schedule_id IN (SELECT id FROM schedules WHERE order_id = ANY($1::int[]))"
+                await db.execute(delete_query, cleanup_ids)
+                delete_query = "DELETE FROM schedules WHERE order_id = ANY($1::int[])"
+                await db.execute(delete_query, cleanup_ids)
+            emails = []
+            if cancel_ids:
+                update_query = "UPDATE orders SET status = 'cancelled', updated_at = NOW() WHERE id = ANY($1::int[])"
+                await db.execute(update_query, cancel_ids)
+                records = await db.fetch(CANCELLATION_EMAIL_QUERY, cancel_ids)
+                emails = [
+                    (
+                        record["order_id"],
+                        build_cancellation_confirmation_email(dict(record)),
+                    )
+                    for record in records
+                ]
+                await enqueue_emails(db, "cancellation_confirmation", emails)
+            queued_ids = {order_id for order_id, _ in emails}
+            for order_id in cancel_ids:
+                results[order_id] = {
+                    "success": True,
+                    "message": f"訂單 {orders[order_id]['order_number']} 已成功取消",
+                    "cleaned_locks": cleaned_locks.get(order_id, 0),
+                    "email_queued": order_id in queued_ids,
+                }
+        result = build_bulk_result(order_ids, orders, results)
+        result["emails_queued"] = len(emails)
+        return result
+    except Exception as e:
+        print(f"批次取消訂單失敗：{e}")
+        raise HTTPException(status_code=500, detail="批次取消訂單失敗")
+
+
+async def bulk_update_completion_status(order_ids: list, db):
+    try:
+        async with db.transaction():
+            orders = await lock_orders(order_ids, db)
+            results = {}
+            complete_ids = []
+            for order_id, order in orders.items():
+                if not order["has_completion"]:
+                    results[order_id] = {"success": False, "message": "請上傳驗收報告"}
+                else:
+                    complete_ids.append(order_id)
+            if complete_ids:
+                update_query = "UPDATE orders SET status = 'completed', updated_at = NOW() WHERE id = ANY($1::int[])"
+                await db.execute(update_query, complete_ids)
+            for order_id in complete_ids:
+                results[order_id] = {
+                    "success": True,
+                    "message": f"訂單 {orders[order_id]['order_number']} 已完工",
+                }
+        return build_bulk_result(order_ids, orders, results)
+    except Exception as e:
+        print(f"批次更新完工狀態失敗：{e}")
+        raise HTTPException(status_code=500, detail="批次更新完工狀態失敗")
@@ -0,0 +1,101 @@
+from fastapi import HTTPException
+from cachetools import TTLCache
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import asyncio
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+DASHBOARD_BUCKETS = [
+    "awaiting_schedule",
+    "within_7_days",
+    "within_14_days",
+    "beyond_14_days",
+    "cancel_requested",
+]
+DASHBOARD_CARDS_PER_BUCKET = 50
+# 訂單狀態變更時由 NOTIFY 清除；TTL 僅作為漏接通知時的保險
+DASHBOARD_CACHE_TTL_SECONDS = 300
+
+dashboard_cache = TTLCache(maxsize=16, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+_dashboard_generation = 0
+_dashboard_lock = asyncio.Lock()
+
+# 以主要時段的日期分組，一次查詢取得各分組的總數與依日期排序的前 N 張卡片
+DASHBOARD_QUERY = """
+    WITH cards AS (
+        SELECT o.id AS order_id, o.order_number, st.name AS service_type,
+               o.status, o.payment_status, s.preferred_date, s.preferred_time,
+               CASE
+                   WHEN o.status IN ('pending_schedule', 'scheduling_failed')
+                        AND o.payment_status = 'paid' THEN 'awaiting_schedule'
+                   WHEN o.status = 'scheduled' AND s.preferred_date <= $1::date + 7 THEN 'within_7_days'
+                   WHEN o.status = 'scheduled' AND s.preferred_date <= $1::date + 14 THEN 'within_14_days'
+                   WHEN o.status = 'scheduled' THEN 'beyond_14_days'
+                   WHEN o.status = 'precancel' THEN 'cancel_requested'
+               END AS bucket
+        FROM orders o
+        JOIN service_types st ON o.service_type_id = st.id
+        JOIN LATERAL (
+            SELECT preferred_date, preferred_time
+            FROM booking_slots
+            WHERE order_id = o.id
+            ORDER BY is_primary DESC, preferred_date, preferred_time
+            LIMIT 1
+        ) s ON true
+        WHERE o.status IN ('pending_schedule', 'scheduling_failed', 'scheduled', 'precancel')
+    ),
+    ranked AS (
+        SELECT *,
+               COUNT(*) OVER (PARTITION BY bucket) AS bucket_count,
+               ROW_NUMBER() OVER (
+                   PARTITION BY bucket ORDER BY preferred_date, preferred_time, order_id
+               ) AS position
+        FROM cards
+        WHERE bucket IS NOT NULL
+    )
+    SELECT * FROM ranked WHERE position <= $2 ORDER BY bucket, position
+"""
+
+
+def invalidate_dashboard():
+    global _dashboard_generation
+    _dashboard_generation += 1
+    dashboard_cache.clear()
+
+
+async def get_dashboard_service(pool):
+    today = datetime.now(TAIPEI_TZ).date()
+    dashboard = dashboard_cache.get(today)
+    if dashboard is not None:
+        return dashboard
+    # 快取失效後同時進來的請求只查詢一次
+    async with _dashboard_lock:
+        dashboard = dashboard_cache.get(today)
+        if dashboard is not None:
+            return dashboard
+        generation = _dashboard_generation
+        try:
+            async with pool.acquire() as db:
+                records = await db.fetch(
+                    DASHBOARD_QUERY, today, DASHBOARD_CARDS_PER_BUCKET
+                )
+        except Exception as e:
+            print(f"取得管理後台看板失敗：{e}")
+            raise HTTPException(status_code=500, detail="取得管理後台看板失敗")
+        buckets = {bucket: {"count": 0, "cards": []} for bucket in DASHBOARD_BUCKETS}
+        for record in records:
+            card = dict(record)
+            bucket = buckets[card.pop("bucket")]
+            bucket["count"] = card.pop("bucket_count")
+            card.pop("position")
+            bucket["cards"].append(card)
+        dashboard = {
+            "date": today,
+            "cards_per_bucket": DASHBOARD_CARDS_PER_BUCKET,
+            "buckets": buckets,
+        }
+        # 查詢期間若有訂單狀態變更，不寫入可能已過期的結果
+        if generation == _dashboard_generation:
+            dashboard_cache[today] = dashboard
+        return dashboard
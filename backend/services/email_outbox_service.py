@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from services.mail_service import send_email_batch
+from utils.metrics import track_external_call, background_job_seconds
+from utils.tracing import start_trace
+
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", 2))
+EMAIL_OUTBOX_BATCH_SIZE = min(int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 50)), 100)
+EMAIL_OUTBOX_POLL_SECONDS = 2
+EMAIL_SEND_TIMEOUT_SECONDS = 30
+EMAIL_MAX_ATTEMPTS = 6
+# 第 n 次失敗後等待 30 * 2^(n-1) 秒再重試，最長一小時
+EMAIL_RETRY_BASE_SECONDS = 30
+EMAIL_RETRY_MAX_SECONDS = 3600
+# 寄送中的郵件若超過此時間未回報結果（例如 worker 中斷或呼叫逾時），會被重新取出；
+# 需大於 EMAIL_SEND_TIMEOUT_SECONDS，逾時後仍在執行的寄送執行緒結束前不會被重新取出
+EMAIL_CLAIM_TIMEOUT_SECONDS = 300
+# Resend 以 400、422 拒絕（例如收件者格式錯誤）時重試也不會成功；
+# 429、5xx 與連線錯誤為暫時性錯誤，401、403 通常是設定問題，修正後重試即可
+EMAIL_NON_RETRYABLE_STATUS = {400, 422}
+
+
+async def enqueue_email(db, email_type: str, params: dict, order_id: int = None):
+    insert_query = "INSERT INTO email_outbox (order_id, email_type, payload) VALUES ($1, $2, $3::jsonb) RETURNING id"
+    return await db.fetchval(insert_query, order_id, email_type, json.dumps(params))
+
+
+async def enqueue_emails(db, email_type: str, emails: list):
+    # emails 為 (order_id, params) 的列表，以單一 INSERT 寫入
+    if not emails:
+        return 0
+    insert_query = """
+        INSERT INTO email_outbox (order_id, email_type, payload)
+        SELECT e.order_id, $1, e.payload::jsonb
+        FROM unnest($2::int[], $3::text[]) AS e(order_id, payload)
+    """
+    await db.execute(
+        insert_query,
+        email_type,
+        [order_id for order_id, _ in emails],
+        [json.dumps(params) for _, params in emails],
+    )
+    return len(emails)
+
+
+# 每批郵件第一次取出時寫入 batch_key，之後的重試都以同一個 batch_key 取回完全相同的郵件，
+# 並作為 Resend 的 idempotency key：即使前一次呼叫逾時後其實已送達，重試也不會重複寄出。
+# 重試時先選出批次，再以 batch_key 的 advisory lock 認領整批：多個 worker 不會各自鎖定
+# 同一批次的不同列而互相等待，也不會重複寄送同一批次
+EMAIL_BATCH_LOCK_CLASS = 7310
+
+PICK_RETRY_BATCH_QUERY = """
+    SELECT batch_key FROM email_outbox
+    WHERE batch_key IS NOT NULL
+      AND ((status = 'pending' AND next_attempt_at <= NOW())
+           OR (status = 'sending' AND locked_until < NOW()))
+    ORDER BY id
+    LIMIT 1
+"""
+
+CLAIM_RETRY_BATCH_QUERY = """
+    UPDATE email_outbox
+    SET status = 'sending',
+        attempts = attempts + 1,
+        locked_until = NOW() + make_interval(secs => $2)
+    WHERE batch_key = $1
+      AND ((status = 'pending' AND next_attempt_at <= NOW())
+           OR (status = 'sending' AND locked_until < NOW()))
+    RETURNING id, payload, attempts, batch_key
+"""
+
+CLAIM_NEW_BATCH_QUERY = """
+    UPDATE email_outbox
+    SET status = 'sending',
+        attempts = attempts + 1,
+        locked_until = NOW() + make_interval(secs => $2),
+        batch_key = $3
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE batch_key IS NULL
+          AND ((status = 'pending' AND next_attempt_at <= NOW())
+               OR (status = 'sending' AND locked_until < NOW()))
+        ORDER BY id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, payload, attempts, batch_key
+"""
+
+
+async def claim_email_batch(db, batch_size: int):
+    # 先重試到期的既有批次，再取出新郵件組成新批次；
+    # 其他 worker 正在認領同一批次時不等待，直接改取新郵件
+    records = []
+    async with db.transaction():
+        batch_key = await db.fetchval(PICK_RETRY_BATCH_QUERY)
+        if batch_key and await db.fetchval(
+            "SELECT pg_try_advisory_xact_lock($1, hashtext($2))",
+            EMAIL_BATCH_LOCK_CLASS,
+            batch_key,
+        ):
+            # 取得鎖之前其他 worker 可能已認領並提交，UPDATE 會重新檢查是否到期
+            records = await db.fetch(
+                CLAIM_RETRY_BATCH_QUERY, batch_key, EMAIL_CLAIM_TIMEOUT_SECONDS
+            )
+    if not records:
+        records = await db.fetch(
+            CLAIM_NEW_BATCH_QUERY,
+            batch_size,
+            EMAIL_CLAIM_TIMEOUT_SECONDS,
+            uuid.uuid4().hex,
+        )
+    return sorted(records, key=lambda record: record["id"])
+
+
+async def mark_emails_sent(db, email_ids: list, provider_ids: list):
+    update_query = """
+        UPDATE email_outbox o
+        SET status = 'sent', sent_at = NOW(), locked_until = NULL,
+            provider_message_id = s.provider_id, last_error = NULL
+        FROM unnest($1::bigint[], $2::text[]) AS s(id, provider_id)
+        WHERE o.id = s.id
+    """
+    await db.execute(update_query, email_ids, provider_ids)
+
+
+async def mark_emails_failed(db, email_ids: list, error: str):
+    update_query = """
+        UPDATE email_outbox
+        SET status = CASE WHEN attempts >= $3 THEN 'dead' ELSE 'pending' END,
+            next_attempt_at = NOW() + make_interval(
+                secs => LEAST($4 * power(2, attempts - 1), $5)
+            ),
+            locked_until = NULL,
+            last_error = $2
+        WHERE id = ANY($1::bigint[])
+        RETURNING id, status
+    """
+    records = await db.fetch(
+        update_query,
+        email_ids,
+        error,
+        EMAIL_MAX_ATTEMPTS,
+        EMAIL_RETRY_BASE_SECONDS,
+        EMAIL_RETRY_MAX_SECONDS,
+    )
+    dead_ids = [record["id"] for record in records if record["status"] == "dead"]
+    if dead_ids:
+        print(f"郵件重試次數已達上限，移至 dead letter: {dead_ids}")
+
+
+async def mark_emails_dead(db, email_ids: list, error: str):
+    update_query = """
+        UPDATE email_outbox
+        SET status = 'dead', locked_until = NULL, last_error = $2
+        WHERE id = ANY($1::bigint[])
+    """
+    await db.execute(update_query, email_ids, error)
+    print(f"郵件被 Resend 拒絕且無法重試，移至 dead letter: {email_ids}")
+
+
+async def mark_emails_timed_out(db, email_ids: list, error: str):
+    # 逾時的批次維持 sending 狀態，待 locked_until 到期後以相同的 batch_key 重試；
+    # 已達重試上限者與一般失敗相同移至 dead letter
+    update_query = """
+        UPDATE email_outbox
+        SET status = CASE WHEN attempts >= $3 THEN 'dead' ELSE status END,
+            locked_until = CASE WHEN attempts >= $3 THEN NULL ELSE locked_until END,
+            last_error = $2
+        WHERE id = ANY($1::bigint[])
+        RETURNING id, status
+    """
+    records = await db.fetch(update_query, email_ids, error, EMAIL_MAX_ATTEMPTS)
+    dead_ids = [record["id"] for record in records if record["status"] == "dead"]
+    if dead_ids:
+        print(f"郵件重試次數已達上限，移至 dead letter: {dead_ids}")
+
+
+async def split_email_batch(db, email_ids: list):
+    # 批次中只要一封無效，Resend 就會拒絕整批；改為每封各自的 batch_key，
+    # 逐封寄送時使用新的 idempotency key，中斷後也會以單封批次重試
+    update_query = """
+        UPDATE email_outbox
+        SET batch_key = batch_key || ':' || id
+        WHERE id = ANY($1::bigint[])
+        RETURNING id, batch_key
+    """
+    records = await db.fetch(update_query, email_ids)
+    return {record["id"]: record["batch_key"] for record in records}
+
+
+def is_retryable_error(error: Exception):
+    try:
+        status = int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return True
+    return status not in EMAIL_NON_RETRYABLE_STATUS
+
+
+async def send_claimed_emails(db, email_ids: list, params_list: list, idempotency_key: str):
+    try:
+        with track_external_call("resend", "batch_send"):
+            provider_ids = await asyncio.wait_for(
+                asyncio.to_thread(send_email_batch, params_list, idempotency_key),
+                timeout=EMAIL_SEND_TIMEOUT_SECONDS,
+            )
+    except asyncio.TimeoutError:
+        # wait_for 只取消等待，寄送執行緒仍可能完成送達，由 Resend 依 idempotency key 去除重複
+        print(f"批次寄送 {len(email_ids)} 封郵件逾時，{EMAIL_CLAIM_TIMEOUT_SECONDS} 秒後重試")
+        async with db.acquire() as conn:
+            await mark_emails_timed_out(conn, email_ids, "寄送逾時")
+        return 0
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        print(f"批次寄送 {len(email_ids)} 封郵件失敗: {error}")
+        if is_retryable_error(e):
+            async with db.acquire() as conn:
+                await mark_emails_failed(conn, email_ids, error)
+            return 0
+        if len(email_ids) == 1:
+            async with db.acquire() as conn:
+                await mark_emails_dead(conn, email_ids, error)
+            return 0
+        async with db.acquire() as conn:
+            keys = await split_email_batch(conn, email_ids)
+        sent = 0
+        for email_id, params in zip(email_ids, params_list):
+            sent += await send_claimed_emails(db, [email_id], [params], keys[email_id])
+        return sent
+    async with db.acquire() as conn:
+        await mark_emails_sent(conn, email_ids, provider_ids)
+    return len(email_ids)
+
+
+async def deliver_email_batch(db):
+    async with db.acquire() as conn:
+        records = await claim_email_batch(conn, EMAIL_OUTBOX_BATCH_SIZE)
+    if not records:
+        return 0
+    email_ids = [record["id"] for record in records]
+    params_list = [json.loads(record["payload"]) for record in records]
+    sent = await send_claimed_emails(db, email_ids, params_list, records[0]["batch_key"])
+    if sent:
+        print(f"已批次寄送 {sent} 封郵件")
+    return sent
+
+
+async def email_outbox_worker(db, worker_index: int):
+    while True:
+        try:
+            started = time.perf_counter()
+            with start_trace("email_outbox", "job") as trace:
+                sent = await deliver_email_batch(db)
+                # 沒有待寄郵件的輪詢不保留 trace
+                if not sent:
+                    trace.discard()
+                trace.attributes["sent"] = sent
+            if sent:
+                background_job_seconds.labels("email_outbox", "success").observe(
+                    time.perf_counter() - started
+                )
+            if sent < EMAIL_OUTBOX_BATCH_SIZE:
+                await asyncio.sleep(EMAIL_OUTBOX_POLL_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"郵件寄送 worker {worker_index} 發生錯誤: {e}")
+            await asyncio.sleep(EMAIL_OUTBOX_POLL_SECONDS)
+
+
+async def email_outbox_loop(db):
+    try:
+        await asyncio.gather(
+            *(email_outbox_worker(db, i) for i in range(EMAIL_OUTBOX_WORKERS))
+        )
+    except asyncio.CancelledError:
+        print("郵件寄送服務已成功停止")
+        raise
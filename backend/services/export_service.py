@@ -0,0 +1,207 @@
+from fastapi import HTTPException
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+import asyncio
+import csv
+import io
+import os
+import uuid
+from services.admin_service import s3_client, S3_BUCKET_NAME
+from utils.metrics import track_external_call
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+# 每次自伺服器端游標取回的筆數，也是 CSV 寫出與 Parquet row group 的大小
+EXPORT_BATCH_ROWS = 1000
+
+# 每筆訂單一列：付款資訊、最終選定（否則主要）的預約時段、排程與完工報告；
+# 所有預約時段（含備選時段與各自的聯絡人）另併為 booking_slots 欄，金額不因多個時段而重複
+EXPORT_ORDERS_QUERY = """
+    SELECT o.order_number, o.created_at, st.name AS service_type, o.status,
+           o.payment_status, o.total_amount, o.checkout_session_id,
+           u.name AS user_name, u.email AS user_email,
+           o.location_address, o.unit_count,
+           bs.preferred_date, bs.preferred_time, bs.contact_name, bs.contact_phone,
+           slots.booking_slot_count, slots.booking_slots,
+           s.scheduled_date, s.scheduled_time, s.estimated_end_time, s.assigned_workers,
+           oc.completion_file_url
+    FROM orders o
+    JOIN service_types st ON o.service_type_id = st.id
+    JOIN users u ON o.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT preferred_date, preferred_time, contact_name, contact_phone
+        FROM booking_slots
+        WHERE order_id = o.id
+        ORDER BY is_selected DESC, is_primary DESC, preferred_date, preferred_time
+        LIMIT 1
+    ) bs ON true
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS booking_slot_count,
+               string_agg(
+                   concat_ws(
+                       ' ', to_char(preferred_date, 'YYYY-MM-DD'),
+                       to_char(preferred_time, 'HH24:MI'), contact_name, contact_phone,
+                       CASE WHEN is_selected THEN '(已選定)' WHEN is_primary THEN '(主要)' END
+                   ),
+                   '; ' ORDER BY preferred_date, preferred_time
+               ) AS booking_slots
+        FROM booking_slots
+        WHERE order_id = o.id
+    ) slots ON true
+    LEFT JOIN LATERAL (
+        SELECT scheduled_date, scheduled_time, estimated_end_time, assigned_workers
+        FROM schedules
+        WHERE order_id = o.id
+        ORDER BY id DESC
+        LIMIT 1
+    ) s ON true
+    LEFT JOIN order_completions oc ON oc.order_id = o.id
+    WHERE o.created_at >= $1 AND o.created_at < $2
+    ORDER BY o.created_at, o.id
+"""
+
+EXPORT_COLUMNS = [
+    "order_number",
+    "created_at",
+    "service_type",
+    "status",
+    "payment_status",
+    "total_amount",
+    "checkout_session_id",
+    "user_name",
+    "user_email",
+    "location_address",
+    "unit_count",
+    "preferred_date",
+    "preferred_time",
+    "contact_name",
+    "contact_phone",
+    "booking_slot_count",
+    "booking_slots",
+    "scheduled_date",
+    "scheduled_time",
+    "estimated_end_time",
+    "assigned_workers",
+    "completion_file_url",
+]
+
+
+def get_export_window(date_from: date, date_to: date):
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="開始日期不能晚於結束日期")
+    start = datetime.combine(date_from, time.min, TAIPEI_TZ)
+    end = datetime.combine(date_to + timedelta(days=1), time.min, TAIPEI_TZ)
+    return start, end
+
+
+async def stream_orders_csv(pool, start: datetime, end: datetime):
+    # 以伺服器端游標逐批讀取並寫出，記憶體用量與匯出筆數無關
+    async with pool.acquire() as conn:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # 加上 BOM，Excel 開啟時才能正確顯示中文
+            buffer.write("\ufeff")
+            writer.writerow(EXPORT_COLUMNS)
+            rows = 0
+            async for record in conn.cursor(
+                EXPORT_ORDERS_QUERY, start, end, prefetch=EXPORT_BATCH_ROWS
+            ):
+                writer.writerow(record.values())
+                rows += 1
+                if rows % EXPORT_BATCH_ROWS == 0:
+                    yield buffer.getvalue().encode("utf-8")
+                    buffer.seek(0)
+                    buffer.truncate(0)
+            yield buffer.getvalue().encode("utf-8")
+    print(f"訂單匯出完成，共 {rows} 筆")
+
+
+def build_parquet_schema():
+    return pa.schema(
+        [
+            ("order_number", pa.string()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("service_type", pa.string()),
+            ("status", pa.string()),
+            ("payment_status", pa.string()),
+            ("total_amount", pa.int32()),
+            ("checkout_session_id", pa.string()),
+            ("user_name", pa.string()),
+            ("user_email", pa.string()),
+            ("location_address", pa.string()),
+            ("unit_count", pa.int32()),
+            ("preferred_date", pa.date32()),
+            ("preferred_time", pa.time64("us")),
+            ("contact_name", pa.string()),
+            ("contact_phone", pa.string()),
+            ("booking_slot_count", pa.int32()),
+            ("booking_slots", pa.string()),
+            ("scheduled_date", pa.date32()),
+            ("scheduled_time", pa.time64("us")),
+            ("estimated_end_time", pa.time64("us")),
+            ("assigned_workers", pa.int32()),
+            ("completion_file_url", pa.string()),
+        ]
+    )
+
+
+async def export_orders_parquet(
+    pool, date_from: date, date_to: date, destination: str
+):
+    if pq is None:
+        raise HTTPException(status_code=501, detail="伺服器未安裝 pyarrow，無法匯出 Parquet")
+    start, end = get_export_window(date_from, date_to)
+    file_name = f"orders_{date_from}_{date_to}_{uuid.uuid4().hex[:8]}.parquet"
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    file_path = os.path.join(EXPORT_DIR, file_name)
+    schema = build_parquet_schema()
+    writer = pq.ParquetWriter(file_path, schema)
+    rows = 0
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                cursor = await conn.cursor(EXPORT_ORDERS_QUERY, start, end)
+                while True:
+                    records = await cursor.fetch(EXPORT_BATCH_ROWS)
+                    if not records:
+                        break
+                    # 每批寫成一個 row group，寫檔期間不阻塞事件迴圈
+                    table = pa.Table.from_pylist(
+                        [dict(record) for record in records], schema=schema
+                    )
+                    await asyncio.to_thread(writer.write_table, table)
+                    rows += len(records)
+    except Exception as e:
+        print(f"匯出 Parquet 失敗：{e}")
+        writer.close()
+        os.remove(file_path)
+        raise HTTPException(status_code=500, detail="匯出 Parquet 失敗")
+    await asyncio.to_thread(writer.close)
+    print(f"訂單 Parquet 匯出完成，共 {rows} 筆：{file_path}")
+    if destination != "s3":
+        return {"rows": rows, "file_path": file_path}
+    object_key = f"exports/{file_name}"
+    try:
+        with track_external_call("s3", "upload_file"):
+            await asyncio.to_thread(
+                s3_client.upload_file, file_path, S3_BUCKET_NAME, object_key
+            )
+    except Exception as e:
+        print(f"上傳匯出檔至 S3 失敗：{e}")
+        raise HTTPException(status_code=500, detail="上傳匯出檔至 S3 失敗")
+    os.remove(file_path)
+    download_url = s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": S3_BUCKET_NAME, "Key": object_key},
+        ExpiresIn=3600,
+    )
+    return {"rows": rows, "object_key": object_key, "download_url": download_url}
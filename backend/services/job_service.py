@@ -0,0 +1,111 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from db.database import create_dedicated_connection
+from utils.metrics import background_job_seconds
+from utils.tracing import start_trace
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# 每個背景工作對應一把 PostgreSQL advisory lock，取得者即為該工作的 leader
+JOB_LOCK_KEYS = {
+    "cleanup": 7301,
+    "repair_scheduling": 7302,
+    "payment_reconciliation": 7303,
+}
+
+LEADER_RETRY_SECONDS = 30
+HEARTBEAT_SECONDS = 30
+
+
+async def run_as_leader(db, job_name: str, run_once, wait_for_next_run):
+    lock_key = JOB_LOCK_KEYS[job_name]
+    while True:
+        lock_conn = None
+        try:
+            lock_conn = await create_dedicated_connection()
+            is_leader = await lock_conn.fetchval(
+                "SELECT pg_try_advisory_lock($1)", lock_key
+            )
+            if not is_leader:
+                await lock_conn.close()
+                lock_conn = None
+                await asyncio.sleep(LEADER_RETRY_SECONDS)
+                continue
+            print(f"[{INSTANCE_ID}] 取得背景工作 {job_name} 的執行權")
+            last_run_at = None
+            while True:
+                await wait_for_next_run(lock_conn, last_run_at)
+                last_run_at = datetime.now(TAIPEI_TZ)
+                await record_job_run(db, job_name, run_once)
+        except asyncio.CancelledError:
+            print(f"背景工作 {job_name} 已成功停止")
+            raise
+        except Exception as e:
+            # 連線中斷時 advisory lock 會由資料庫自動釋放，交由其他實例接手
+            print(f"背景工作 {job_name} 失去執行權或發生錯誤: {e}")
+            await asyncio.sleep(LEADER_RETRY_SECONDS)
+        finally:
+            if lock_conn is not None and not lock_conn.is_closed():
+                try:
+                    await lock_conn.close()
+                except Exception as e:
+                    print(f"關閉背景工作 {job_name} 的鎖定連線失敗: {e}")
+
+
+async def sleep_while_holding_lock(lock_conn, seconds: float):
+    remaining = max(0, seconds)
+    while remaining > 0:
+        step = min(remaining, HEARTBEAT_SECONDS)
+        await asyncio.sleep(step)
+        remaining -= step
+        await heartbeat(lock_conn)
+
+
+async def heartbeat(lock_conn):
+    # 確認鎖定連線仍存活，避免連線已斷、鎖已被他人取得時仍繼續執行
+    await lock_conn.fetchval("SELECT 1")
+
+
+async def record_job_run(db, job_name: str, run_once):
+    started_at = datetime.now(TAIPEI_TZ)
+    started = time.perf_counter()
+    rows_affected = 0
+    status = "success"
+    error = None
+    with start_trace(job_name, "job") as trace:
+        try:
+            async with db.acquire() as conn:
+                rows_affected = await run_once(conn) or 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = "failed"
+            error = str(e)
+            trace.error = type(e).__name__
+            print(f"背景工作 {job_name} 執行失敗: {e}")
+        trace.attributes["rows_affected"] = rows_affected
+    duration = time.perf_counter() - started
+    background_job_seconds.labels(job_name, status).observe(duration)
+    duration_ms = int(duration * 1000)
+    try:
+        async with db.acquire() as conn:
+            insert_query = "INSERT INTO background_job_runs (job_name, instance_id, started_at, duration_ms, rows_affected, status, error) VALUES ($1, $2, $3, $4, $5, $6, $7)"
+            await conn.execute(
+                insert_query,
+                job_name,
+                INSTANCE_ID,
+                started_at,
+                duration_ms,
+                rows_affected,
+                status,
+                error,
+            )
+    except Exception as e:
+        print(f"記錄背景工作 {job_name} 執行紀錄失敗: {e}")
+    return rows_affected
@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import time
+
+# 新訂單建立時透過 NOTIFY 廣播暫時鎖定的到期時間（epoch 秒），由清理工作的 leader 接收
+LOCK_DEADLINE_CHANNEL = "slot_lock_deadlines"
+HOLD_MINUTES = 30
+# 到期後多等幾秒再清理，吸收應用程式與資料庫之間的時鐘誤差
+EXPIRY_GRACE_SECONDS = 5
+# 即使沒有任何到期時間，也至少間隔這麼久做一次完整清理，補上遺漏的通知
+MAX_IDLE_SECONDS = 1800
+
+
+class LockExpiryScheduler:
+    def __init__(self):
+        self._deadlines = []
+        self._known = set()
+        self._changed = asyncio.Event()
+
+    def add_deadline(self, deadline: float):
+        deadline = float(int(deadline) + 1)
+        if deadline in self._known:
+            return
+        self._known.add(deadline)
+        heapq.heappush(self._deadlines, deadline)
+        if self._deadlines[0] == deadline:
+            self._changed.set()
+
+    def clear(self):
+        self._deadlines.clear()
+        self._known.clear()
+
+    def _pop_due(self, now: float):
+        due = False
+        while self._deadlines and self._deadlines[0] + EXPIRY_GRACE_SECONDS <= now:
+            self._known.discard(heapq.heappop(self._deadlines))
+            due = True
+        return due
+
+    async def seed(self, db):
+        select_query = """
+            SELECT EXTRACT(EPOCH FROM expires_at)::float8 AS deadline
+            FROM time_slot_locks
+            WHERE lock_type = 'booking' AND expires_at > NOW()
+            UNION
+            SELECT EXTRACT(EPOCH FROM created_at + INTERVAL '30 minutes')::float8
+            FROM orders
+            WHERE status = 'pending' AND payment_status = 'unpaid'
+              AND created_at > NOW() - INTERVAL '30 minutes'
+        """
+        records = await db.fetch(select_query)
+        self.clear()
+        for record in records:
+            self.add_deadline(record["deadline"])
+        print(f"已載入 {len(self._deadlines)} 個暫時鎖定到期時間")
+
+    async def listen(self, conn):
+        await conn.add_listener(LOCK_DEADLINE_CHANNEL, self._on_notification)
+
+    def _on_notification(self, conn, pid, channel, payload):
+        try:
+            self.add_deadline(float(payload))
+        except ValueError:
+            print(f"無法解析鎖定到期通知: {payload}")
+
+    async def wait_for_next_deadline(self, heartbeat, heartbeat_seconds: float):
+        idle_until = time.time() + MAX_IDLE_SECONDS
+        while True:
+            now = time.time()
+            if self._pop_due(now) or now >= idle_until:
+                return
+            wake_at = idle_until
+            if self._deadlines:
+                wake_at = min(wake_at, self._deadlines[0] + EXPIRY_GRACE_SECONDS)
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait(),
+                    timeout=min(max(wake_at - now, 0), heartbeat_seconds),
+                )
+            except asyncio.TimeoutError:
+                await heartbeat()
+
+
+lock_expiry_scheduler = LockExpiryScheduler()
+
+
+async def notify_hold_deadline(db):
+    # 與訂單建立在同一交易內執行，交易提交後才會送出通知
+    notify_query = "SELECT pg_notify($1, EXTRACT(EPOCH FROM NOW() + make_interval(mins => $2))::text)"
+    await db.execute(notify_query, LOCK_DEADLINE_CHANNEL, HOLD_MINUTES)
@@ -6,43 +6,44 @@ from dotenv import load_dotenv
 
 load_dotenv()
 resend.api_key = os.getenv("RESEND_API_KEY")
+# 測試時可改連本地的假 Resend 伺服器（benchmarks/fake_resend.py）
+resend.api_url = os.getenv("RESEND_API_URL", "https://api.resend.com")
 
 
-def send_scheduling_success_email(order_data: dict):
-    try:
-        scheduled_date = order_data["scheduled_date"].strftime("%Y年%m月%d日")
-        scheduled_time = order_data["scheduled_time"].strftime("%H:%M")
-        estimated_end_time = order_data["estimated_end_time"].strftime("%H:%M")
+def build_scheduling_success_email(order_data: dict):
+    scheduled_date = order_data["scheduled_date"].strftime("%Y年%m月%d日")
+    scheduled_time = order_data["scheduled_time"].strftime("%H:%M")
+    estimated_end_time = order_data["estimated_end_time"].strftime("%H:%M")
 
-        start_datetime = datetime.combine(
-            order_data["scheduled_date"], order_data["scheduled_time"]
-        )
-        end_datetime = datetime.combine(
-            order_data["scheduled_date"], order_data["estimated_end_time"]
-        )
+    start_datetime = datetime.combine(
+        order_data["scheduled_date"], order_data["scheduled_time"]
+    )
+    end_datetime = datetime.combine(
+        order_data["scheduled_date"], order_data["estimated_end_time"]
+    )
 
-        start_str = start_datetime.strftime("%Y%m%dT%H%M%S")
-        end_str = end_datetime.strftime("%Y%m%dT%H%M%S")
+    start_str = start_datetime.strftime("%Y%m%dT%H%M%S")
+    end_str = end_datetime.strftime("%Y%m%dT%H%M%S")
 
-        service_type_map = {
-            "INSTALLATION": "新機安裝",
-            "MAINTENANCE": "冷氣保養",
-            "REPAIR": "冷氣維修",
-        }
-        service_type = service_type_map.get(
-            order_data["service_type"], order_data["service_type"]
-        )
+    service_type_map = {
+        "INSTALLATION": "新機安裝",
+        "MAINTENANCE": "冷氣保養",
+        "REPAIR": "冷氣維修",
+    }
+    service_type = service_type_map.get(
+        order_data["service_type"], order_data["service_type"]
+    )
 
-        event_title = f"Cool Slate - {service_type}服務"
-        event_details = f"""
+    event_title = f"Cool Slate - {service_type}服務"
+    event_details = f"""
 訂單編號：{order_data["order_number"]}
 服務類型：{service_type}
 服務地址：{order_data["location_address"]}
 聯絡人：{order_data.get("contact_name")}
 聯絡電話：{order_data.get("contact_phone")}
         """.strip()
-        calendar_url = f"https://calendar.google.com/calendar/render?action=TEMPLATE&text={quote(event_title)}&dates={start_str}/{end_str}&details={quote(event_details)}&location={quote(order_data['location_address'])}"
-        html_content = f"""
+    calendar_url = f"https://calendar.google.com/calendar/render?action=TEMPLATE&text={quote(event_title)}&dates={start_str}/{end_str}&details={quote(event_details)}&location={quote(order_data['location_address'])}"
+    html_content = f"""
 <div
   style="
     font-family: Arial, sans-serif;
@@ -145,38 +146,26 @@ def send_scheduling_success_email(order_data: dict):
   </div>
 </div>
         """
-        params = {
-            "from": "Cool Slate 冷氣服務預約 <noreply@mail.ayating.lol>",
-            "to": [order_data["user_email"]],
-            "subject": f"【Cool Slate】✅ 排程確認 - {service_type}服務已安排",
-            "html": html_content,
-        }
-        result = resend.Emails.send(params)
-        if result and "id" in result:
-            print(
-                f"排程成功郵件已發送給 {order_data["user_email"]}, 郵件ID: {result["id"]}"
-            )
-            return {"success": True, "email_id": result["id"]}
-        else:
-            print(f"訂單 {order_data["order_id"]}郵件發送失敗")
-            return {"success": False, "error": "無效的回應格式"}
-    except Exception as e:
-        print(f"未知錯誤: {e}")
-        return {"success": False, "error": f"未知錯誤: {e}"}
+    params = {
+        "from": "Cool Slate 冷氣服務預約 <noreply@mail.ayating.lol>",
+        "to": [order_data["user_email"]],
+        "subject": f"【Cool Slate】✅ 排程確認 - {service_type}服務已安排",
+        "html": html_content,
+    }
+    return params
 
 
-def send_cancellation_confirmation_email(order_data: dict):
-    try:
-        service_type_map = {
-            "INSTALLATION": "新機安裝",
-            "MAINTENANCE": "冷氣保養",
-            "REPAIR": "冷氣維修",
-        }
-        service_type = service_type_map.get(
-            order_data["service_type"], order_data["service_type"]
-        )
-        preferred_time = order_data["preferred_time"].strftime("%H:%M")
-        html_content = f"""
+def build_cancellation_confirmation_email(order_data: dict):
+    service_type_map = {
+        "INSTALLATION": "新機安裝",
+        "MAINTENANCE": "冷氣保養",
+        "REPAIR": "冷氣維修",
+    }
+    service_type = service_type_map.get(
+        order_data["service_type"], order_data["service_type"]
+    )
+    preferred_time = order_data["preferred_time"].strftime("%H:%M")
+    html_content = f"""
         <div
   style="
     font-family: Arial, sans-serif;
@@ -281,21 +270,17 @@ def send_cancellation_confirmation_email(order_data: dict):
     </div>
 </div>
     """
-        params = {
-            "from": "Cool Slate 冷氣服務預約 <noreply@mail.ayating.lol>",
-            "to": [order_data["user_email"]],
-            "subject": f"【Cool Slate】✖️ 排程取消 - {service_type}服務已取消",
-            "html": html_content,
-        }
-        result = resend.Emails.send(params)
-        if result and "id" in result:
-            print(
-                f"排程成功郵件已發送給 {order_data["user_email"]}, 郵件ID: {result["id"]}"
-            )
-            return {"success": True, "email_id": result["id"]}
-        else:
-            print(f"訂單 {order_data["order_id"]}郵件發送失敗")
-            return {"success": False, "error": "無效的回應格式"}
-    except Exception as e:
-        print(f"未知錯誤: {e}")
-        return {"success": False, "error": f"未知錯誤: {e}"}
+    params = {
+        "from": "Cool Slate 冷氣服務預約 <noreply@mail.ayating.lol>",
+        "to": [order_data["user_email"]],
+        "subject": f"【Cool Slate】✖️ 排程取消 - {service_type}服務已取消",
+        "html": html_content,
+    }
+    return params
+
+
+def send_email_batch(params_list: list, idempotency_key: str = None):
+    # Resend 批次 API 一次最多 100 封，回傳的 id 與傳入順序相同
+    options = {"idempotency_key": idempotency_key} if idempotency_key else None
+    result = resend.Batch.send(params_list, options)
+    return [item["id"] for item in result["data"]]
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from collections import defaultdict
+from db.database import create_dedicated_connection
+from utils.auth import invalidate_user_claims
+from services.dashboard_service import invalidate_dashboard
+
+# 由 orders 資料表的 trigger 送出，內容包含訂單 id、使用者 id 與最新狀態
+ORDER_STATUS_CHANNEL = "order_status_changes"
+# 由 users 資料表的 trigger 送出，內容為異動的使用者 id
+USER_CHANGES_CHANNEL = "user_changes"
+LISTENER_HEARTBEAT_SECONDS = 30
+LISTENER_RETRY_SECONDS = 5
+
+
+class OrderStatusHub:
+    def __init__(self):
+        self._waiters = defaultdict(set)
+
+    def subscribe(self, order_id: int):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[order_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, order_id: int, waiter):
+        waiters = self._waiters.get(order_id)
+        if waiters is None:
+            return
+        waiters.discard(waiter)
+        if not waiters:
+            del self._waiters[order_id]
+
+    def publish(self, order_id: int, change):
+        for waiter in self._waiters.pop(order_id, ()):
+            if not waiter.done():
+                waiter.set_result(change)
+
+    def wake_all(self):
+        # 監聽連線中斷期間可能漏接通知，讓所有等待者回頭重新查詢
+        for order_id in list(self._waiters):
+            self.publish(order_id, None)
+
+    def _on_notification(self, conn, pid, channel, payload):
+        try:
+            change = json.loads(payload)
+            self.publish(change["order_id"], change)
+        except (ValueError, KeyError) as e:
+            print(f"無法解析訂單狀態通知: {e}")
+
+
+order_status_hub = OrderStatusHub()
+
+
+def on_order_status_change(conn, pid, channel, payload):
+    invalidate_dashboard()
+    order_status_hub._on_notification(conn, pid, channel, payload)
+
+
+def on_user_change(conn, pid, channel, payload):
+    try:
+        invalidate_user_claims(int(payload))
+    except ValueError:
+        print(f"無法解析使用者異動通知: {payload}")
+
+
+def reset_after_missed_notifications():
+    order_status_hub.wake_all()
+    invalidate_user_claims()
+    invalidate_dashboard()
+
+
+async def notification_listener_loop():
+    while True:
+        listen_conn = None
+        try:
+            listen_conn = await create_dedicated_connection()
+            await listen_conn.add_listener(ORDER_STATUS_CHANNEL, on_order_status_change)
+            await listen_conn.add_listener(USER_CHANGES_CHANNEL, on_user_change)
+            reset_after_missed_notifications()
+            while True:
+                await asyncio.sleep(LISTENER_HEARTBEAT_SECONDS)
+                await listen_conn.fetchval("SELECT 1")
+        except asyncio.CancelledError:
+            print("資料異動通知服務已成功停止")
+            raise
+        except Exception as e:
+            print(f"資料異動通知連線中斷，稍後重新連線: {e}")
+            reset_after_missed_notifications()
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+        finally:
+            if listen_conn is not None and not listen_conn.is_closed():
+                try:
+                    await listen_conn.close()
+                except Exception as e:
+                    print(f"關閉資料異動通知連線失敗: {e}")
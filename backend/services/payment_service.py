@@ -1,4 +1,5 @@
 from fastapi import HTTPException
+import asyncio
 import stripe
 import os
 from models.payment_model import (
@@ -7,6 +8,11 @@ from models.payment_model import (
     CheckoutSessionResponse,
 )
 from services.scheduling_service import process_immediate_scheduling
+from services.stripe_service import (
+    retrieve_checkout_session,
+    create_stripe_checkout_session,
+)
+from utils.dependencies import release_connection
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
@@ -18,6 +24,7 @@ load_dotenv()
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+STRIPE_WEBHOOK_CHANNEL = "stripe_webhook_events"
 
 
 async def create_checkout_session(order_id: int, db):
@@ -33,9 +40,11 @@ async def create_checkout_session(order_id: int, db):
             raise HTTPException(status_code=400, detail="訂單狀態錯誤，無法付款")
         if order["payment_status"] == "paid":
             raise HTTPException(status_code=400, detail="訂單已完成付款")
+        # 等待 Stripe 回應期間不佔用連線，寫回 session id 時再重新取得
+        await release_connection(db)
         if order["checkout_session_id"]:
             try:
-                existing_session = stripe.checkout.Session.retrieve(
+                existing_session = await retrieve_checkout_session(
                     order["checkout_session_id"]
                 )
                 if existing_session.status == "open":
@@ -47,7 +56,7 @@ async def create_checkout_session(order_id: int, db):
                             existing_session.expires_at, tz=TAIPEI_TZ
                         ),
                     )
-            except stripe.error.StripeError:
+            except (stripe.error.StripeError, HTTPException):
                 print("查詢舊有 Checkout Session 出現錯誤")
 
         description_parts = [f'訂單編號：{order["order_number"]}']
@@ -68,7 +77,7 @@ async def create_checkout_session(order_id: int, db):
             description_parts.append(f"備註：{order['notes']}")
         description_text = "\n".join(description_parts)
 
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await create_stripe_checkout_session(
             payment_method_types=["card"],
             line_items=[
                 {
@@ -109,6 +118,8 @@ async def create_checkout_session(order_id: int, db):
                 checkout_session.expires_at, tz=TAIPEI_TZ
             ),
         )
+    except HTTPException:
+        raise
     except stripe.error.StripeError as e:
         print(f"Stripe 錯誤: {str(e)}")
         raise HTTPException(status_code=400, detail=f"創建付款頁面失敗: {str(e)}")
@@ -138,6 +149,28 @@ async def get_payment_status(order_id: int, db):
         raise HTTPException(status_code=500, detail="出現預期外錯誤，無法確認")
 
 
+async def wait_for_payment_status_change(
+    current: PaymentStatusResponse, waiter, timeout: float
+):
+    try:
+        change = await asyncio.wait_for(waiter, timeout=timeout)
+    except asyncio.TimeoutError:
+        return current
+    if change is None:
+        return current
+    # updated_at 為 NULL 的訂單通知中也是 null，沿用原本的值
+    updated_at = change.get("updated_at")
+    return current.model_copy(
+        update={
+            "payment_status": PaymentStatus(change["payment_status"]),
+            "order_status": change["status"],
+            "updated_at": (
+                datetime.fromisoformat(updated_at) if updated_at else current.updated_at
+            ),
+        }
+    )
+
+
 async def handle_webhook(payload: bytes, sig_header: str, db):
     try:
         event = stripe.Webhook.construct_event(
@@ -149,42 +182,68 @@ async def handle_webhook(payload: bytes, sig_header: str, db):
     except stripe.error.SignatureVerificationError:
         print("認證失敗")
         raise HTTPException(status_code=400, detail="認證失敗")
+    # 驗證後只寫入收件匣即回應 Stripe，實際處理交由背景 worker
+    insert_query = """
+        INSERT INTO stripe_webhook_events (event_id, event_type, order_id, payload)
+        VALUES ($1, $2, $3, $4::jsonb)
+        ON CONFLICT (event_id) DO NOTHING
+    """
+    result = await db.execute(
+        insert_query,
+        event["id"],
+        event["type"],
+        get_event_order_id(event),
+        payload.decode("utf-8"),
+    )
+    if result == "INSERT 0 0":
+        print(f"重複收到 webhook 事件: {event['id']}")
+        return {"status": "duplicate"}
+    await db.execute(
+        "SELECT pg_notify($1, $2)", STRIPE_WEBHOOK_CHANNEL, event["id"]
+    )
+    return {"status": "received"}
+
+
+def get_event_order_id(event):
+    metadata = event["data"]["object"].get("metadata") or {}
+    try:
+        return int(metadata["order_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def process_stripe_event(event: dict, db):
     event_type = event["type"]
-    if event_type == "checkout.session.completed":
-        session = event["data"]["object"]
-        order_id = int(session["metadata"]["order_id"])
+    if event_type != "checkout.session.completed":
+        print(f"收到未處理的事件: {event_type}")
+        return
+    session = event["data"]["object"]
+    order_id = int(session["metadata"]["order_id"])
+    select_query = "SELECT o.*, st.name as service_type, st.required_workers, st.base_duration_hours, st.additional_duration_hours, u.email as user_email FROM orders o    JOIN service_types st ON o.service_type_id = st.id JOIN users u ON o.user_id = u.id WHERE o.id = $1"
+    order_info = await db.fetchrow(select_query, order_id)
+    if not order_info:
+        print(f"訂單 {order_id} 不存在")
+        return
+    stripe_amount = session["amount_total"]
+    expected_amount = order_info["total_amount"] * 100
+    if stripe_amount != expected_amount:
+        print(
+            f"訂單 {order_info['order_number']} 金額不符，實付={stripe_amount/100}，應付={order_info['total_amount']}"
+        )
+        return
+    update_query = "UPDATE orders SET status = 'pending_schedule', payment_status = 'paid', updated_at = NOW(), checkout_session_id = $2 WHERE id = $1 AND payment_status = 'unpaid'"
+    result = await db.execute(update_query, order_id, session["id"])
+    if result != "UPDATE 1":
+        print(f"訂單 {order_id} 可能已處理過")
+        return
+    if order_info["service_type"] in ["INSTALLATION", "MAINTENANCE"]:
         try:
-            async with db.transaction():
-                select_query = "SELECT o.*, st.name as service_type, st.required_workers, st.base_duration_hours, st.additional_duration_hours, u.email as user_email FROM orders o    JOIN service_types st ON o.service_type_id = st.id JOIN users u ON o.user_id = u.id WHERE o.id = $1"
-                order_info = await db.fetchrow(select_query, order_id)
-                if not order_info:
-                    print(f"訂單 {order_id} 不存在")
-                    return {"status": "error", "message": "訂單不存在"}
-                stripe_amount = session["amount_total"]
-                expected_amount = order_info["total_amount"] * 100
-                if stripe_amount != expected_amount:
-                    print(
-                        f"訂單 {order_info['order_number']} 金額不符，實付={stripe_amount/100}，應付={order_info['total_amount']}"
-                    )
-                    return {"status": "error", "message": "付款金額與訂單金額不符"}
-                update_query = "UPDATE orders SET status = 'pending_schedule', payment_status = 'paid', updated_at = NOW(), checkout_session_id = $2 WHERE id = $1 AND payment_status = 'unpaid'"
-                result = await db.execute(update_query, order_id, session["id"])
-                if result == "UPDATE 1":
-                    service_type = order_info["service_type"]
-                    if service_type in ["INSTALLATION", "MAINTENANCE"]:
-                        await process_immediate_scheduling(order_id, db)
-                        print(
-                            f"訂單 {order_info['order_number']} 付款成功，準備進行排程"
-                        )
-                    else:
-                        print(f"訂單 {order_info['order_number']} 付款成功，等待排程")
-                    return {"status": "received"}
-                else:
-                    print(f"訂單 {order_id} 可能已處理過")
-                return {"status": "received"}
-        except Exception as e:
-            print(f"處理 webhook 事件時發生錯誤: {str(e)}")
-            return {"status": "error", "message": str(e)}
+            await process_immediate_scheduling(order_id, db)
+            print(f"訂單 {order_info['order_number']} 付款成功，準備進行排程")
+        except HTTPException as e:
+            # 排程在獨立的 savepoint 內執行，失敗時保留付款結果，留待管理員手動排程
+            print(
+                f"訂單 {order_info['order_number']} 付款成功，但自動排程失敗: {e.detail}"
+            )
     else:
-        print(f"收到未處理的事件: {event_type}")
-        return {"status": "received"}
+        print(f"訂單 {order_info['order_number']} 付款成功，等待排程")
@@ -0,0 +1,170 @@
+import json
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from services.job_service import run_as_leader, sleep_while_holding_lock
+from services.payment_service import STRIPE_WEBHOOK_CHANNEL
+from services.stripe_service import list_checkout_sessions
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", 300))
+# Checkout Session 建立後一小時到期，回溯兩小時即可涵蓋所有仍可能完成付款的 session
+RECONCILE_LOOKBACK_SECONDS = 7200
+RECONCILE_BATCH_SIZE = 500
+
+# 優先以 checkout_session_id 比對；訂單若已換發新的 session，改以 metadata 的訂單 id 比對
+MATCH_SESSIONS_QUERY = """
+    SELECT s.session_id, s.metadata_order_id, s.amount_total,
+           o.id AS order_id, o.order_number, o.payment_status, o.total_amount
+    FROM unnest($1::text[], $2::int[], $3::bigint[])
+         AS s(session_id, metadata_order_id, amount_total)
+    LEFT JOIN LATERAL (
+        SELECT id, order_number, payment_status, total_amount
+        FROM orders
+        WHERE checkout_session_id = s.session_id OR id = s.metadata_order_id
+        ORDER BY COALESCE(checkout_session_id = s.session_id, false) DESC
+        LIMIT 1
+    ) o ON true
+"""
+
+# 補登的付款以合成的 checkout.session.completed 事件寫入 webhook 收件匣，與正常 webhook 走相同處理流程
+ENQUEUE_RECOVERED_QUERY = """
+    WITH inserted AS (
+        INSERT INTO stripe_webhook_events (event_id, event_type, order_id, payload)
+        SELECT 'reconcile_' || s.session_id,
+               'checkout.session.completed',
+               s.order_id,
+               json_build_object(
+                   'id', 'reconcile_' || s.session_id,
+                   'type', 'checkout.session.completed',
+                   'data', json_build_object('object', json_build_object(
+                       'id', s.session_id,
+                       'amount_total', s.amount_total,
+                       'metadata', json_build_object('order_id', s.order_id::text)
+                   ))
+               )
+        FROM unnest($1::text[], $2::int[], $3::bigint[])
+             AS s(session_id, order_id, amount_total)
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING order_id
+    )
+    SELECT o.order_number FROM inserted JOIN orders o ON o.id = inserted.order_id
+"""
+
+
+async def payment_reconciliation_loop(db):
+    await run_as_leader(
+        db,
+        "payment_reconciliation",
+        run_payment_reconciliation,
+        wait_for_next_reconciliation,
+    )
+
+
+async def wait_for_next_reconciliation(lock_conn, last_run_at):
+    if last_run_at is None:
+        return
+    await sleep_while_holding_lock(lock_conn, RECONCILE_INTERVAL_SECONDS)
+
+
+def get_metadata_order_id(session):
+    try:
+        return int((session.metadata or {}).get("order_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def run_payment_reconciliation(db):
+    window_start = int(time.time()) - RECONCILE_LOOKBACK_SECONDS
+    sessions = await list_checkout_sessions(
+        {"created": {"gte": window_start}, "status": "complete"}
+    )
+    paid_sessions = [s for s in sessions if s.payment_status == "paid"]
+    report = {
+        "sessions_scanned": len(paid_sessions),
+        "already_paid": 0,
+        "recovered": 0,
+        "amount_mismatch": 0,
+        "orphaned": 0,
+    }
+    details = {"recovered": [], "amount_mismatch": [], "orphaned": []}
+    for start in range(0, len(paid_sessions), RECONCILE_BATCH_SIZE):
+        batch = paid_sessions[start : start + RECONCILE_BATCH_SIZE]
+        records = await db.fetch(
+            MATCH_SESSIONS_QUERY,
+            [s.id for s in batch],
+            [get_metadata_order_id(s) for s in batch],
+            [s.amount_total for s in batch],
+        )
+        recovered = []
+        for record in records:
+            if record["order_id"] is None:
+                # 已付款但訂單不存在（例如已被清理），需人工退款或補單
+                report["orphaned"] += 1
+                details["orphaned"].append(
+                    {
+                        "session_id": record["session_id"],
+                        "order_id": record["metadata_order_id"],
+                        "amount_total": record["amount_total"],
+                    }
+                )
+            elif record["payment_status"] != "unpaid":
+                report["already_paid"] += 1
+            elif record["amount_total"] != record["total_amount"] * 100:
+                report["amount_mismatch"] += 1
+                details["amount_mismatch"].append(
+                    {
+                        "session_id": record["session_id"],
+                        "order_number": record["order_number"],
+                        "amount_total": record["amount_total"],
+                    }
+                )
+            else:
+                recovered.append(record)
+        if recovered:
+            # 先前已補登但尚未處理完成的 session 不會重複寫入
+            inserted = await db.fetch(
+                ENQUEUE_RECOVERED_QUERY,
+                [record["session_id"] for record in recovered],
+                [record["order_id"] for record in recovered],
+                [record["amount_total"] for record in recovered],
+            )
+            report["recovered"] += len(inserted)
+            details["recovered"].extend(record["order_number"] for record in inserted)
+    if report["recovered"]:
+        await db.execute("SELECT pg_notify($1, $2)", STRIPE_WEBHOOK_CHANNEL, "")
+    insert_query = """
+        INSERT INTO payment_reconciliation_reports
+            (window_start, sessions_scanned, already_paid, recovered,
+             amount_mismatch, orphaned, details)
+        VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb)
+    """
+    await db.execute(
+        insert_query,
+        datetime.fromtimestamp(window_start, tz=TAIPEI_TZ),
+        report["sessions_scanned"],
+        report["already_paid"],
+        report["recovered"],
+        report["amount_mismatch"],
+        report["orphaned"],
+        json.dumps(details, ensure_ascii=False),
+    )
+    print(
+        f"付款對帳完成：已付款 session {report['sessions_scanned']} 筆，"
+        f"補登 {report['recovered']} 筆，金額不符 {report['amount_mismatch']} 筆，"
+        f"找不到訂單 {report['orphaned']} 筆"
+    )
+    return report["recovered"]
+
+
+async def get_reconciliation_reports(limit: int, db):
+    select_query = "SELECT * FROM payment_reconciliation_reports ORDER BY started_at DESC LIMIT $1"
+    records = await db.fetch(select_query, limit)
+    reports = []
+    for record in records:
+        report = dict(record)
+        report["details"] = json.loads(report["details"])
+        reports.append(report)
+    return {"reports": reports}
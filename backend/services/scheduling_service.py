@@ -1,7 +1,8 @@
 from fastapi import HTTPException
 from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
-from services.mail_service import send_scheduling_success_email
+from services.mail_service import build_scheduling_success_email
+from services.email_outbox_service import enqueue_email
 from utils.geocoding import get_coordinates
 from services.calendar_service import check_service_slot_bookable
 
@@ -86,10 +87,9 @@ async def process_immediate_scheduling(order_id: int, db):
                 selected_slot["id"],
             )
             await release_unused_locks(order_id, selected_slot["id"], db)
-        email_sent = False
-        try:
             select_query = "SELECT u.email, u.name FROM users u JOIN orders o ON u.id = o.user_id WHERE o.id = $1"
             user = await db.fetchrow(select_query, order_id)
+            email_queued = False
             if user:
                 order_data = {
                     "order_id": order_id,
@@ -105,10 +105,13 @@ async def process_immediate_scheduling(order_id: int, db):
                     "user_email": user["email"],
                     "user_name": user["name"],
                 }
-                result = send_scheduling_success_email(order_data)
-                email_sent = result.get("success", False)
-        except Exception as email_error:
-            print(f"郵件發送失敗，但排程已成功: {email_error}")
+                await enqueue_email(
+                    db,
+                    "scheduling_success",
+                    build_scheduling_success_email(order_data),
+                    order_id,
+                )
+                email_queued = True
         return {
             "success": True,
             "order_id": order_id,
@@ -116,7 +119,7 @@ async def process_immediate_scheduling(order_id: int, db):
             "scheduled_date": selected_slot["preferred_date"],
             "scheduled_time": selected_slot["preferred_time"],
             "estimated_end_time": estimated_end_time,
-            "email_sent": email_sent,
+            "email_queued": email_queued,
         }
     except Exception as e:
         print(f"立即排程出現錯誤: {str(e)}")
@@ -262,10 +265,9 @@ async def process_repair_order(order_id: int, db, http_client):
             await db.execute(update_query, order_id)
             update_query = "UPDATE booking_slots SET is_selected = true WHERE id = $1"
             await db.execute(update_query, selected_slot["id"])
-        try:
-            email_sent = False
             select_query = "SELECT u.email, u.name FROM users u JOIN orders o ON u.id = o.user_id WHERE o.id = $1"
             user = await db.fetchrow(select_query, order_id)
+            email_queued = False
             if user:
                 order_data = {
                     "order_id": order_id,
@@ -281,10 +283,13 @@ async def process_repair_order(order_id: int, db, http_client):
                     "user_email": user["email"],
                     "user_name": user["name"],
                 }
-            result = send_scheduling_success_email(order_data)
-            email_sent = result.get("success", False)
-        except Exception as email_error:
-            print(f"郵件發送失敗，但排程已成功: {email_error}")
+                await enqueue_email(
+                    db,
+                    "scheduling_success",
+                    build_scheduling_success_email(order_data),
+                    order_id,
+                )
+                email_queued = True
         return {
             "success": True,
             "order_id": order_id,
@@ -292,7 +297,7 @@ async def process_repair_order(order_id: int, db, http_client):
             "scheduled_date": selected_slot["preferred_date"],
             "scheduled_time": selected_slot["preferred_time"],
             "estimated_end_time": end_datetime.time(),
-            "email_sent": email_sent,
+            "email_queued": email_queued,
         }
     except Exception as e:
         print(f"維修排程出現錯誤: {str(e)}")
@@ -0,0 +1,177 @@
+from fastapi import HTTPException
+from typing import Optional
+import base64
+from services.admin_service import (
+    ADMIN_ORDER_COLUMNS,
+    ADMIN_ORDER_JOINS,
+    build_admin_order,
+)
+
+# 與前端相同，關鍵字至少 2 個字才搜尋（常見的兩字中文姓名）
+SEARCH_MIN_LENGTH = 2
+# ILIKE '%關鍵字%' 至少要有 3 個字才能取出完整的 trigram；較短的關鍵字無法由 GIN 索引縮小範圍，
+# 拼字相近的比對也沒有意義，改為只做部分字串比對（與建立索引前的搜尋相同，需掃描資料表）
+TRIGRAM_MIN_LENGTH = 3
+
+# 以 pg_trgm 的 GIN 索引比對：ILIKE 處理部分字串（例如電話末幾碼），<% 處理拼字相近的關鍵字；
+# 依 word_similarity 由高到低排序，以 (score, id) 游標分頁
+SEARCH_USERS_TEMPLATE = """
+    SELECT id, name, email, role, created_at, score
+    FROM (
+        SELECT id, name, email, role, created_at,
+               GREATEST(word_similarity($1, name), word_similarity($1, email)) AS score
+        FROM users
+        WHERE {users_match}
+    ) matched
+    WHERE $3::real IS NULL OR (score, id) < ($3::real, $4::int)
+    ORDER BY score DESC, id DESC
+    LIMIT $5
+"""
+
+# 訂單編號、地址與聯絡人（booking_slots）分別走各自的索引，再依訂單合併取最高分
+SEARCH_ORDERS_TEMPLATE = """
+    WITH matches AS (
+        SELECT id AS order_id,
+               GREATEST(word_similarity($1, order_number),
+                        word_similarity($1, location_address)) AS score
+        FROM orders
+        WHERE {orders_match}
+        UNION ALL
+        SELECT order_id,
+               GREATEST(word_similarity($1, contact_name),
+                        word_similarity($1, contact_phone)) AS score
+        FROM booking_slots
+        WHERE {slots_match}
+    ),
+    ranked AS (
+        SELECT order_id, MAX(score)::real AS score
+        FROM matches
+        GROUP BY order_id
+    )
+    SELECT {columns}, r.score
+    FROM ranked r
+    JOIN orders o ON o.id = r.order_id
+    {joins}
+    WHERE ($3::real IS NULL OR (r.score, o.id) < ($3::real, $4::int))
+      AND ($6::text IS NULL OR o.status = $6)
+      AND ($7::text IS NULL OR o.payment_status = $7)
+      AND ($8::text IS NULL OR st.name = $8)
+    ORDER BY r.score DESC, o.id DESC
+    LIMIT $5
+"""
+
+SEARCH_USERS_QUERY = SEARCH_USERS_TEMPLATE.format(
+    users_match="name ILIKE $2 OR email ILIKE $2 OR $1 <% name OR $1 <% email"
+)
+SEARCH_USERS_SHORT_QUERY = SEARCH_USERS_TEMPLATE.format(
+    users_match="name ILIKE $2 OR email ILIKE $2"
+)
+SEARCH_ORDERS_QUERY = SEARCH_ORDERS_TEMPLATE.format(
+    orders_match="""order_number ILIKE $2 OR location_address ILIKE $2
+           OR $1 <% order_number OR $1 <% location_address""",
+    slots_match="""contact_name ILIKE $2 OR contact_phone ILIKE $2
+           OR $1 <% contact_name OR $1 <% contact_phone""",
+    columns=ADMIN_ORDER_COLUMNS,
+    joins=ADMIN_ORDER_JOINS,
+)
+SEARCH_ORDERS_SHORT_QUERY = SEARCH_ORDERS_TEMPLATE.format(
+    orders_match="order_number ILIKE $2 OR location_address ILIKE $2",
+    slots_match="contact_name ILIKE $2 OR contact_phone ILIKE $2",
+    columns=ADMIN_ORDER_COLUMNS,
+    joins=ADMIN_ORDER_JOINS,
+)
+
+
+def encode_search_cursor(score: float, record_id: int):
+    raw = f"{score!r}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        score, record_id = raw.rsplit("|", 1)
+        return float(score), int(record_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="無效的分頁游標")
+
+
+def build_search_terms(q: str):
+    keyword = q.strip()
+    if len(keyword) < SEARCH_MIN_LENGTH:
+        raise HTTPException(
+            status_code=400, detail=f"搜尋關鍵字至少需要 {SEARCH_MIN_LENGTH} 個字"
+        )
+    escaped = (
+        keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    return keyword, f"%{escaped}%"
+
+
+def build_next_cursor(records, limit: int, id_key: str):
+    if len(records) <= limit:
+        return None
+    last = records[limit - 1]
+    return encode_search_cursor(last["score"], last[id_key])
+
+
+async def search_users_service(q: str, cursor: Optional[str], limit: int, db):
+    keyword, pattern = build_search_terms(q)
+    cursor_score, cursor_id = decode_search_cursor(cursor)
+    try:
+        query = (
+            SEARCH_USERS_QUERY
+            if len(keyword) >= TRIGRAM_MIN_LENGTH
+            else SEARCH_USERS_SHORT_QUERY
+        )
+        records = await db.fetch(
+            query, keyword, pattern, cursor_score, cursor_id, limit + 1
+        )
+    except Exception as e:
+        print(f"搜尋會員失敗：{e}")
+        raise HTTPException(status_code=500, detail="搜尋會員失敗")
+    return {
+        "users": [dict(record) for record in records[:limit]],
+        "limit": limit,
+        "next_cursor": build_next_cursor(records, limit, "id"),
+    }
+
+
+async def search_orders_service(
+    q: str,
+    status: Optional[str],
+    payment_status: Optional[str],
+    service_type: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+    db,
+):
+    keyword, pattern = build_search_terms(q)
+    cursor_score, cursor_id = decode_search_cursor(cursor)
+    try:
+        query = (
+            SEARCH_ORDERS_QUERY
+            if len(keyword) >= TRIGRAM_MIN_LENGTH
+            else SEARCH_ORDERS_SHORT_QUERY
+        )
+        records = await db.fetch(
+            query,
+            keyword,
+            pattern,
+            cursor_score,
+            cursor_id,
+            limit + 1,
+            status,
+            payment_status,
+            service_type,
+        )
+    except Exception as e:
+        print(f"搜尋訂單失敗：{e}")
+        raise HTTPException(status_code=500, detail="搜尋訂單失敗")
+    return {
+        "orders": [build_admin_order(record) for record in records[:limit]],
+        "limit": limit,
+        "next_cursor": build_next_cursor(records, limit, "id"),
+    }
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+import stripe
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from utils.metrics import track_external_call
+
+load_dotenv()
+
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+# 壓力測試時可指向本地的 stripe-mock，例如 http://localhost:12111
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", 10))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", 1))
+# 連續失敗達門檻後暫停呼叫 Stripe 一段時間，避免請求在逾時上堆積
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = 5
+STRIPE_CIRCUIT_RESET_SECONDS = 30
+
+_stripe_client = None
+_stripe_http_client = None
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open":
+            raise HTTPException(status_code=503, detail="付款服務暫時無法使用，請稍後再試")
+        if state == "half_open":
+            # 冷卻時間結束後只放行一個請求試探 Stripe 是否恢復，其餘請求重新等待冷卻
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            print(f"Stripe 連續失敗 {self.failures} 次，暫停呼叫 {self.reset_seconds} 秒")
+
+
+stripe_circuit = CircuitBreaker(
+    STRIPE_CIRCUIT_FAILURE_THRESHOLD, STRIPE_CIRCUIT_RESET_SECONDS
+)
+
+
+def get_stripe_client():
+    global _stripe_client, _stripe_http_client
+    if _stripe_client is None:
+        base_addresses = {"api": STRIPE_API_BASE} if STRIPE_API_BASE else {}
+        # HTTPXClient 內部共用同一個 httpx.AsyncClient，保持 keep-alive 連線
+        _stripe_http_client = stripe.HTTPXClient(timeout=STRIPE_TIMEOUT_SECONDS)
+        _stripe_client = stripe.StripeClient(
+            STRIPE_SECRET_KEY,
+            base_addresses=base_addresses,
+            max_network_retries=STRIPE_MAX_NETWORK_RETRIES,
+            http_client=_stripe_http_client,
+        )
+    return _stripe_client
+
+
+async def close_stripe_client():
+    global _stripe_client, _stripe_http_client
+    if _stripe_http_client is not None:
+        await _stripe_http_client.close_async()
+    _stripe_client = None
+    _stripe_http_client = None
+
+
+def is_stripe_outage(error: Exception):
+    if isinstance(
+        error, (stripe.APIConnectionError, stripe.APIError, stripe.RateLimitError)
+    ):
+        return True
+    http_status = getattr(error, "http_status", None)
+    return http_status is not None and http_status >= 500
+
+
+async def call_stripe(operation, *args, **kwargs):
+    stripe_circuit.before_call()
+    # 整體上限涵蓋 SDK 內建的網路重試
+    timeout = STRIPE_TIMEOUT_SECONDS * (STRIPE_MAX_NETWORK_RETRIES + 1) + 1
+    operation_name = operation.__name__.removesuffix("_async")
+    try:
+        with track_external_call("stripe", operation_name):
+            result = await asyncio.wait_for(
+                operation(*args, **kwargs), timeout=timeout
+            )
+    except asyncio.TimeoutError:
+        stripe_circuit.record_failure()
+        raise HTTPException(status_code=504, detail="付款服務回應逾時，請稍後再試")
+    except stripe.StripeError as e:
+        if is_stripe_outage(e):
+            stripe_circuit.record_failure()
+        else:
+            stripe_circuit.record_success()
+        raise
+    stripe_circuit.record_success()
+    return result
+
+
+async def retrieve_checkout_session(session_id: str):
+    client = get_stripe_client()
+    return await call_stripe(client.checkout.sessions.retrieve_async, session_id)
+
+
+async def create_stripe_checkout_session(**params):
+    client = get_stripe_client()
+    return await call_stripe(client.checkout.sessions.create_async, params=params)
+
+
+async def list_checkout_sessions(params: dict):
+    # 逐頁呼叫列表 API（每頁最多 100 筆），每一頁都經過逾時與 circuit breaker 保護
+    client = get_stripe_client()
+    params = {"limit": 100, **params}
+    sessions = []
+    while True:
+        page = await call_stripe(client.checkout.sessions.list_async, params=params)
+        sessions.extend(page.data)
+        if not page.has_more or not page.data:
+            return sessions
+        params["starting_after"] = page.data[-1].id
@@ -0,0 +1,153 @@
+from fastapi import HTTPException
+from typing import Optional
+from datetime import date, time, timedelta
+
+HEATMAP_MAX_DAYS = 366
+# 逐小時的格子數隨天數成長，長區間請改用 day / week / month 彙總
+HEATMAP_HOURLY_MAX_DAYS = 92
+HEATMAP_HOURS = [time(hour, 0) for hour in range(8, 17)]
+HEATMAP_GRANULARITIES = ["hour", "day", "week", "month"]
+
+# 熱度圖只讀觸發器維護的彙總表，查詢成本與區間內的小時數成正比，與訂單量無關。
+# $4 為 date_trunc 的單位，$5 為 true 時保留小時維度
+SERVICE_ROLLUPS_QUERY = """
+    SELECT date_trunc($4, r.slot_date::timestamp)::date AS period,
+           CASE WHEN $5 THEN r.slot_time END AS slot_time,
+           st.name AS service_type,
+           SUM(r.used_workers)::int AS used_workers,
+           SUM(r.scheduled_orders)::int AS scheduled_orders,
+           SUM(r.revenue)::bigint AS revenue
+    FROM workforce_service_rollups r
+    JOIN service_types st ON st.id = r.service_type_id
+    WHERE r.slot_date BETWEEN $1 AND $2
+      AND ($3::text IS NULL OR st.name = $3)
+      AND (r.used_workers <> 0 OR r.scheduled_orders <> 0)
+    GROUP BY 1, 2, 3
+"""
+
+HOURLY_ROLLUPS_QUERY = """
+    SELECT date_trunc($3, slot_date::timestamp)::date AS period,
+           CASE WHEN $4 THEN slot_time END AS slot_time,
+           SUM(held_workers)::int AS held_workers
+    FROM workforce_hourly_rollups
+    WHERE slot_date BETWEEN $1 AND $2 AND held_workers <> 0
+    GROUP BY 1, 2
+"""
+
+
+def get_period_end(period: date, granularity: str):
+    if granularity == "week":
+        return period + timedelta(days=6)
+    if granularity == "month":
+        next_month = (period.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    return period
+
+
+def get_period_capacity(
+    period: date, granularity: str, date_from: date, date_to: date, workers: int
+):
+    # 以「人力 × 工時」計算容量，頭尾不完整的週、月只計入查詢區間內的天數
+    if granularity == "hour":
+        return workers
+    start = max(period, date_from)
+    end = min(get_period_end(period, granularity), date_to)
+    return workers * len(HEATMAP_HOURS) * ((end - start).days + 1)
+
+
+def build_empty_cell(capacity: int):
+    return {
+        "capacity": capacity,
+        "used_workers": 0,
+        "held_workers": 0,
+        "scheduled_orders": 0,
+        "revenue": 0,
+        "by_service_type": {},
+    }
+
+
+async def get_utilization_heatmap(
+    date_from: date,
+    date_to: date,
+    service_type: Optional[str],
+    granularity: str,
+    db,
+):
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="開始日期不能晚於結束日期")
+    if granularity not in HEATMAP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="無效的統計單位")
+    days = (date_to - date_from).days + 1
+    max_days = HEATMAP_HOURLY_MAX_DAYS if granularity == "hour" else HEATMAP_MAX_DAYS
+    if days > max_days:
+        raise HTTPException(status_code=400, detail=f"查詢區間不能超過 {max_days} 天")
+    trunc_unit = "day" if granularity == "hour" else granularity
+    hourly = granularity == "hour"
+    try:
+        workers = await db.fetchval("SELECT total_workers FROM company_settings LIMIT 1")
+        service_records = await db.fetch(
+            SERVICE_ROLLUPS_QUERY, date_from, date_to, service_type, trunc_unit, hourly
+        )
+        hourly_records = await db.fetch(
+            HOURLY_ROLLUPS_QUERY, date_from, date_to, trunc_unit, hourly
+        )
+    except Exception as e:
+        print(f"取得人力使用率失敗：{e}")
+        raise HTTPException(status_code=500, detail="取得人力使用率失敗")
+    workers = workers or 0
+    cells = {}
+
+    def get_cell(record):
+        key = (record["period"], record["slot_time"])
+        if key not in cells:
+            capacity = get_period_capacity(
+                record["period"], granularity, date_from, date_to, workers
+            )
+            cells[key] = build_empty_cell(capacity)
+        return cells[key]
+
+    for record in service_records:
+        cell = get_cell(record)
+        cell["used_workers"] += record["used_workers"]
+        cell["scheduled_orders"] += record["scheduled_orders"]
+        cell["revenue"] += record["revenue"]
+        cell["by_service_type"][record["service_type"]] = {
+            "used_workers": record["used_workers"],
+            "scheduled_orders": record["scheduled_orders"],
+            "revenue": record["revenue"],
+        }
+    # 暫時鎖定尚未對應訂單，依服務類型篩選時仍列出整體的暫時鎖定人力
+    for record in hourly_records:
+        get_cell(record)["held_workers"] = record["held_workers"]
+    heatmap = []
+    totals = {"used_workers": 0, "held_workers": 0, "scheduled_orders": 0, "revenue": 0}
+    for (period, slot_time), cell in sorted(cells.items()):
+        for field in totals:
+            totals[field] += cell[field]
+        busy_workers = cell["used_workers"] + cell["held_workers"]
+        cell["utilization"] = (
+            round(busy_workers / cell["capacity"], 4) if cell["capacity"] else None
+        )
+        heatmap.append(
+            {
+                "period": period,
+                "time": slot_time.strftime("%H:%M") if slot_time else None,
+                **cell,
+            }
+        )
+    totals["capacity"] = workers * len(HEATMAP_HOURS) * days
+    totals["utilization"] = (
+        round((totals["used_workers"] + totals["held_workers"]) / totals["capacity"], 4)
+        if totals["capacity"]
+        else None
+    )
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "service_type": service_type,
+        "granularity": granularity,
+        "workers": workers,
+        "hours": [hour.strftime("%H:%M") for hour in HEATMAP_HOURS],
+        "cells": heatmap,
+        "totals": totals,
+    }
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import time
+from fastapi import HTTPException
+from db.database import create_dedicated_connection
+from services.payment_service import process_stripe_event, STRIPE_WEBHOOK_CHANNEL
+from utils.metrics import background_job_seconds
+from utils.tracing import start_trace, span
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+# 收不到通知時（例如其他實例寫入、監聽連線中斷）仍定期檢查收件匣
+WEBHOOK_POLL_SECONDS = 5
+WEBHOOK_CLAIM_TIMEOUT_SECONDS = 300
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 10
+WEBHOOK_RETRY_MAX_SECONDS = 1800
+
+# 同一訂單的事件依收到順序逐一處理：較早的事件尚未完成、或有其他事件正在處理時跳過
+CLAIM_EVENT_QUERY = """
+    UPDATE stripe_webhook_events
+    SET status = 'processing',
+        attempts = attempts + 1,
+        locked_until = NOW() + make_interval(secs => $1)
+    WHERE event_id = (
+        SELECT e.event_id
+        FROM stripe_webhook_events e
+        WHERE ((e.status = 'pending' AND e.next_attempt_at <= NOW())
+               OR (e.status = 'processing' AND e.locked_until < NOW()))
+          AND NOT EXISTS (
+              SELECT 1
+              FROM stripe_webhook_events other
+              WHERE other.order_id = e.order_id
+                AND other.event_id <> e.event_id
+                AND (
+                    (other.status = 'processing' AND other.locked_until >= NOW())
+                    OR (other.status IN ('pending', 'processing')
+                        AND (other.received_at, other.event_id) < (e.received_at, e.event_id))
+                )
+          )
+        ORDER BY e.received_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING event_id, event_type, payload, attempts
+"""
+
+
+async def mark_event_failed(db, event_id: str, error: str):
+    update_query = """
+        UPDATE stripe_webhook_events
+        SET status = CASE WHEN attempts >= $3 THEN 'dead' ELSE 'pending' END,
+            next_attempt_at = NOW() + make_interval(
+                secs => LEAST($4 * power(2, attempts - 1), $5)
+            ),
+            locked_until = NULL,
+            last_error = $2
+        WHERE event_id = $1
+        RETURNING status
+    """
+    status = await db.fetchval(
+        update_query,
+        event_id,
+        error,
+        WEBHOOK_MAX_ATTEMPTS,
+        WEBHOOK_RETRY_BASE_SECONDS,
+        WEBHOOK_RETRY_MAX_SECONDS,
+    )
+    if status == "dead":
+        print(f"webhook 事件 {event_id} 重試次數已達上限，需手動重新處理")
+
+
+async def process_next_event(db):
+    async with db.acquire() as conn:
+        record = await conn.fetchrow(CLAIM_EVENT_QUERY, WEBHOOK_CLAIM_TIMEOUT_SECONDS)
+        if not record:
+            return False
+        event = json.loads(record["payload"])
+        try:
+            # 事件處理與狀態更新在同一交易內，避免處理完成卻未標記而重複執行
+            async with conn.transaction():
+                with span("process_stripe_event", event_type=event.get("type")):
+                    await process_stripe_event(event, conn)
+                update_query = "UPDATE stripe_webhook_events SET status = 'processed', processed_at = NOW(), locked_until = NULL, last_error = NULL WHERE event_id = $1"
+                await conn.execute(update_query, record["event_id"])
+        except Exception as e:
+            print(f"處理 webhook 事件 {record['event_id']} 失敗: {e}")
+            await mark_event_failed(conn, record["event_id"], str(e))
+        return True
+
+
+async def webhook_inbox_worker(db, wake: asyncio.Event, worker_index: int):
+    while True:
+        try:
+            wake.clear()
+            started = time.perf_counter()
+            with start_trace("webhook_inbox", "job") as trace:
+                processed = await process_next_event(db)
+                if not processed:
+                    trace.discard()
+            if processed:
+                background_job_seconds.labels("webhook_inbox", "success").observe(
+                    time.perf_counter() - started
+                )
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"webhook worker {worker_index} 發生錯誤: {e}")
+            await asyncio.sleep(WEBHOOK_POLL_SECONDS)
+
+
+async def webhook_inbox_loop(db):
+    wake = asyncio.Event()
+    listen_conn = None
+    try:
+        try:
+            listen_conn = await create_dedicated_connection()
+            await listen_conn.add_listener(
+                STRIPE_WEBHOOK_CHANNEL, lambda *args: wake.set()
+            )
+        except Exception as e:
+            print(f"無法監聽 webhook 通知，改為定期輪詢: {e}")
+        await asyncio.gather(
+            *(webhook_inbox_worker(db, wake, i) for i in range(WEBHOOK_WORKERS))
+        )
+    except asyncio.CancelledError:
+        print("webhook 處理服務已成功停止")
+        raise
+    finally:
+        if listen_conn is not None and not listen_conn.is_closed():
+            await listen_conn.close()
+
+
+async def get_webhook_events(status: str, page: int, limit: int, db):
+    where_clause = "WHERE status = $1" if status else ""
+    params = [status] if status else []
+    select_query = f"SELECT COUNT(*) FROM stripe_webhook_events {where_clause}"
+    total = await db.fetchval(select_query, *params)
+    select_query = f"""
+        SELECT event_id, event_type, order_id, status, attempts, next_attempt_at,
+               last_error, received_at, processed_at
+        FROM stripe_webhook_events
+        {where_clause}
+        ORDER BY received_at DESC
+        LIMIT ${len(params) + 1} OFFSET ${len(params) + 2}
+    """
+    events = await db.fetch(select_query, *params, limit, (page - 1) * limit)
+    return {
+        "events": [dict(event) for event in events],
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "total_pages": (total + limit - 1) // limit,
+    }
+
+
+async def replay_webhook_event(event_id: str, db):
+    update_query = """
+        UPDATE stripe_webhook_events
+        SET status = 'pending', attempts = 0, next_attempt_at = NOW(),
+            locked_until = NULL, last_error = NULL
+        WHERE event_id = $1
+          AND NOT (status = 'processing' AND locked_until >= NOW())
+        RETURNING event_id
+    """
+    replayed = await db.fetchval(update_query, event_id)
+    if not replayed:
+        exists = await db.fetchval(
+            "SELECT 1 FROM stripe_webhook_events WHERE event_id = $1", event_id
+        )
+        if not exists:
+            raise HTTPException(status_code=404, detail="webhook 事件不存在")
+        raise HTTPException(status_code=409, detail="webhook 事件正在處理中")
+    await db.execute("SELECT pg_notify($1, $2)", STRIPE_WEBHOOK_CHANNEL, event_id)
+    return {"success": True, "message": f"已重新排入 webhook 事件 {event_id}"}
@@ -0,0 +1,30 @@
+import os
+import sys
+from pathlib import Path
+import asyncpg
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db.schema import apply_schema  # noqa: E402
+
+# 需要資料庫的測試請連到可任意清空的本地資料庫，未設定時略過：
+#   TEST_DB_URL=postgresql://postgres@localhost/coolslate_test python -m pytest
+TEST_DB_URL = os.getenv("TEST_DB_URL")
+SCHEMA_FILE = Path(__file__).resolve().parent.parent / "benchmarks" / "schema.sql"
+
+
+@pytest.fixture
+async def db_pool():
+    if not TEST_DB_URL:
+        pytest.skip("未設定 TEST_DB_URL")
+    conn = await asyncpg.connect(dsn=TEST_DB_URL)
+    try:
+        await conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        await conn.execute(SCHEMA_FILE.read_text())
+        await apply_schema(conn)
+    finally:
+        await conn.close()
+    pool = await asyncpg.create_pool(dsn=TEST_DB_URL, min_size=1, max_size=4)
+    yield pool
+    await pool.close()
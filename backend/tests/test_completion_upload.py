@@ -0,0 +1,150 @@
+import asyncio
+import boto3
+import pytest
+import requests
+from fastapi import HTTPException
+from moto.server import ThreadedMotoServer
+import services.admin_service as admin_service
+from utils.dependencies import LazyConnection
+
+BUCKET = "completion-reports"
+CLOUDFRONT = "https://cdn.example.com"
+PDF_BYTES = b"%PDF-1.4\n% test report\n"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    # moto 以本地 HTTP 伺服器模擬 S3，瀏覽器直傳的 presigned POST 也實際送到它
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    client = boto3.client(
+        "s3",
+        region_name="us-east-1",
+        endpoint_url=f"http://{host}:{port}",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+    client.create_bucket(Bucket=BUCKET)
+    monkeypatch.setattr(admin_service, "s3_client", client)
+    monkeypatch.setattr(admin_service, "S3_BUCKET_NAME", BUCKET)
+    monkeypatch.setattr(admin_service, "CLOUDFRONT_DOMAIN", CLOUDFRONT)
+    yield client
+    server.stop()
+
+
+@pytest.fixture
+async def db(db_pool):
+    connection = LazyConnection(db_pool)
+    yield connection
+    await connection.close()
+
+
+async def create_order(db_pool, status: str = "scheduled"):
+    async with db_pool.acquire() as conn:
+        user_id = await conn.fetchval(
+            "INSERT INTO users (email, google_id, name) VALUES ('test@example.com', 'test', '測試') RETURNING id"
+        )
+        return await conn.fetchrow(
+            """
+            INSERT INTO orders (order_number, user_id, service_type_id, location_address,
+                                unit_count, total_amount, status, payment_status)
+            SELECT 'TEST00000001', $1, id, '台北市信義區市府路1號', 1, 2000, $2, 'paid'
+            FROM service_types WHERE name = 'MAINTENANCE'
+            RETURNING id, order_number
+            """,
+            user_id,
+            status,
+        )
+
+
+def post_file(upload: dict, content: bytes):
+    return requests.post(
+        upload["upload_url"],
+        data=upload["fields"],
+        files={"file": ("report.pdf", content, "application/pdf")},
+        timeout=10,
+    )
+
+
+async def test_presigned_post_then_confirm(db_pool, db, s3):
+    order = await create_order(db_pool)
+    upload = await admin_service.create_completion_upload(
+        order["id"], "驗收報告.pdf", len(PDF_BYTES), db
+    )
+    assert upload["object_key"].startswith(f"{order['order_number']}_")
+    assert upload["fields"]["Content-Type"] == "application/pdf"
+
+    response = await asyncio.to_thread(post_file, upload, PDF_BYTES)
+    assert response.status_code in (200, 201, 204)
+
+    result = await admin_service.confirm_completion_upload(
+        order["id"], upload["object_key"], "驗收報告.pdf", db
+    )
+    assert result["success"]
+    assert result["completion_file_url"] == f"{CLOUDFRONT}/{upload['object_key']}"
+
+    head = s3.head_object(Bucket=BUCKET, Key=upload["object_key"])
+    assert head["ContentLength"] == len(PDF_BYTES)
+    assert head["ContentDisposition"] == admin_service.build_content_disposition("驗收報告.pdf")
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT completion_file_url, completion_file_name FROM order_completions WHERE order_id = $1",
+            order["id"],
+        )
+    assert dict(row) == {
+        "completion_file_url": result["completion_file_url"],
+        "completion_file_name": "驗收報告.pdf",
+    }
+
+
+async def test_confirm_without_uploaded_object(db_pool, db, s3):
+    order = await create_order(db_pool)
+    upload = await admin_service.create_completion_upload(
+        order["id"], "report.pdf", len(PDF_BYTES), db
+    )
+
+    with pytest.raises(HTTPException) as error:
+        await admin_service.confirm_completion_upload(
+            order["id"], upload["object_key"], "report.pdf", db
+        )
+    assert error.value.status_code == 400
+    assert error.value.detail == "找不到上傳的檔案，請重新上傳"
+
+
+async def test_confirm_rejects_object_of_another_order(db_pool, db, s3):
+    order = await create_order(db_pool)
+    object_key = "OTHER0000001_0123456789abcdef_report.pdf"
+    s3.put_object(Bucket=BUCKET, Key=object_key, Body=PDF_BYTES, ContentType="application/pdf")
+
+    with pytest.raises(HTTPException) as error:
+        await admin_service.confirm_completion_upload(
+            order["id"], object_key, "report.pdf", db
+        )
+    assert error.value.detail == "檔案與訂單不符"
+
+
+async def test_confirm_rejects_non_pdf_object(db_pool, db, s3):
+    order = await create_order(db_pool)
+    upload = await admin_service.create_completion_upload(
+        order["id"], "report.pdf", len(PDF_BYTES), db
+    )
+    s3.put_object(
+        Bucket=BUCKET, Key=upload["object_key"], Body=b"hello", ContentType="text/plain"
+    )
+
+    with pytest.raises(HTTPException) as error:
+        await admin_service.confirm_completion_upload(
+            order["id"], upload["object_key"], "report.pdf", db
+        )
+    assert error.value.detail == "上傳的檔案格式或大小不符"
+
+
+async def test_upload_requires_scheduled_order(db_pool, db, s3):
+    order = await create_order(db_pool, status="pending")
+
+    with pytest.raises(HTTPException) as error:
+        await admin_service.create_completion_upload(
+            order["id"], "report.pdf", len(PDF_BYTES), db
+        )
+    assert error.value.status_code == 400
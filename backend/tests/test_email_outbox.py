@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+import resend
+import services.email_outbox_service as outbox
+from benchmarks.fake_resend import start_fake_resend
+
+
+def build_email(index: int, to: str = None):
+    return {
+        "from": "Cool Slate <noreply@example.com>",
+        "to": [to or f"user{index}@example.com"],
+        "subject": f"排程確認 {index}",
+        "html": "<p>測試</p>",
+    }
+
+
+async def enqueue(db_pool, emails: list):
+    async with db_pool.acquire() as conn:
+        await outbox.enqueue_emails(
+            conn, "scheduling_success", [(None, email) for email in emails]
+        )
+
+
+async def fetch_outbox(db_pool):
+    async with db_pool.acquire() as conn:
+        return await conn.fetch(
+            """
+            SELECT id, status, attempts, batch_key, last_error, locked_until,
+                   next_attempt_at > NOW() AS backed_off, provider_message_id
+            FROM email_outbox ORDER BY id
+            """
+        )
+
+
+async def expire_locks(db_pool):
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            "UPDATE email_outbox SET locked_until = NOW() - interval '1 second' WHERE status = 'sending'"
+        )
+
+
+@pytest.fixture
+def fake_resend(monkeypatch):
+    server, state = start_fake_resend()
+    monkeypatch.setattr(resend, "api_url", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(resend, "api_key", "re_test")
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+async def test_delivers_batch_once(db_pool, fake_resend):
+    await enqueue(db_pool, [build_email(i) for i in range(3)])
+
+    assert await outbox.deliver_email_batch(db_pool) == 3
+    assert await outbox.deliver_email_batch(db_pool) == 0
+
+    rows = await fetch_outbox(db_pool)
+    assert [row["status"] for row in rows] == ["sent"] * 3
+    assert all(row["provider_message_id"] for row in rows)
+    assert len({row["batch_key"] for row in rows}) == 1
+    assert fake_resend.stats() == {"requests": 1, "sent": 3, "duplicates": 0}
+
+
+async def test_timed_out_batch_retries_with_same_idempotency_key(
+    db_pool, fake_resend, monkeypatch
+):
+    # 呼叫端逾時但假伺服器仍完成寄送，重試時應取回同一批次並由 idempotency key 去除重複
+    monkeypatch.setattr(outbox, "EMAIL_SEND_TIMEOUT_SECONDS", 0.1)
+    fake_resend.delay = 0.5
+    await enqueue(db_pool, [build_email(i) for i in range(2)])
+
+    assert await outbox.deliver_email_batch(db_pool) == 0
+    rows = await fetch_outbox(db_pool)
+    assert [row["status"] for row in rows] == ["sending"] * 2
+    assert all(row["last_error"] == "寄送逾時" for row in rows)
+    batch_key = rows[0]["batch_key"]
+
+    await asyncio.sleep(0.6)
+    fake_resend.delay = 0
+    # 鎖定時間未到期前不會重新取出
+    assert await outbox.deliver_email_batch(db_pool) == 0
+    await expire_locks(db_pool)
+    assert await outbox.deliver_email_batch(db_pool) == 2
+
+    rows = await fetch_outbox(db_pool)
+    assert [row["status"] for row in rows] == ["sent"] * 2
+    assert [row["attempts"] for row in rows] == [2, 2]
+    assert {row["batch_key"] for row in rows} == {batch_key}
+    assert fake_resend.stats() == {"requests": 2, "sent": 2, "duplicates": 0}
+
+
+async def test_timeout_at_attempt_limit_moves_to_dead(db_pool, fake_resend, monkeypatch):
+    monkeypatch.setattr(outbox, "EMAIL_SEND_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(outbox, "EMAIL_MAX_ATTEMPTS", 2)
+    fake_resend.delay = 0.3
+    await enqueue(db_pool, [build_email(0)])
+
+    assert await outbox.deliver_email_batch(db_pool) == 0
+    await expire_locks(db_pool)
+    assert await outbox.deliver_email_batch(db_pool) == 0
+    await asyncio.sleep(0.3)
+
+    rows = await fetch_outbox(db_pool)
+    assert rows[0]["status"] == "dead"
+    assert rows[0]["attempts"] == 2
+    assert rows[0]["locked_until"] is None
+    assert await outbox.deliver_email_batch(db_pool) == 0
+
+
+async def test_transient_failure_backs_off(db_pool, fake_resend):
+    fake_resend.fail_rate = 1.0
+    await enqueue(db_pool, [build_email(i) for i in range(2)])
+
+    assert await outbox.deliver_email_batch(db_pool) == 0
+
+    rows = await fetch_outbox(db_pool)
+    assert [row["status"] for row in rows] == ["pending"] * 2
+    assert all(row["backed_off"] and row["last_error"] for row in rows)
+    assert await outbox.deliver_email_batch(db_pool) == 0
+
+
+async def test_rejected_batch_is_sent_one_by_one(db_pool, fake_resend):
+    await enqueue(
+        db_pool, [build_email(0), build_email(1, to="not-an-email"), build_email(2)]
+    )
+
+    assert await outbox.deliver_email_batch(db_pool) == 2
+
+    rows = await fetch_outbox(db_pool)
+    assert [row["status"] for row in rows] == ["sent", "dead", "sent"]
+    assert all(row["batch_key"].endswith(f":{row['id']}") for row in rows)
+    assert fake_resend.stats()["sent"] == 2
+    assert fake_resend.stats()["duplicates"] == 0
+
+
+async def test_retry_batch_claimed_by_one_worker(db_pool, fake_resend):
+    await enqueue(db_pool, [build_email(i) for i in range(3)])
+    async with db_pool.acquire() as conn:
+        claimed = await outbox.claim_email_batch(conn, 50)
+        await conn.execute(
+            "UPDATE email_outbox SET status = 'pending', next_attempt_at = NOW() - interval '1 second'"
+        )
+    batch_key = claimed[0]["batch_key"]
+
+    async with db_pool.acquire() as holder, db_pool.acquire() as worker:
+        # 另一個 worker 正在認領同一批次時不等待，也不會取回其中部分郵件
+        async with holder.transaction():
+            await holder.execute(
+                "SELECT pg_advisory_xact_lock($1, hashtext($2))",
+                outbox.EMAIL_BATCH_LOCK_CLASS,
+                batch_key,
+            )
+            assert await asyncio.wait_for(outbox.claim_email_batch(worker, 50), 5) == []
+        records = await outbox.claim_email_batch(worker, 50)
+
+    assert [record["id"] for record in records] == [record["id"] for record in claimed]
+    assert {record["batch_key"] for record in records} == {batch_key}
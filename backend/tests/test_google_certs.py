@@ -0,0 +1,125 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+import utils.google_certs as google_certs
+
+MAX_AGE = 100
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class CertsStub:
+    # 本地的 Google 憑證端點替身，回應與 Google 相同的 Cache-Control: max-age
+    def __init__(self):
+        self.certs = {"key-1": "cert-1"}
+        self.status = 200
+        self.requests = 0
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                payload = json.dumps(stub.certs).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, must-revalidate")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def certs_stub():
+    stub = CertsStub()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub.make_handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.url = f"http://127.0.0.1:{server.server_address[1]}/oauth2/v1/certs"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(google_certs, "time", clock)
+    return clock
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+async def test_uses_cached_certs_within_max_age(certs_stub, clock, client):
+    cache = google_certs.GoogleCertsCache(certs_stub.url)
+
+    assert await cache.get_certs(client, "key-1") == {"key-1": "cert-1"}
+    clock.now += MAX_AGE * 0.5
+    assert await cache.get_certs(client, "key-1") == {"key-1": "cert-1"}
+    assert certs_stub.requests == 1
+
+
+async def test_refreshes_in_background_before_expiry(certs_stub, clock, client):
+    cache = google_certs.GoogleCertsCache(certs_stub.url)
+    await cache.get_certs(client, "key-1")
+    certs_stub.certs = {"key-1": "cert-1", "key-2": "cert-2"}
+
+    # 超過 max-age 的九成後，請求不等待下載，直接沿用舊憑證並在背景更新
+    clock.now += MAX_AGE * 0.95
+    assert await cache.get_certs(client, "key-1") == {"key-1": "cert-1"}
+    assert cache._refresh_task is not None
+    await cache._refresh_task
+
+    assert certs_stub.requests == 2
+    assert await cache.get_certs(client, "key-1") == certs_stub.certs
+    assert certs_stub.requests == 2
+
+
+async def test_refetches_expired_certs_before_returning(certs_stub, clock, client):
+    cache = google_certs.GoogleCertsCache(certs_stub.url)
+    await cache.get_certs(client, "key-1")
+    certs_stub.certs = {"key-2": "cert-2"}
+
+    clock.now += MAX_AGE + 1
+    assert await cache.get_certs(client, "key-2") == {"key-2": "cert-2"}
+    assert certs_stub.requests == 2
+
+
+async def test_keeps_stale_certs_when_refresh_fails(certs_stub, clock, client):
+    cache = google_certs.GoogleCertsCache(certs_stub.url)
+    await cache.get_certs(client, "key-1")
+    certs_stub.status = 503
+
+    clock.now += MAX_AGE + 1
+    assert await cache.get_certs(client, "key-1") == {"key-1": "cert-1"}
+    assert certs_stub.requests == 2
+
+
+async def test_unknown_kid_refetch_is_rate_limited(certs_stub, clock, client):
+    cache = google_certs.GoogleCertsCache(certs_stub.url)
+    await cache.get_certs(client, "key-1")
+    certs_stub.certs = {"key-1": "cert-1", "key-2": "cert-2"}
+
+    # 金鑰輪替時未知的 kid 會重新下載，但間隔不少於 CERTS_MIN_REFETCH_SECONDS
+    assert "key-2" not in await cache.get_certs(client, "key-2")
+    assert certs_stub.requests == 1
+    clock.now += google_certs.CERTS_MIN_REFETCH_SECONDS
+    assert "key-2" in await cache.get_certs(client, "key-2")
+    assert certs_stub.requests == 2
@@ -0,0 +1,114 @@
+import asyncpg
+import httpx
+import pytest
+from fastapi import FastAPI
+import utils.query_logger as query_logger
+from utils.query_logger import (
+    InstrumentedConnection,
+    QueryBudgetExceeded,
+    QueryLoggerMiddleware,
+    record_query,
+)
+from tests.conftest import TEST_DB_URL
+
+
+@pytest.fixture(autouse=True)
+def strict_budget(monkeypatch):
+    # 測試模式：請求的查詢數超過 QUERY_BUDGET 即拋出 QueryBudgetExceeded
+    monkeypatch.setattr(query_logger, "QUERY_BUDGET_STRICT", True)
+    monkeypatch.setattr(query_logger, "QUERY_BUDGET", 5)
+    monkeypatch.setattr(query_logger, "N_PLUS_ONE_THRESHOLD", 3)
+    monkeypatch.setattr(query_logger, "query_stats", {})
+    monkeypatch.setattr(query_logger, "slow_queries", query_logger.deque(maxlen=10))
+    monkeypatch.setattr(
+        query_logger, "n_plus_one_reports", query_logger.deque(maxlen=10)
+    )
+
+
+def build_app(queries: list):
+    app = FastAPI()
+    app.add_middleware(QueryLoggerMiddleware)
+
+    @app.get("/api/orders/{order_id}")
+    async def get_order(order_id: int):
+        for query in queries:
+            record_query(query, 0.001, 1)
+        return {"order_id": order_id}
+
+    return app
+
+
+async def call(app: FastAPI, path: str = "/api/orders/1"):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_within_budget_passes():
+    response = await call(build_app(["SELECT * FROM orders WHERE id = $1"] * 5))
+    assert response.status_code == 200
+
+
+async def test_over_budget_raises_with_top_fingerprints():
+    queries = ["SELECT * FROM orders WHERE id = $1"] + [
+        "SELECT * FROM booking_slots WHERE order_id = $1"
+    ] * 5
+
+    with pytest.raises(QueryBudgetExceeded) as error:
+        await call(build_app(queries))
+
+    message = str(error.value)
+    assert "GET /api/orders/{order_id} 執行了 6 個查詢，超過上限 5" in message
+    assert "5 次：SELECT * FROM booking_slots WHERE order_id = $1" in message
+    assert query_logger.n_plus_one_reports[-1]["count"] == 5
+
+
+async def test_literals_share_a_fingerprint():
+    queries = [f"SELECT * FROM booking_slots WHERE order_id = {i}" for i in range(4)]
+
+    await call(build_app(queries))
+
+    report = query_logger.n_plus_one_reports[-1]
+    assert report["fingerprint"] == "SELECT * FROM booking_slots WHERE order_id = ?"
+    assert report["count"] == 4
+
+
+async def test_budget_and_slow_queries_still_tracked_when_stats_are_full(monkeypatch):
+    # 彙總表已滿只影響新 fingerprint 的彙總，不影響每個請求的檢查
+    monkeypatch.setattr(query_logger, "QUERY_STATS_MAX_FINGERPRINTS", 1)
+    record_query("SELECT 1", 0.001, 1)
+    queries = [f"SELECT * FROM table_{i} WHERE id = $1" for i in range(6)]
+
+    with pytest.raises(QueryBudgetExceeded):
+        await call(build_app(queries))
+
+    record_query("SELECT pg_sleep(1)", 1.0, 1)
+    assert list(query_logger.query_stats) == ["SELECT ?"]
+    assert query_logger.slow_queries[-1]["fingerprint"] == "SELECT pg_sleep(?)"
+
+
+async def test_instrumented_connection_counts_toward_budget():
+    if not TEST_DB_URL:
+        pytest.skip("未設定 TEST_DB_URL")
+    pool = await asyncpg.create_pool(
+        dsn=TEST_DB_URL,
+        min_size=1,
+        max_size=1,
+        connection_class=InstrumentedConnection,
+    )
+    app = FastAPI()
+    app.add_middleware(QueryLoggerMiddleware)
+
+    @app.get("/api/n-plus-one")
+    async def n_plus_one():
+        async with pool.acquire() as conn:
+            for i in range(6):
+                await conn.fetchval("SELECT $1::int", i)
+        return {}
+
+    try:
+        with pytest.raises(QueryBudgetExceeded) as error:
+            await call(app, "/api/n-plus-one")
+    finally:
+        await pool.close()
+    assert "6 次：SELECT $1::int" in str(error.value)
@@ -3,11 +3,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 import jwt
 import os
-from google.auth.transport import requests
-from google.oauth2 import id_token as google_id_token
+from utils.google_certs import verify_google_id_token
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta
-from utils.dependencies import get_connection
+from utils.dependencies import get_db_pool
+from cachetools import TTLCache
 import asyncpg
 
 TAIPEI_TZ = ZoneInfo("Asia/Taipei")
@@ -17,11 +17,29 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
 security = HTTPBearer(auto_error=False)
 
+USER_CLAIMS_CACHE_SIZE = int(os.getenv("USER_CLAIMS_CACHE_SIZE", 10000))
+USER_CLAIMS_CACHE_TTL_SECONDS = int(os.getenv("USER_CLAIMS_CACHE_TTL_SECONDS", 60))
+# 以 user id 快取使用者資料，避免每個請求都查詢 users；
+# 資料異動時由 users 資料表的 trigger 透過 NOTIFY 通知各實例失效
+user_claims_cache = TTLCache(
+    maxsize=USER_CLAIMS_CACHE_SIZE, ttl=USER_CLAIMS_CACHE_TTL_SECONDS
+)
+_claims_generation = 0
+
+
+def invalidate_user_claims(user_id: int = None):
+    global _claims_generation
+    _claims_generation += 1
+    if user_id is None:
+        user_claims_cache.clear()
+    else:
+        user_claims_cache.pop(user_id, None)
+
 
 async def get_current_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: asyncpg.Connection = Depends(get_connection),
+    pool: asyncpg.Pool = Depends(get_db_pool),
 ):
     if not credentials:
         return None
@@ -30,14 +48,22 @@ async def get_current_user(
         user_id = payload.get("user_id")
         if not user_id:
             return None
-        select_query = "SELECT * FROM users WHERE id = $1"
-        user_data = await db.fetchrow(
-            select_query,
-            user_id,
-        )
-        if not user_data:
-            return None
-        return dict(user_data) if user_data else None
+        user_data = user_claims_cache.get(user_id)
+        if user_data is None:
+            generation = _claims_generation
+            async with pool.acquire() as db:
+                select_query = "SELECT * FROM users WHERE id = $1"
+                record = await db.fetchrow(
+                    select_query,
+                    user_id,
+                )
+            if not record:
+                return None
+            user_data = dict(record)
+            # 查詢期間若有資料異動通知，不寫入可能已過期的資料
+            if generation == _claims_generation:
+                user_claims_cache[user_id] = user_data
+        return dict(user_data)
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
         return None
     except Exception as e:
@@ -57,11 +83,9 @@ async def require_admin(admin_user: dict = Depends(require_auth)):
     return admin_user
 
 
-async def verify_google_token(id_token: str):
+async def verify_google_token(id_token: str, http_client):
     try:
-        id_info = google_id_token.verify_oauth2_token(
-            id_token, requests.Request(), GOOGLE_CLIENT_ID
-        )
+        id_info = await verify_google_id_token(id_token, http_client, GOOGLE_CLIENT_ID)
         if not id_info.get("email_verified", False):
             raise HTTPException(status_code=401, detail="Google 帳號 email 未驗證")
         required_fields = ["sub", "email"]
@@ -71,6 +95,8 @@ async def verify_google_token(id_token: str):
                     status_code=401, detail=f"Token 缺少必要欄位: {field}"
                 )
         return id_info
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=401, detail=f"無效的 Google Token: {str(e)}")
     except Exception as e:
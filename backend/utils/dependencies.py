@@ -1,15 +1,128 @@
 import asyncpg
+import inspect
 from fastapi import Request, HTTPException
 import httpx
+import time
+from utils.metrics import (
+    pool_wait_seconds,
+    pool_checkout_seconds,
+    db_queries_per_request,
+)
 
 
-async def get_connection(request: Request):
+class LazyTransaction:
+    def __init__(self, connection, kwargs: dict):
+        self._connection = connection
+        self._kwargs = kwargs
+        self._transaction = None
+
+    async def __aenter__(self):
+        conn = await self._connection._acquire()
+        self._transaction = conn.transaction(**self._kwargs)
+        await self._transaction.__aenter__()
+        self._connection._transaction_depth += 1
+        return self._transaction
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._connection._transaction_depth -= 1
+        return await self._transaction.__aexit__(exc_type, exc, tb)
+
+
+class LazyConnection:
+    # 第一次查詢時才向連線池取得連線，呼叫外部服務前可先歸還。
+    # 查詢數由 InstrumentedConnection 記入 query_logger 的 RequestQueries，這裡不另外計算
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+        self._conn = None
+        self._acquired_at = None
+        self._transaction_depth = 0
+
+    async def _acquire(self):
+        if self._conn is None:
+            started = time.perf_counter()
+            self._conn = await self._pool.acquire()
+            self._acquired_at = time.perf_counter()
+            pool_wait_seconds.observe(self._acquired_at - started)
+        return self._conn
+
+    async def release(self):
+        # 交易進行中不能歸還，直接忽略
+        if self._conn is None or self._transaction_depth:
+            return
+        await self._release()
+
+    async def _release(self):
+        conn, self._conn = self._conn, None
+        pool_checkout_seconds.observe(time.perf_counter() - self._acquired_at)
+        await self._pool.release(conn)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._release()
+
+    async def execute(self, *args, **kwargs):
+        conn = await self._acquire()
+        return await conn.execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        conn = await self._acquire()
+        return await conn.executemany(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        conn = await self._acquire()
+        return await conn.fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        conn = await self._acquire()
+        return await conn.fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        conn = await self._acquire()
+        return await conn.fetchval(*args, **kwargs)
+
+    def transaction(self, **kwargs):
+        return LazyTransaction(self, kwargs)
+
+    def __getattr__(self, name: str):
+        # 其餘 asyncpg Connection API：已取得連線時直接轉交；尚未取得時，
+        # coroutine 方法（add_listener、copy_records_to_table 等）先取得連線再呼叫，
+        # cursor 等同步方法須在交易或查詢之後使用
+        attribute = getattr(asyncpg.Connection, name)
+        if self._conn is not None:
+            return getattr(self._conn, name)
+        if not inspect.iscoroutinefunction(attribute):
+            raise AttributeError(
+                f"LazyConnection.{name} 需要已取得的連線，請在交易內或查詢之後使用"
+            )
+
+        async def call(*args, **kwargs):
+            conn = await self._acquire()
+            return await getattr(conn, name)(*args, **kwargs)
+
+        return call
+
+
+async def release_connection(db):
+    # 呼叫 Stripe、S3 等外部服務前歸還連線，之後的查詢會重新取得
+    if isinstance(db, LazyConnection):
+        await db.release()
+
+
+def get_db_pool(request: Request):
     if not hasattr(request.app.state, "db_pool") or not request.app.state.db_pool:
         print("無法取得資料庫連線池")
         raise HTTPException(status_code=503, detail="資料庫服務不可用")
     pool: asyncpg.Pool = request.app.state.db_pool
-    async with pool.acquire() as connection:
+    return pool
+
+
+async def get_connection(request: Request):
+    pool = get_db_pool(request)
+    connection = LazyConnection(pool)
+    try:
         yield connection
+    finally:
+        await connection.close()
 
 
 async def get_http_client(request: Request):
@@ -21,3 +134,19 @@ async def get_http_client(request: Request):
         raise HTTPException(status_code=503, detail="httpx.AsyncClient 服務不可用")
     client: httpx.AsyncClient = request.app.state.http_client
     return client
+
+
+def get_pool_stats(pool: asyncpg.Pool):
+    return {
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+        "wait_seconds": pool_wait_seconds.snapshot(),
+        "checkout_seconds": pool_checkout_seconds.snapshot(),
+        # 由 QueryLoggerMiddleware 依每個請求的 RequestQueries 記錄
+        "queries_per_request": {
+            route: histogram.snapshot()
+            for (route,), histogram in sorted(db_queries_per_request.children.items())
+        },
+    }
@@ -1,6 +1,7 @@
 import httpx
 import os
 from dotenv import load_dotenv
+from utils.metrics import track_external_call
 
 load_dotenv()
 
@@ -11,7 +12,8 @@ BASE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 async def get_coordinates(address: str, client: httpx.AsyncClient):
     params = {"address": address, "key": GOOGLE_MAPS_API_KEY, "language": "zh-TW"}
     try:
-        response = await client.get(BASE_URL, params=params)
+        with track_external_call("google", "geocode"):
+            response = await client.get(BASE_URL, params=params)
         response.raise_for_status()
         data = response.json()
         if data["status"] == "OK":
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import re
+import time
+from google.auth import jwt as google_jwt
+from utils.metrics import track_external_call
+
+# Google 簽章憑證（kid -> PEM），測試時可指向本地的憑證 stub
+GOOGLE_CERTS_URL = os.getenv(
+    "GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs"
+)
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+CERTS_DEFAULT_MAX_AGE_SECONDS = 3600
+# 快取時效經過九成後，後續請求照常使用舊憑證，同時在背景更新
+CERTS_REFRESH_RATIO = 0.9
+# 遇到未知的 kid（金鑰輪替）時重新下載的最短間隔，避免偽造 token 觸發大量請求
+CERTS_MIN_REFETCH_SECONDS = 30
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class GoogleCertsCache:
+    def __init__(self, url: str):
+        self.url = url
+        self._certs = {}
+        self._fetched_at = 0.0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    async def _fetch(self, client):
+        with track_external_call("google", "certs"):
+            response = await client.get(self.url)
+        response.raise_for_status()
+        match = MAX_AGE_PATTERN.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else CERTS_DEFAULT_MAX_AGE_SECONDS
+        self._certs = response.json()
+        self._fetched_at = time.monotonic()
+        self._refresh_at = self._fetched_at + max_age * CERTS_REFRESH_RATIO
+        self._expires_at = self._fetched_at + max_age
+
+    async def _refresh(self, client, still_needed):
+        # 同時只有一個請求下載憑證，其餘請求等待後直接使用新結果
+        async with self._lock:
+            if still_needed():
+                await self._fetch(client)
+
+    async def _background_refresh(self, client):
+        try:
+            await self._refresh(
+                client, lambda: time.monotonic() >= self._refresh_at
+            )
+        except Exception as e:
+            print(f"背景更新 Google 憑證失敗: {e}")
+
+    async def get_certs(self, client, kid: str):
+        now = time.monotonic()
+        if now >= self._expires_at:
+            try:
+                await self._refresh(
+                    client, lambda: time.monotonic() >= self._expires_at
+                )
+            except Exception as e:
+                if not self._certs:
+                    raise
+                print(f"更新 Google 憑證失敗，暫時沿用舊憑證: {e}")
+        elif kid not in self._certs:
+            await self._refresh(
+                client,
+                lambda: kid not in self._certs
+                and time.monotonic() - self._fetched_at >= CERTS_MIN_REFETCH_SECONDS,
+            )
+        elif now >= self._refresh_at and (
+            self._refresh_task is None or self._refresh_task.done()
+        ):
+            self._refresh_task = asyncio.create_task(self._background_refresh(client))
+        return self._certs
+
+
+google_certs_cache = GoogleCertsCache(GOOGLE_CERTS_URL)
+
+
+async def verify_google_id_token(id_token: str, client, audience: str):
+    kid = google_jwt.decode_header(id_token).get("kid")
+    certs = await google_certs_cache.get_certs(client, kid)
+    # 憑證已在記憶體中，簽章與欄位驗證皆為純 CPU 運算
+    id_info = google_jwt.decode(id_token, certs=certs, audience=audience)
+    if id_info.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"錯誤的 token 發行者: {id_info.get('iss')}")
+    return id_info
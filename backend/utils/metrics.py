@@ -0,0 +1,194 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import os
+import time
+from utils.tracing import get_route_label, span
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0,
+            "buckets": buckets,
+        }
+
+
+class HistogramFamily:
+    # 以標籤值區分的一組 Histogram，標籤值須為有限集合（路由樣板、工作名稱等）
+    def __init__(self, label_names: tuple, buckets: tuple):
+        self.label_names = label_names
+        self.buckets = buckets
+        self.children = {}
+
+    def labels(self, *values):
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+
+# 等待取得連線池連線的時間，持續偏高代表連線池不足
+pool_wait_seconds = Histogram(
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+# 請求從取得到歸還連線的持有時間
+pool_checkout_seconds = Histogram(
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+http_request_seconds = HistogramFamily(("method", "route", "status"), LATENCY_BUCKETS)
+# 每個請求執行的查詢數（query_logger 的 RequestQueries），數值隨資料量成長的路由即為 N+1
+db_queries_per_request = HistogramFamily(
+    ("route",), (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+)
+background_job_seconds = HistogramFamily(
+    ("job", "status"), (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+)
+external_call_seconds = HistogramFamily(
+    ("service", "operation", "outcome"), LATENCY_BUCKETS
+)
+
+METRICS = [
+    (
+        "http_request_duration_seconds",
+        "HTTP 請求處理時間（依路由樣板）",
+        http_request_seconds,
+    ),
+    (
+        "db_queries_per_request",
+        "每個請求的資料庫查詢數",
+        db_queries_per_request,
+    ),
+    (
+        "db_pool_acquire_wait_seconds",
+        "等待取得連線池連線的時間",
+        pool_wait_seconds,
+    ),
+    (
+        "db_pool_checkout_seconds",
+        "請求持有連線池連線的時間",
+        pool_checkout_seconds,
+    ),
+    (
+        "background_job_duration_seconds",
+        "背景工作每次執行的時間",
+        background_job_seconds,
+    ),
+    (
+        "external_call_duration_seconds",
+        "外部服務（Stripe、Google、Resend、S3）呼叫時間",
+        external_call_seconds,
+    ),
+]
+
+
+@contextmanager
+def track_external_call(service: str, operation: str):
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        with span(f"{service}.{operation}", "external", service=service):
+            yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        external_call_seconds.labels(service, operation, outcome).observe(
+            time.perf_counter() - started
+        )
+
+
+class MetricsMiddleware:
+    # 純 ASGI middleware，不包裝 request / response，串流回應也不受影響
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_seconds.labels(
+                scope["method"], get_route_label(scope), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+def escape_label_value(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(pairs: list):
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{escape_label_value(str(value))}"' for name, value in pairs)
+    return f"{{{body}}}"
+
+
+def render_histogram(lines: list, name: str, pairs: list, histogram: Histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+        cumulative += count
+        lines.append(
+            f"{name}_bucket{format_labels(pairs + [('le', bound)])} {cumulative}"
+        )
+    lines.append(f"{name}_bucket{format_labels(pairs + [('le', '+Inf')])} {histogram.count}")
+    lines.append(f"{name}_sum{format_labels(pairs)} {histogram.sum}")
+    lines.append(f"{name}_count{format_labels(pairs)} {histogram.count}")
+
+
+def render_metrics(gauges: dict):
+    # Prometheus text exposition format 0.0.4
+    lines = []
+    for name, documentation, metric in METRICS:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} histogram")
+        if isinstance(metric, HistogramFamily):
+            for values, histogram in list(metric.children.items()):
+                pairs = list(zip(metric.label_names, values))
+                render_histogram(lines, name, pairs, histogram)
+        else:
+            render_histogram(lines, name, [], metric)
+    for name, (documentation, value) in gauges.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,202 @@
+from collections import Counter
+from fastapi import HTTPException
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+
+PROFILE_MAX_SECONDS = 60
+# 每次取樣約數十微秒，預設 5 ms 間隔的額外負擔約 1% CPU
+PROFILE_DEFAULT_INTERVAL_MS = 5
+PROFILE_MAX_DEPTH = 128
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# event loop 等待 I/O、執行緒池等待工作時的最內層 frame，不列入取樣結果
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+}
+
+_profile_lock = asyncio.Lock()
+
+
+def format_filename(filename: str):
+    if filename.startswith(BACKEND_DIR):
+        return os.path.relpath(filename, BACKEND_DIR)
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+class StackCollector:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.labels = {}
+        self.thread_names = {}
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = (
+                f"{code.co_qualname} ({format_filename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def _thread_name(self, thread_id: int):
+        if thread_id not in self.thread_names:
+            self.thread_names.update(
+                {thread.ident: thread.name for thread in threading.enumerate()}
+            )
+        return self.thread_names.setdefault(thread_id, str(thread_id))
+
+    def _collect(self, frame, thread_id: int = None):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            self.idle_samples += 1
+            return
+        stack = []
+        while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if thread_id is not None:
+            stack.append(self._thread_name(thread_id))
+        stack.reverse()
+        self.stacks[";".join(stack)] += 1
+
+
+class SignalSampler(StackCollector):
+    # ITIMER_PROF 依行程實際使用的 CPU 時間觸發 SIGPROF，handler 在主執行緒（event loop）
+    # 的下一個 bytecode 執行，取得的正是當下執行中的 frame；閒置等待 I/O 時不會取樣
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._previous_handler = None
+
+    def _handle(self, signum, frame):
+        self.samples += 1
+        if frame is not None:
+            self._collect(frame)
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._handle)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    async def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+
+class ThreadSampler(StackCollector):
+    # 以獨立執行緒定期讀取 sys._current_frames()，可取樣所有執行緒並包含等待時間（wall time）。
+    # 取樣執行緒須取得 GIL 才能執行，結果會偏向 event loop 釋放 GIL 的位置（系統呼叫等）
+    def __init__(self, interval: float, target_thread_id: int, all_threads: bool):
+        super().__init__(interval)
+        self.target_thread_id = target_thread_id
+        self.all_threads = all_threads
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    async def stop(self):
+        # 取樣執行緒最多再等一個取樣間隔即結束；在執行緒池等待，不阻塞 event loop
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join, 1.0)
+        if self._thread.is_alive():
+            print("取樣執行緒未在時限內結束")
+
+    def _run(self):
+        sampler_id = threading.get_ident()
+        next_sample = time.perf_counter()
+        while not self._stop.is_set():
+            frames = sys._current_frames()
+            self.samples += 1
+            if self.all_threads:
+                for thread_id, frame in frames.items():
+                    if thread_id != sampler_id:
+                        self._collect(frame, thread_id)
+            else:
+                frame = frames.get(self.target_thread_id)
+                if frame is not None:
+                    self._collect(frame)
+            del frames
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_sample = time.perf_counter()
+
+
+def cpu_mode_available():
+    # signal 只能在主執行緒註冊；Windows 沒有 setitimer
+    return (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+def render_collapsed(stacks: Counter):
+    # Brendan Gregg 的 collapsed 格式，可直接交給 flamegraph.pl 或 speedscope
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def summarize_stacks(stacks: Counter, limit: int):
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+    return {
+        "top_self": [
+            {"function": frame, "samples": count}
+            for frame, count in self_counts.most_common(limit)
+        ],
+        "top_total": [
+            {"function": frame, "samples": count}
+            for frame, count in total_counts.most_common(limit)
+        ],
+    }
+
+
+async def run_profile(seconds: float, interval_ms: float, mode: str, all_threads: bool):
+    # 同一 worker 同時只允許一個取樣，避免重複的取樣器疊加負擔
+    if _profile_lock.locked():
+        return None
+    if mode == "cpu" and not cpu_mode_available():
+        raise HTTPException(
+            status_code=400, detail="此 worker 無法使用 CPU 取樣，請改用 wall 模式"
+        )
+    async with _profile_lock:
+        if mode == "cpu":
+            sampler = SignalSampler(interval_ms / 1000)
+        else:
+            sampler = ThreadSampler(
+                interval_ms / 1000, threading.get_ident(), all_threads
+            )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await sampler.stop()
+        return {
+            "pid": os.getpid(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "mode": mode,
+            "interval_ms": interval_ms,
+            "samples": sampler.samples,
+            "idle_samples": sampler.idle_samples,
+            "stacks": sampler.stacks,
+        }
@@ -0,0 +1,250 @@
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import asyncpg
+import os
+import re
+import time
+from utils.metrics import db_queries_per_request
+from utils.tracing import get_route_label, record_span
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+# 同一請求內相同 fingerprint 執行超過此次數即視為 N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 100))
+# 測試時設為 true，請求的查詢數超過 QUERY_BUDGET 會直接拋出 QueryBudgetExceeded
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+QUERY_STATS_MAX_FINGERPRINTS = 1000
+RECENT_REPORTS_LIMIT = 100
+
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+query_stats = {}
+slow_queries = deque(maxlen=RECENT_REPORTS_LIMIT)
+n_plus_one_reports = deque(maxlen=RECENT_REPORTS_LIMIT)
+
+current_request_queries = ContextVar("current_request_queries", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def fingerprint_query(query: str):
+    # 以 $n 參數化的查詢本身就是 fingerprint；只把內嵌的字面值換成 ?，並統一空白
+    normalized = STRING_LITERAL.sub("?", query)
+    normalized = NUMBER_LITERAL.sub("?", normalized)
+    normalized = IN_LIST.sub("(?)", normalized)
+    return WHITESPACE.sub(" ", normalized).strip()
+
+
+def parse_status_rows(status: str):
+    # execute 回傳 "UPDATE 3"、"INSERT 0 5" 等狀態字串，最後一段為影響筆數
+    if not status:
+        return 0
+    last = status.rsplit(" ", 1)[-1]
+    return int(last) if last.isdigit() else 0
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = {}
+
+    def repeated(self, threshold: int):
+        return {
+            fingerprint: count
+            for fingerprint, count in self.fingerprints.items()
+            if count > threshold
+        }
+
+
+def record_query(query: str, duration: float, rows: int):
+    fingerprint = fingerprint_query(query)
+    if fingerprint.startswith(TRANSACTION_STATEMENTS):
+        return
+    record_span(
+        "db.query",
+        "db",
+        time.perf_counter() - duration,
+        duration,
+        statement=fingerprint[:300],
+        rows=rows,
+    )
+    stats = query_stats.get(fingerprint)
+    # 彙總表已滿時只略過新 fingerprint 的彙總，請求計數與慢查詢記錄照常進行
+    if stats is None and len(query_stats) < QUERY_STATS_MAX_FINGERPRINTS:
+        stats = query_stats[fingerprint] = {
+            "calls": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "rows": 0,
+        }
+    if stats is not None:
+        stats["calls"] += 1
+        stats["total_seconds"] += duration
+        stats["rows"] += rows
+        if duration > stats["max_seconds"]:
+            stats["max_seconds"] = duration
+    request_queries = current_request_queries.get()
+    if request_queries is not None:
+        request_queries.count += 1
+        request_queries.duration += duration
+        request_queries.fingerprints[fingerprint] = (
+            request_queries.fingerprints.get(fingerprint, 0) + 1
+        )
+    if duration * 1000 >= SLOW_QUERY_MS:
+        print(f"慢查詢 {duration * 1000:.1f} ms，{rows} 筆：{fingerprint[:200]}")
+        slow_queries.append(
+            {
+                "fingerprint": fingerprint,
+                "duration_ms": round(duration * 1000, 1),
+                "rows": rows,
+                "recorded_at": datetime.now(TAIPEI_TZ),
+            }
+        )
+
+
+class InstrumentedConnection(asyncpg.Connection):
+    # 由 create_pool 的 connection_class 套用，連線池與專用連線上的每個查詢都會記錄
+    _resetting = False
+
+    async def execute(self, query: str, *args, timeout=None):
+        if self._resetting:
+            return await super().execute(query, *args, timeout=timeout)
+        started = time.perf_counter()
+        status = None
+        try:
+            status = await super().execute(query, *args, timeout=timeout)
+            return status
+        finally:
+            record_query(query, time.perf_counter() - started, parse_status_rows(status))
+
+    async def executemany(self, command: str, args, *, timeout=None):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(command, args, timeout=timeout)
+        finally:
+            record_query(command, time.perf_counter() - started, len(args))
+
+    async def fetch(self, query, *args, timeout=None, record_class=None):
+        started = time.perf_counter()
+        records = None
+        try:
+            records = await super().fetch(
+                query, *args, timeout=timeout, record_class=record_class
+            )
+            return records
+        finally:
+            record_query(query, time.perf_counter() - started, len(records or ()))
+
+    async def fetchrow(self, query, *args, timeout=None, record_class=None):
+        started = time.perf_counter()
+        record = None
+        try:
+            record = await super().fetchrow(
+                query, *args, timeout=timeout, record_class=record_class
+            )
+            return record
+        finally:
+            record_query(
+                query, time.perf_counter() - started, 0 if record is None else 1
+            )
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        started = time.perf_counter()
+        rows = 0
+        try:
+            value = await super().fetchval(
+                query, *args, column=column, timeout=timeout
+            )
+            rows = 1
+            return value
+        finally:
+            record_query(query, time.perf_counter() - started, rows)
+
+    async def reset(self, *, timeout=None):
+        # 歸還連線池時的重設查詢不屬於任何請求，不記錄
+        self._resetting = True
+        try:
+            await super().reset(timeout=timeout)
+        finally:
+            self._resetting = False
+
+
+class QueryLoggerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_queries = RequestQueries()
+        token = current_request_queries.set(request_queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_queries.reset(token)
+        check_request_queries(scope, request_queries)
+
+
+def check_request_queries(scope, request_queries: RequestQueries):
+    db_queries_per_request.labels(get_route_label(scope)).observe(request_queries.count)
+    route = f"{scope['method']} {get_route_label(scope)}"
+    repeated = request_queries.repeated(N_PLUS_ONE_THRESHOLD)
+    for fingerprint, count in repeated.items():
+        print(f"疑似 N+1 查詢：{route} 執行 {count} 次：{fingerprint[:200]}")
+        n_plus_one_reports.append(
+            {
+                "route": route,
+                "fingerprint": fingerprint,
+                "count": count,
+                "request_queries": request_queries.count,
+                "recorded_at": datetime.now(TAIPEI_TZ),
+            }
+        )
+    if QUERY_BUDGET_STRICT and request_queries.count > QUERY_BUDGET:
+        top = sorted(
+            request_queries.fingerprints.items(), key=lambda item: item[1], reverse=True
+        )[:5]
+        details = "\n".join(f"  {count} 次：{fingerprint}" for fingerprint, count in top)
+        raise QueryBudgetExceeded(
+            f"{route} 執行了 {request_queries.count} 個查詢，超過上限 {QUERY_BUDGET}\n{details}"
+        )
+
+
+def get_query_stats(limit: int = 20):
+    top = sorted(
+        query_stats.items(), key=lambda item: item[1]["total_seconds"], reverse=True
+    )[:limit]
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "fingerprints": len(query_stats),
+        "top_queries": [
+            {
+                "fingerprint": fingerprint,
+                "calls": stats["calls"],
+                "rows": stats["rows"],
+                "total_ms": round(stats["total_seconds"] * 1000, 1),
+                "avg_ms": round(stats["total_seconds"] * 1000 / stats["calls"], 3),
+                "max_ms": round(stats["max_seconds"] * 1000, 1),
+            }
+            for fingerprint, stats in top
+        ],
+        "slow_queries": list(slow_queries)[::-1],
+        "n_plus_one": list(n_plus_one_reports)[::-1],
+    }
@@ -0,0 +1,272 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+
+# 每筆 trace 寫成一行 JSON；設為空字串即停用匯出，仍保留記憶體中的近期 trace。
+# 預設只匯出超過 500ms 的慢 trace；檔案超過 TRACE_EXPORT_MAX_BYTES 時輪替，
+# 保留 TRACE_EXPORT_BACKUPS 個舊檔（traces.jsonl.1、.2…），磁碟用量有上限
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces/traces.jsonl")
+TRACE_EXPORT_MIN_MS = float(os.getenv("TRACE_EXPORT_MIN_MS", 500))
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", 50 * 1024 * 1024))
+TRACE_EXPORT_BACKUPS = int(os.getenv("TRACE_EXPORT_BACKUPS", 3))
+TRACE_EXPORT_QUEUE_SIZE = 1000
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 500))
+MAX_SPANS_PER_TRACE = 1000
+
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{8,32}$")
+
+current_trace = ContextVar("current_trace", default=None)
+current_span_id = ContextVar("current_span_id", default=None)
+
+recent_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_export_queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+_export_thread = None
+dropped_exports = 0
+
+
+def get_route_label(scope: dict):
+    # 使用路由樣板（/api/admin/order/{order_id}）而非實際路徑，避免標籤數量無限成長
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class Trace:
+    def __init__(self, name: str, kind: str, trace_id: str = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.kind = kind
+        self.started_at = datetime.now(TAIPEI_TZ)
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.attributes = {}
+        self.spans = []
+        self.dropped_spans = 0
+        self.error = None
+        self.discarded = False
+
+    def add_span(self, name: str, kind: str, started: float, attributes: dict):
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return None
+        span = {
+            "span_id": len(self.spans) + 1,
+            "parent_id": current_span_id.get(),
+            "name": name,
+            "kind": kind,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": None,
+            "attributes": attributes,
+            "error": None,
+        }
+        self.spans.append(span)
+        return span
+
+    def discard(self):
+        # 背景工作空轉（沒有取得任何工作）時不保留 trace
+        self.discarded = True
+
+    def to_dict(self, include_spans: bool = True):
+        trace = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "kind": self.kind,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "span_count": len(self.spans),
+            "dropped_spans": self.dropped_spans,
+            "error": self.error,
+        }
+        if include_spans:
+            trace["spans"] = self.spans
+        return trace
+
+
+def record_span(name: str, kind: str, started: float, duration: float, **attributes):
+    # 已知開始時間與耗時的 span（例如資料庫查詢），記錄於目前的 span 之下
+    trace = current_trace.get()
+    if trace is None:
+        return
+    span = trace.add_span(name, kind, started, attributes)
+    if span is not None:
+        span["duration_ms"] = round(duration * 1000, 3)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    started = time.perf_counter()
+    record = trace.add_span(name, kind, started, attributes)
+    token = current_span_id.set(record["span_id"]) if record else None
+    try:
+        yield record
+    except BaseException as e:
+        if record:
+            record["error"] = type(e).__name__
+        raise
+    finally:
+        if token is not None:
+            current_span_id.reset(token)
+        if record:
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+
+@contextmanager
+def start_trace(name: str, kind: str, trace_id: str = None):
+    trace = Trace(name, kind, trace_id)
+    trace_token = current_trace.set(trace)
+    span_token = current_span_id.set(None)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = type(e).__name__
+        raise
+    finally:
+        current_span_id.reset(span_token)
+        current_trace.reset(trace_token)
+        trace.duration = time.perf_counter() - trace.started
+        if not trace.discarded:
+            finish_trace(trace)
+
+
+def finish_trace(trace: Trace):
+    recent_traces.append(trace)
+    if TRACE_EXPORT_PATH and trace.duration * 1000 >= TRACE_EXPORT_MIN_MS:
+        export_trace(trace)
+
+
+def export_trace(trace: Trace):
+    # 序列化與寫檔交給背景執行緒，不在事件迴圈上做磁碟 I/O；佇列已滿時捨棄並計數
+    global _export_thread, dropped_exports
+    if _export_thread is None:
+        _export_thread = threading.Thread(
+            target=_export_worker, name="trace-exporter", daemon=True
+        )
+        _export_thread.start()
+    try:
+        _export_queue.put_nowait(trace)
+    except queue.Full:
+        dropped_exports += 1
+
+
+def _rotate_export_file():
+    for index in range(TRACE_EXPORT_BACKUPS - 1, 0, -1):
+        source = f"{TRACE_EXPORT_PATH}.{index}"
+        if os.path.exists(source):
+            os.replace(source, f"{TRACE_EXPORT_PATH}.{index + 1}")
+    if TRACE_EXPORT_BACKUPS > 0:
+        os.replace(TRACE_EXPORT_PATH, f"{TRACE_EXPORT_PATH}.1")
+    else:
+        os.remove(TRACE_EXPORT_PATH)
+
+
+def _export_worker():
+    export_file = None
+    while True:
+        trace = _export_queue.get()
+        if trace is None:
+            break
+        try:
+            line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n"
+            if export_file is None:
+                directory = os.path.dirname(TRACE_EXPORT_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                export_file = open(TRACE_EXPORT_PATH, "a", encoding="utf-8")
+            if (
+                TRACE_EXPORT_MAX_BYTES
+                and export_file.tell() > 0
+                and export_file.tell() + len(line.encode("utf-8")) > TRACE_EXPORT_MAX_BYTES
+            ):
+                export_file.close()
+                export_file = None
+                _rotate_export_file()
+                export_file = open(TRACE_EXPORT_PATH, "a", encoding="utf-8")
+            export_file.write(line)
+            if _export_queue.empty():
+                export_file.flush()
+        except Exception as e:
+            print(f"寫入 trace 失敗：{e}")
+    if export_file is not None:
+        export_file.close()
+
+
+def close_trace_exporter(timeout: float = 5.0):
+    # 會等待佇列寫完，請以 asyncio.to_thread 呼叫
+    global _export_thread
+    if _export_thread is None:
+        return
+    try:
+        _export_queue.put(None, timeout=timeout)
+    except queue.Full:
+        print("trace 匯出佇列已滿，略過剩餘的 trace")
+    _export_thread.join(timeout)
+    _export_thread = None
+
+
+class TracingMiddleware:
+    # 每個 HTTP 請求建立一個 trace；可由 X-Trace-Id 標頭沿用呼叫端的 trace id
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = None
+        for key, value in scope["headers"]:
+            if key == b"x-trace-id":
+                incoming = value.decode("latin-1").lower()
+                break
+        if incoming and not TRACE_ID_PATTERN.match(incoming):
+            incoming = None
+
+        with start_trace(scope["path"], "http", incoming) as trace:
+            trace.attributes["method"] = scope["method"]
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    trace.attributes["status"] = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", trace.trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = get_route_label(scope)
+                if route != "unmatched":
+                    trace.name = f"{scope['method']} {route}"
+                trace.attributes["path"] = scope["path"]
+
+
+def get_slowest_traces(limit: int, kind: str = None, include_spans: bool = True):
+    traces = [trace for trace in list(recent_traces) if kind is None or trace.kind == kind]
+    traces.sort(key=lambda trace: trace.duration, reverse=True)
+    return {
+        "buffered": len(recent_traces),
+        "dropped_exports": dropped_exports,
+        "traces": [trace.to_dict(include_spans) for trace in traces[:limit]],
+    }
+
+
+def get_trace(trace_id: str):
+    for trace in reversed(recent_traces):
+        if trace.trace_id == trace_id:
+            return trace.to_dict()
+    return None
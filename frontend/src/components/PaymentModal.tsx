@@ -1,7 +1,8 @@
-import { useQuery } from "@tanstack/react-query";
+import { useQuery, useQueryClient } from "@tanstack/react-query";
 import {
   createCheckoutSession,
-  getPaymentStatus,
+  waitForPaymentStatus,
+  type PaymentStatusResponse,
 } from "../services/paymentAPI";
 
 interface PaymentModalProps {
@@ -17,12 +18,22 @@ const PaymentModal = ({
   onPaymentSuccess,
   onClose,
 }: PaymentModalProps) => {
-  if (!isOpen) return null;
-
+  // hooks 必須在提早 return 之前呼叫，關閉時以 enabled 停止查詢
+  const queryClient = useQueryClient();
+  // 長輪詢：後端在狀態變更時立即回應，否則約 50 秒後回傳目前狀態再重新等待
   const { data: paymentStatus } = useQuery({
     queryKey: ["payment-status", orderId],
-    queryFn: () => getPaymentStatus(orderId),
-    refetchInterval: 5000,
+    queryFn: () =>
+      waitForPaymentStatus(
+        orderId,
+        queryClient.getQueryData<PaymentStatusResponse>([
+          "payment-status",
+          orderId,
+        ])
+      ),
+    enabled: isOpen,
+    refetchInterval: (query) =>
+      query.state.data?.payment_status === "paid" ? false : 1000,
   });
 
   const {
@@ -32,9 +43,12 @@ const PaymentModal = ({
   } = useQuery({
     queryKey: ["checkout-session", orderId],
     queryFn: () => createCheckoutSession(orderId),
-    enabled: !!orderId && paymentStatus?.payment_status === "unpaid",
+    enabled:
+      isOpen && !!orderId && paymentStatus?.payment_status === "unpaid",
   });
 
+  if (!isOpen) return null;
+
   const handlePayment = () => {
     if (checkoutSession?.session_url) {
       window.location.href = checkoutSession.session_url;
@@ -1,8 +1,15 @@
 import { useState, useEffect, type ReactNode } from "react";
-import { useQuery, useQueryClient } from "@tanstack/react-query";
 import {
+  useQuery,
+  useInfiniteQuery,
+  useQueryClient,
+} from "@tanstack/react-query";
+import {
+  getAdminDashboard,
   getAllOrders,
   getAllUsers,
+  searchUsers,
+  searchOrders,
   getOrderByAdmin,
   getUserOrdersByAdmin,
   scheduleOrderByAdmin,
@@ -11,8 +18,9 @@ import {
   uploadCompletionFileByAdmin,
   getCompletionFileByAdmin,
   updateCompletionStatusByAdmin,
+  type AdminDashboardCard,
+  type AdminDashboardBucket,
 } from "../services/adminAPI";
-import { type OrderDetail } from "../services/orderAPI";
 import {
   toFrontendPaymentStatus,
   toFrontendOrderStatus,
@@ -30,7 +38,7 @@ type AdminOptionsType =
 type CaseTagType = "等待排程" | "七日內" | "二週內" | "二週以上" | "取消申請中";
 
 interface OrderCardProps {
-  order: OrderDetail;
+  order: AdminDashboardCard;
   onClick: () => void;
 }
 interface RefundConfirmModalProps {
@@ -48,6 +56,9 @@ interface CompletionUploaModalProps {
   isUploading?: boolean;
 }
 
+// 與後端 services/search_service.py 的 SEARCH_MIN_LENGTH 相同
+const SEARCH_MIN_LENGTH = 2;
+
 const adminOptions: AdminOptionsType[] = ["未完工追蹤", "會員名冊", "訂單總表"];
 const caseTags: CaseTagType[] = [
   "等待排程",
@@ -56,6 +67,13 @@ const caseTags: CaseTagType[] = [
   "二週以上",
   "取消申請中",
 ];
+const caseTagBuckets: Record<CaseTagType, AdminDashboardBucket> = {
+  等待排程: "awaiting_schedule",
+  七日內: "within_7_days",
+  二週內: "within_14_days",
+  二週以上: "beyond_14_days",
+  取消申請中: "cancel_requested",
+};
 
 const RefundConfirmModal: React.FC<RefundConfirmModalProps> = ({
   show,
@@ -180,11 +198,11 @@ const AdminPage = () => {
   const [orderId, setOrderId] = useState<number | null>(null);
   const [userId, setUserId] = useState<number | null>(null);
   // const [usersPage, setUsersPage] = useState<number>(1);
-  const [ordersPage, setOrdersPage] = useState<number>(1);
   const [searchUser, setSearchUser] = useState<string>("");
   const [orderStatus, setOrderStatus] = useState<string>("");
   const [paymentStatus, setPaymentStatus] = useState<string>("");
   const [serviceType, setServiceType] = useState<string>("");
+  const [searchOrder, setSearchOrder] = useState<string>("");
   const [isScheduling, setIsScheduling] = useState(false);
   const [showRefundConfirm, setShowRefundConfirm] = useState(false);
   const [showCancelConfirm, setShowCancelConfirm] = useState(false);
@@ -205,42 +223,70 @@ const AdminPage = () => {
       setOrderStatus("");
       setPaymentStatus("");
       setServiceType("");
-      setOrdersPage(1);
+      setSearchOrder("");
     }
   }, [selectedOption]);
 
-  useEffect(() => {
-    if (selectedOption === "訂單總表") {
-      setOrdersPage(1);
-    }
-  }, [selectedOption, orderStatus, paymentStatus, serviceType]);
-
-  const { data: orders } = useQuery({
+  // 關鍵字達到下限才送出搜尋，搜尋結果依相關度排序
+  const orderKeyword =
+    searchOrder.trim().length >= SEARCH_MIN_LENGTH ? searchOrder.trim() : "";
+  const userKeyword =
+    searchUser.trim().length >= SEARCH_MIN_LENGTH ? searchUser.trim() : "";
+
+  const {
+    data: ordersData,
+    fetchNextPage: fetchMoreOrders,
+    hasNextPage: hasMoreOrders,
+    isFetchingNextPage: isFetchingMoreOrders,
+  } = useInfiniteQuery({
     queryKey: [
       "admin-orders",
       {
         status: orderStatus,
         payment_status: paymentStatus,
-        page: ordersPage,
+        service_type: serviceType,
+        search: orderKeyword,
       },
     ],
-    queryFn: () =>
-      getAllOrders({
-        status: orderStatus || undefined,
-        payment_status: paymentStatus || undefined,
-        page: ordersPage,
-        limit: selectedOption === "未完工追蹤" ? 100 : 20, // 後端上限 100，待處理頁面載入
-      }),
+    queryFn: ({ pageParam }) =>
+      orderKeyword
+        ? searchOrders({
+            q: orderKeyword,
+            status: orderStatus || undefined,
+            payment_status: paymentStatus || undefined,
+            service_type: serviceType || undefined,
+            cursor: pageParam,
+            limit: 20,
+          })
+        : getAllOrders({
+            status: orderStatus || undefined,
+            payment_status: paymentStatus || undefined,
+            service_type: serviceType || undefined,
+            cursor: pageParam,
+            limit: 20,
+          }),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
+    enabled: selectedOption === "訂單總表",
+  });
+
+  const { data: dashboard } = useQuery({
+    queryKey: ["admin-orders", "dashboard"],
+    queryFn: getAdminDashboard,
+    enabled: selectedOption === "未完工追蹤",
   });
+  const orderList = ordersData?.pages.flatMap((page) => page.orders) ?? [];
+  const ordersSummary = ordersData?.pages[0];
 
   const { data: users } = useQuery({
-    queryKey: ["admin-users", { page: 1, search: searchUser }],
+    queryKey: ["admin-users", { page: 1, search: userKeyword }],
     queryFn: () =>
-      getAllUsers({
-        page: 1, // 暫時處置
-        limit: 10,
-        search: searchUser || undefined,
-      }),
+      userKeyword
+        ? searchUsers({ q: userKeyword, limit: 10 })
+        : getAllUsers({
+            page: 1, // 暫時處置
+            limit: 10,
+          }),
   });
   const { data: orderDetail } = useQuery({
     queryKey: ["admin-order-detail", orderId],
@@ -354,9 +400,9 @@ const AdminPage = () => {
       setIsScheduling(true);
       const result = await scheduleOrderByAdmin(orderId);
       if (result.success) {
-        const emailStatus = result.email_sent
-          ? "郵件已發送！"
-          : "郵件發送失敗，請通知會員。";
+        const emailStatus = result.email_queued
+          ? "郵件已排入寄送佇列！"
+          : "郵件排入佇列失敗，請通知會員。";
         alert(`排程成功！${emailStatus}`);
         queryClient.invalidateQueries({
           predicate: (query) =>
@@ -444,9 +490,9 @@ const AdminPage = () => {
       try {
         const result = await cancelOrderByAdmin(orderDetail!.order_id);
         if (result.success) {
-          const emailStatus = result.email_sent
-            ? "郵件已發送！"
-            : "郵件發送失敗，請通知會員。";
+          const emailStatus = result.email_queued
+            ? "郵件已排入寄送佇列！"
+            : "郵件排入佇列失敗，請通知會員。";
           alert(`${result.message}，${emailStatus}`);
           queryClient.invalidateQueries({
             predicate: (query) =>
@@ -491,8 +537,7 @@ const AdminPage = () => {
 
   const OrderCard = ({ order, onClick }: OrderCardProps) => {
     const today = new Date();
-    const bookingDateStr = order.booking_slots[0]?.preferred_date;
-    const bookingDate = new Date(bookingDateStr);
+    const bookingDate = new Date(order.preferred_date);
 
     return (
       <button
@@ -515,10 +560,8 @@ const AdminPage = () => {
         </p>
 
         <p>
-          {order.booking_slots?.length > 0 && order.booking_slots[0]
-            ? String(order.booking_slots[0].preferred_date) +
-              " " +
-              String(order.booking_slots[0].preferred_time.slice(0, 5))
+          {order.preferred_date
+            ? order.preferred_date + " " + order.preferred_time.slice(0, 5)
             : "無日期"}
         </p>
       </button>
@@ -625,52 +668,6 @@ const AdminPage = () => {
     );
   };
 
-  const filterOrdersByCaseTag = (caseTag: CaseTagType) => {
-    if (!orders?.orders) return [];
-    const today = new Date();
-    const sevenDaysFromNow = new Date(today);
-    sevenDaysFromNow.setDate(today.getDate() + 7);
-    const twoWeeksFromNow = new Date(today);
-    twoWeeksFromNow.setDate(today.getDate() + 14);
-    const filtered =
-      orders.orders.filter((order) => {
-        const bookingDateStr = order.booking_slots[0]?.preferred_date;
-        if (!bookingDateStr) return false;
-        const bookingDate = new Date(bookingDateStr);
-        switch (caseTag) {
-          case "等待排程":
-            return (
-              (order.status === "pending_schedule" ||
-                order.status === "scheduling_failed") &&
-              order.payment_status === "paid"
-            );
-          case "七日內":
-            return (
-              order.status === "scheduled" && bookingDate <= sevenDaysFromNow
-            );
-          case "二週內":
-            return (
-              order.status === "scheduled" &&
-              bookingDate > sevenDaysFromNow &&
-              bookingDate <= twoWeeksFromNow
-            );
-          case "二週以上":
-            return (
-              order.status === "scheduled" && bookingDate > twoWeeksFromNow
-            );
-          case "取消申請中":
-            return order.status === "precancel";
-          default:
-            return false;
-        }
-      }) || [];
-    return filtered.sort((a, b) => {
-      const dateA = a.booking_slots[0]?.preferred_date || "";
-      const dateB = b.booking_slots[0]?.preferred_date || "";
-      return dateA.localeCompare(dateB);
-    });
-  };
-
   const userOrdersList = () => {
     if (!userId) {
       return (
@@ -747,7 +744,7 @@ const AdminPage = () => {
         return (
           <div className="grid lg:grid-cols-5 gap-4">
             {caseTags.map((caseTag) => {
-              const filteredOrders = filterOrdersByCaseTag(caseTag);
+              const bucket = dashboard?.buckets[caseTagBuckets[caseTag]];
               return (
                 <div
                   key={caseTag}
@@ -755,8 +752,9 @@ const AdminPage = () => {
                 >
                   <h3 className="p-4 flex justify-center border-b-2 mb-4">
                     {caseTag}
+                    {bucket ? `（${bucket.count}）` : ""}
                   </h3>
-                  {filteredOrders.map((order) => (
+                  {bucket?.cards.map((order) => (
                     <OrderCard
                       key={order.order_id}
                       order={order}
@@ -805,19 +803,23 @@ const AdminPage = () => {
           </div>
         );
       case "訂單總表":
-        const allOrders = orders?.orders || [];
-        const filteredByServiceType = serviceType
-          ? allOrders.filter((order) => order.service_type === serviceType)
-          : allOrders;
-        const sortedOrders =
-          filteredByServiceType.slice().sort((a, b) => {
-            const dateA = a.booking_slots[0]?.preferred_date || "";
-            const dateB = b.booking_slots[0]?.preferred_date || "";
-            return dateB.localeCompare(dateA);
-          }) || [];
+        const sortedOrders = orderKeyword
+          ? orderList
+          : orderList.slice().sort((a, b) => {
+              const dateA = a.booking_slots[0]?.preferred_date || "";
+              const dateB = b.booking_slots[0]?.preferred_date || "";
+              return dateB.localeCompare(dateA);
+            });
         return (
           <div className="space-y-4">
             <div className="space-x-4">
+              <input
+                type="text"
+                placeholder="搜尋訂單編號、地址、聯絡人或電話..."
+                className="px-3 py-2 border border-[var(--color-brand-primary)]/50 rounded-lg mb-4 w-72"
+                value={searchOrder}
+                onChange={(e) => setSearchOrder(e.target.value)}
+              />
               <select
                 value={orderStatus}
                 onChange={(e) => setOrderStatus(e.target.value)}
@@ -854,6 +856,12 @@ const AdminPage = () => {
                 <option value="REPAIR">冷氣維修</option>
               </select>
             </div>
+            {ordersSummary && "total" in ordersSummary && (
+              <p className="text-sm text-[var(--color-text-tertiary)]">
+                {ordersSummary.total_is_estimate ? "約 " : "共 "}
+                {ordersSummary.total.toLocaleString()} 筆訂單
+              </p>
+            )}
             <div className="space-y-3 max-h-[600px] overflow-y-auto">
               {sortedOrders?.map((order) => (
                 <div
@@ -888,6 +896,15 @@ const AdminPage = () => {
                   </div>
                 </div>
               ))}
+              {hasMoreOrders && (
+                <button
+                  onClick={() => fetchMoreOrders()}
+                  disabled={isFetchingMoreOrders}
+                  className="w-full py-2 rounded-lg border border-[var(--color-brand-primary)]/50 text-[var(--color-text-primary)] hover:bg-[var(--color-brand-primary-light)] disabled:opacity-50"
+                >
+                  {isFetchingMoreOrders ? "載入中..." : "載入更多"}
+                </button>
+              )}
             </div>
           </div>
         );
@@ -3,12 +3,12 @@ import { type User } from "../services/authAPI";
 // const API_BASE_URL = "https://cool-slate.ayating.lol/api";
 const API_BASE_URL = "https://coolslate.ayating.lol/api";
 
-interface AdminOrdersResponse {
+export interface AdminOrdersResponse {
   orders: OrderDetail[];
   total: number;
-  page: number;
+  total_is_estimate: boolean;
   limit: number;
-  total_pages: number;
+  next_cursor: string | null;
 }
 
 interface AdminUsersResponse {
@@ -19,6 +19,44 @@ interface AdminUsersResponse {
   total_pages: number;
 }
 
+interface AdminUserSearchResponse {
+  users: (User & { score: number })[];
+  limit: number;
+  next_cursor: string | null;
+}
+
+export interface AdminOrderSearchResponse {
+  orders: (OrderDetail & { score: number })[];
+  limit: number;
+  next_cursor: string | null;
+}
+
+export interface AdminDashboardCard {
+  order_id: number;
+  order_number: string;
+  service_type: string;
+  status: string;
+  payment_status: string;
+  preferred_date: string;
+  preferred_time: string;
+}
+
+export type AdminDashboardBucket =
+  | "awaiting_schedule"
+  | "within_7_days"
+  | "within_14_days"
+  | "beyond_14_days"
+  | "cancel_requested";
+
+interface AdminDashboardResponse {
+  date: string;
+  cards_per_bucket: number;
+  buckets: Record<
+    AdminDashboardBucket,
+    { count: number; cards: AdminDashboardCard[] }
+  >;
+}
+
 interface AdminUserOrdersResponse {
   user: { id: number; name: string; email: string };
   orders: OrderDetail[];
@@ -31,7 +69,7 @@ interface AdminScheduleOrderResponse {
   scheduled_date: string;
   scheduled_time: string;
   estimated_end_time: string;
-  email_sent: boolean;
+  email_queued: boolean;
 }
 interface AdminRefundResponse {
   success: boolean;
@@ -42,7 +80,29 @@ interface AdminRefundResponse {
 interface AdminCancelOrderResponse {
   success: boolean;
   message: string;
-  email_sent: boolean;
+  email_queued: boolean;
+}
+
+interface AdminBulkResult {
+  order_id: number;
+  order_number: string | null;
+  success: boolean;
+  message: string;
+  cleaned_locks?: number;
+  email_queued?: boolean;
+}
+
+interface AdminBulkResponse {
+  succeeded: number;
+  failed: number;
+  results: AdminBulkResult[];
+}
+
+interface AdminUploadUrlResponse {
+  upload_url: string;
+  fields: Record<string, string>;
+  object_key: string;
+  expires_in: number;
 }
 
 interface AdminUploadFileResponse {
@@ -117,6 +177,10 @@ async function apiCall<T>(
   }
 }
 
+export const getAdminDashboard = async (): Promise<AdminDashboardResponse> => {
+  return apiCall<AdminDashboardResponse>("/admin/dashboard", {}, true);
+};
+
 export const getAllUsers = async (params?: {
   page?: number;
   limit?: number;
@@ -135,21 +199,68 @@ export const getAllUsers = async (params?: {
 export const getAllOrders = async (params?: {
   status?: string;
   payment_status?: string;
-  page?: number;
+  service_type?: string;
+  date_from?: string;
+  date_to?: string;
+  cursor?: string;
   limit?: number;
+  exact_count?: boolean;
 }): Promise<AdminOrdersResponse> => {
   const searchParams = new URLSearchParams();
   if (params?.status) searchParams.set("status", params.status);
   if (params?.payment_status)
     searchParams.set("payment_status", params.payment_status);
-  if (params?.page) searchParams.set("page", params.page.toString());
+  if (params?.service_type)
+    searchParams.set("service_type", params.service_type);
+  if (params?.date_from) searchParams.set("date_from", params.date_from);
+  if (params?.date_to) searchParams.set("date_to", params.date_to);
+  if (params?.cursor) searchParams.set("cursor", params.cursor);
   if (params?.limit) searchParams.set("limit", params.limit.toString());
+  if (params?.exact_count) searchParams.set("exact_count", "true");
   const endpoint = `/admin/orders${
     searchParams.toString() ? `?${searchParams}` : ""
   }`;
   return apiCall<AdminOrdersResponse>(endpoint, {}, true);
 };
 
+export const searchUsers = async (params: {
+  q: string;
+  cursor?: string;
+  limit?: number;
+}): Promise<AdminUserSearchResponse> => {
+  const searchParams = new URLSearchParams({ q: params.q });
+  if (params.cursor) searchParams.set("cursor", params.cursor);
+  if (params.limit) searchParams.set("limit", params.limit.toString());
+  return apiCall<AdminUserSearchResponse>(
+    `/admin/search/users?${searchParams}`,
+    {},
+    true
+  );
+};
+
+export const searchOrders = async (params: {
+  q: string;
+  status?: string;
+  payment_status?: string;
+  service_type?: string;
+  cursor?: string;
+  limit?: number;
+}): Promise<AdminOrderSearchResponse> => {
+  const searchParams = new URLSearchParams({ q: params.q });
+  if (params.status) searchParams.set("status", params.status);
+  if (params.payment_status)
+    searchParams.set("payment_status", params.payment_status);
+  if (params.service_type)
+    searchParams.set("service_type", params.service_type);
+  if (params.cursor) searchParams.set("cursor", params.cursor);
+  if (params.limit) searchParams.set("limit", params.limit.toString());
+  return apiCall<AdminOrderSearchResponse>(
+    `/admin/search/orders?${searchParams}`,
+    {},
+    true
+  );
+};
+
 export const getOrderByAdmin = async (
   orderId: number
 ): Promise<OrderDetail> => {
@@ -197,16 +308,41 @@ export const cancelOrderByAdmin = async (
   );
 };
 
+// 先向後端取得預簽章網址，由瀏覽器直接上傳至 S3，完成後再請後端確認並記錄
 export const uploadCompletionFileByAdmin = async (
   orderId: number,
   file: File
 ): Promise<AdminUploadFileResponse> => {
+  const upload = await apiCall<AdminUploadUrlResponse>(
+    `/admin/order/${orderId}/completion/upload-url`,
+    {
+      method: "POST",
+      body: JSON.stringify({ file_name: file.name, file_size: file.size }),
+    },
+    true
+  );
   const formData = new FormData();
+  Object.entries(upload.fields).forEach(([key, value]) =>
+    formData.append(key, value)
+  );
   formData.append("file", file);
+  const s3Response = await fetch(upload.upload_url, {
+    method: "POST",
+    body: formData,
+  });
+  if (!s3Response.ok) {
+    console.error("S3 上傳失敗:", await s3Response.text());
+    throw new Error("檔案上傳失敗，請稍後再試");
+  }
   return apiCall<AdminUploadFileResponse>(
-    `/admin/order/${orderId}/completion`,
-    { method: "POST", body: formData },
-    true,
+    `/admin/order/${orderId}/completion/confirm`,
+    {
+      method: "POST",
+      body: JSON.stringify({
+        object_key: upload.object_key,
+        file_name: file.name,
+      }),
+    },
     true
   );
 };
@@ -221,6 +357,40 @@ export const updateCompletionStatusByAdmin = async (
   );
 };
 
+export const bulkRefundOrdersByAdmin = async (
+  orderIds: number[],
+  refundUser: string
+): Promise<AdminBulkResponse & { refund_user: string; refund_time: string }> => {
+  return apiCall(
+    "/admin/orders/refund",
+    {
+      method: "POST",
+      body: JSON.stringify({ order_ids: orderIds, refund_user: refundUser }),
+    },
+    true
+  );
+};
+
+export const bulkCancelOrdersByAdmin = async (
+  orderIds: number[]
+): Promise<AdminBulkResponse & { emails_queued: number }> => {
+  return apiCall(
+    "/admin/orders/cancel",
+    { method: "POST", body: JSON.stringify({ order_ids: orderIds }) },
+    true
+  );
+};
+
+export const bulkCompleteOrdersByAdmin = async (
+  orderIds: number[]
+): Promise<AdminBulkResponse> => {
+  return apiCall<AdminBulkResponse>(
+    "/admin/orders/complete",
+    { method: "POST", body: JSON.stringify({ order_ids: orderIds }) },
+    true
+  );
+};
+
 export const getCompletionFileByAdmin = async (
   orderId: number
 ): Promise<AdminGetFileResponse> => {
@@ -71,3 +71,33 @@ export const getPaymentStatus = async (
 
   return response.json();
 };
+
+export const waitForPaymentStatus = async (
+  orderId: number,
+  known?: PaymentStatusResponse
+): Promise<PaymentStatusResponse> => {
+  const token = localStorage.getItem("auth_token");
+  const headers: { [key: string]: string } = {
+    "Content-Type": "application/json",
+  };
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+  const params = new URLSearchParams();
+  if (known) {
+    params.set("payment_status", known.payment_status);
+    params.set("order_status", known.order_status);
+  }
+
+  const response = await fetch(
+    `${API_BASE_URL}/payment/status/${orderId}/wait?${params}`,
+    { headers }
+  );
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || "查詢付款狀態失敗");
+  }
+
+  return response.json();
+};